@@ -0,0 +1,226 @@
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+from alert_store import AlertStore
+
+
+def parse_rate_limits(spec: str) -> Dict[str, float]:
+    """
+    Parse per-threat-level push limits, e.g. "Low:1,High:10,Critical:0".
+
+    Values are alerts per second per subscription; 0 means unlimited.
+
+    Raises:
+        ValueError: On a malformed entry
+    """
+    limits = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        level, sep, rate = part.partition(":")
+        try:
+            if not sep:
+                raise ValueError
+            limits[level.strip()] = max(0.0, float(rate))
+        except ValueError:
+            raise ValueError(f"Invalid rate limit {part!r} (use Level:alerts_per_second)")
+    return limits
+
+
+def parse_filter(value: Optional[str]) -> Optional[Set[str]]:
+    """Comma-separated filter values as a set of lower-case strings (None for no filter)."""
+    if not value:
+        return None
+    return {v.strip().lower() for v in value.split(",") if v.strip()}
+
+
+class LevelRateLimiter:
+    """
+    Token bucket per threat level, so a flock of birds cannot crowd out Critical alerts.
+
+    Each level allows a burst of max(1, rate) alerts and refills at rate per
+    second; levels without a limit (or with 0) are never throttled.
+    """
+
+    def __init__(self, limits: Dict[str, float]):
+        self.limits = {level: rate for level, rate in limits.items() if rate > 0}
+        self._tokens = {level: max(1.0, rate) for level, rate in self.limits.items()}
+        self._updated = {level: time.monotonic() for level in self.limits}
+
+    def allow(self, level: str) -> bool:
+        rate = self.limits.get(level)
+        if rate is None:
+            return True
+        now = time.monotonic()
+        tokens = min(max(1.0, rate), self._tokens[level] + (now - self._updated[level]) * rate)
+        self._updated[level] = now
+        if tokens < 1.0:
+            self._tokens[level] = tokens
+            return False
+        self._tokens[level] = tokens - 1.0
+        return True
+
+
+class AlertSubscription:
+    """
+    One client's push feed: new and updated alerts matching its filters.
+
+    The subscription follows the store's revision cursor, so it sees each
+    insert and each collapse of a repeated sighting into an existing alert
+    ("update"). It is woken as soon as an alert is written in this process
+    and also polls, to pick up alerts written by other processes sharing the
+    database. Alerts over their level's rate limit are not sent; they are
+    reported as per-level counts in a "suppressed" message instead.
+
+    Args:
+        store: Alert store to follow
+        threat_levels: Only these threat levels (lower-case; None for all)
+        object_classes: Only these classes (lower-case; None for all)
+        stream_ids: Only alerts from these streams (None for all)
+        rate_limits: Alerts per second per threat level (see parse_rate_limits)
+        revision: Resume after this revision; None starts with the next new alert
+    """
+
+    def __init__(self, store: AlertStore, threat_levels: Optional[Set[str]] = None,
+                 object_classes: Optional[Set[str]] = None, stream_ids: Optional[Set[str]] = None,
+                 rate_limits: Optional[Dict[str, float]] = None, revision: Optional[int] = None):
+        self.store = store
+        self.threat_levels = threat_levels
+        self.object_classes = object_classes
+        self.stream_ids = stream_ids
+        self.limiter = LevelRateLimiter(rate_limits or {})
+        self.revision = store.revision() if revision is None else revision
+        self.delivered = 0
+        self.suppressed: Dict[str, int] = {}
+        self._unreported: Dict[str, int] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake = asyncio.Event()
+
+    def notify(self):
+        """Wake the subscription (safe to call from any thread)."""
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            # The event loop is already closed
+            pass
+
+    def matches(self, alert: Dict) -> bool:
+        if self.threat_levels is not None and str(alert.get("threat_level", "")).lower() not in self.threat_levels:
+            return False
+        object_class = alert.get("object_class", alert.get("class"))
+        if self.object_classes is not None and str(object_class).lower() not in self.object_classes:
+            return False
+        if self.stream_ids is not None and str(alert.get("stream_id")).lower() not in self.stream_ids:
+            return False
+        return True
+
+    async def messages(self, poll_seconds: float = 1.0, heartbeat_seconds: float = 15.0,
+                       batch_limit: int = 500) -> AsyncIterator[Dict]:
+        """
+        Yield feed messages until the consumer stops iterating:
+        {"type": "alert", "event": "new"|"update", "revision", "alert"},
+        {"type": "suppressed", "counts": {level: n}, "revision"} at most once a
+        second while alerts are being throttled, and {"type": "heartbeat",
+        "revision"} after heartbeat_seconds without traffic.
+        """
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        last_sent = last_summary = time.monotonic()
+        while True:
+            self._wake.clear()
+            alerts, self.revision = await loop.run_in_executor(None, self.store.changes, self.revision, batch_limit)
+            for alert in alerts:
+                if not self.matches(alert):
+                    continue
+                level = alert.get("threat_level", "Unknown")
+                if not self.limiter.allow(level):
+                    self.suppressed[level] = self.suppressed.get(level, 0) + 1
+                    self._unreported[level] = self._unreported.get(level, 0) + 1
+                    continue
+                self.delivered += 1
+                last_sent = time.monotonic()
+                yield {"type": "alert", "event": "new" if alert.get("occurrences", 1) == 1 else "update",
+                       "revision": alert["revision"], "alert": alert}
+
+            now = time.monotonic()
+            if self._unreported and now - last_summary >= 1.0:
+                counts, self._unreported = self._unreported, {}
+                last_summary = last_sent = now
+                yield {"type": "suppressed", "counts": counts, "revision": self.revision}
+            if len(alerts) >= batch_limit:
+                # More changes are waiting
+                continue
+            if now - last_sent >= heartbeat_seconds:
+                last_sent = now
+                yield {"type": "heartbeat", "revision": self.revision}
+            try:
+                await asyncio.wait_for(self._wake.wait(), poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+
+class AlertFeed:
+    """
+    Push subscriptions over an alert store, woken whenever the store is written.
+
+    Args:
+        store: Alert store to follow
+        rate_limits: Default per-level limits of every subscription (see parse_rate_limits)
+        poll_seconds: Longest a subscription waits before re-checking the store
+        heartbeat_seconds: Idle time after which a heartbeat is sent
+    """
+
+    def __init__(self, store: AlertStore, rate_limits: Optional[Dict[str, float]] = None,
+                 poll_seconds: float = 1.0, heartbeat_seconds: float = 15.0):
+        self.store = store
+        self.rate_limits = rate_limits or {}
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self._subscriptions: Set[AlertSubscription] = set()
+        self._lock = threading.Lock()
+        store.add_listener(self.notify)
+
+    def subscribe(self, threat_levels: Optional[Iterable[str]] = None, object_classes: Optional[Iterable[str]] = None,
+                  stream_ids: Optional[Iterable[str]] = None, revision: Optional[int] = None) -> AlertSubscription:
+        subscription = AlertSubscription(
+            self.store,
+            threat_levels=set(threat_levels) if threat_levels is not None else None,
+            object_classes=set(object_classes) if object_classes is not None else None,
+            stream_ids=set(stream_ids) if stream_ids is not None else None,
+            rate_limits=self.rate_limits,
+            revision=revision,
+        )
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: AlertSubscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def messages(self, subscription: AlertSubscription) -> AsyncIterator[Dict]:
+        """The subscription's message stream with this feed's timings."""
+        return subscription.messages(self.poll_seconds, self.heartbeat_seconds)
+
+    def notify(self):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.notify()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        suppressed: Dict[str, int] = {}
+        for subscription in subscriptions:
+            for level, count in subscription.suppressed.items():
+                suppressed[level] = suppressed.get(level, 0) + count
+        return {
+            "subscribers": len(subscriptions),
+            "delivered": sum(s.delivered for s in subscriptions),
+            "suppressed": suppressed,
+            "rate_limits": self.rate_limits,
+        }
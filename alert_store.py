@@ -0,0 +1,304 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    threat_level TEXT NOT NULL,
+    object_class TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_created_at ON alerts (created_at);
+CREATE INDEX IF NOT EXISTS idx_alerts_threat_level ON alerts (threat_level, id);
+"""
+
+# Change feed columns, added to databases created before alerts could be updated in place
+REVISION_SCHEMA = """
+ALTER TABLE alerts ADD COLUMN revision INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE alerts ADD COLUMN updated_at REAL;
+"""
+REVISION_INDEX = "CREATE INDEX IF NOT EXISTS idx_alerts_revision ON alerts (revision)"
+
+# Every insert or update takes the next revision, so subscribers can follow changes with one cursor.
+# The counter lives in its own one-row table so it never goes back when alerts are cleared or evicted;
+# databases from before it existed start from their highest stored revision.
+META_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    revision INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO alert_meta (id, revision) SELECT 1, COALESCE(MAX(revision), 0) FROM alerts;
+"""
+
+
+def box_iou(a, b) -> float:
+    """Intersection over union of two x1, y1, x2, y2 boxes."""
+    inter = max(0.0, min(a[2], b[2]) - max(a[0], b[0])) * max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class AlertStore:
+    """
+    Bounded alert store backed by embedded SQLite.
+
+    Alerts are indexed by insertion time and threat level. Rows older than
+    retention_seconds, and the oldest rows beyond max_alerts, are evicted as
+    new alerts come in, so memory and query cost stay flat on busy feeds.
+
+    Repeated sightings of the same object are collapsed: an alert from the
+    same stream and class as one stored less than dedupe_seconds ago, with
+    the same track id or a box overlapping its last box by dedupe_iou,
+    updates that alert (latest box, last_seen, occurrences, max_confidence)
+    instead of adding a row. Every insert and update gets a new revision,
+    which changes() follows for push subscriptions.
+
+    Args:
+        path: SQLite database path (":memory:" keeps alerts in RAM only)
+        max_alerts: Maximum number of alerts retained
+        retention_seconds: Maximum age of a retained alert (None keeps them until max_alerts evicts them)
+        evict_every: Number of inserts between eviction passes
+        dedupe_seconds: Window in which a sighting updates an earlier alert (0 disables collapsing)
+        dedupe_iou: Box overlap at which an untracked sighting counts as the same object
+    """
+
+    def __init__(self, path: str = ":memory:", max_alerts: int = 100000,
+                 retention_seconds: Optional[float] = 24 * 3600, evict_every: int = 500,
+                 dedupe_seconds: float = 0.0, dedupe_iou: float = 0.3):
+        self.path = path
+        self.max_alerts = max_alerts
+        self.retention_seconds = retention_seconds
+        self.evict_every = max(1, evict_every)
+        self.dedupe_seconds = dedupe_seconds
+        self.dedupe_iou = dedupe_iou
+        self._lock = threading.Lock()
+        self._since_evict = 0
+        # (stream_id, object_class) -> recently stored alerts that later sightings may update
+        self._recent: Dict[Tuple[Optional[str], Optional[str]], List[Dict]] = {}
+        self._listeners: List[Callable[[], None]] = []
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(alerts)")}
+        if "revision" not in columns:
+            self._conn.executescript(REVISION_SCHEMA)
+        self._conn.execute(REVISION_INDEX)
+        self._conn.executescript(META_SCHEMA)
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Call callback (from the writing thread) after every batch of new or updated alerts."""
+        self._listeners.append(callback)
+
+    def add(self, alert: Dict) -> int:
+        """Store one alert and return its id."""
+        return self.add_many([alert])[0]
+
+    def add_many(self, alerts: List[Dict], stream_id: Optional[str] = None) -> List[int]:
+        """
+        Store a batch of alerts (e.g. all detections of one frame) in one transaction.
+
+        stream_id names the camera/connection the alerts came from; it is
+        stored with them and scopes the collapsing of repeated sightings.
+        Returns the id of each alert's row (an existing one when it was collapsed).
+        """
+        if not alerts:
+            return []
+        now = time.time()
+        ids = []
+        with self._lock, self._conn:
+            for alert in alerts:
+                alert = {**alert, "stream_id": stream_id} if stream_id is not None else dict(alert)
+                object_class = alert.get("object_class", alert.get("class"))
+                duplicate = self._find_duplicate(alert.get("stream_id"), object_class, alert, now)
+                if duplicate is not None and self._update(duplicate, alert, now):
+                    ids.append(duplicate["id"])
+                    continue
+                alert.update(first_seen=now, last_seen=now, occurrences=1,
+                             max_confidence=alert.get("confidence"))
+                cursor = self._conn.execute(
+                    "INSERT INTO alerts (created_at, threat_level, object_class, payload, revision, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (now, alert.get("threat_level", "Unknown"), object_class, json.dumps(alert),
+                     self._next_revision(), now)
+                )
+                ids.append(cursor.lastrowid)
+                if self.dedupe_seconds > 0:
+                    self._recent.setdefault((alert.get("stream_id"), object_class), []).append(
+                        {"id": cursor.lastrowid, "alert": alert})
+            self._since_evict += len(alerts)
+            if self._since_evict >= self.evict_every:
+                self._evict(now)
+        for listener in self._listeners:
+            listener()
+        return ids
+
+    def _find_duplicate(self, stream_id: Optional[str], object_class: Optional[str], alert: Dict,
+                        now: float) -> Optional[Dict]:
+        # Caller holds the lock
+        if self.dedupe_seconds <= 0:
+            return None
+        key = (stream_id, object_class)
+        entries = [e for e in self._recent.get(key, ()) if now - e["alert"]["last_seen"] <= self.dedupe_seconds]
+        if entries:
+            self._recent[key] = entries
+        else:
+            self._recent.pop(key, None)
+            return None
+        track_id = alert.get("track_id")
+        if track_id is not None:
+            for entry in entries:
+                if entry["alert"].get("track_id") == track_id:
+                    return entry
+        box = alert.get("bounding_box")
+        if box is None:
+            return None
+        best, best_iou = None, self.dedupe_iou
+        for entry in entries:
+            previous = entry["alert"].get("bounding_box")
+            if previous is not None:
+                iou = box_iou(box, previous)
+                if iou >= best_iou:
+                    best, best_iou = entry, iou
+        return best
+
+    def _update(self, entry: Dict, alert: Dict, now: float) -> bool:
+        # Caller holds the lock inside a transaction
+        previous = entry["alert"]
+        confidences = [c for c in (previous.get("max_confidence"), alert.get("confidence")) if c is not None]
+        merged = {
+            **alert,
+            "first_seen": previous["first_seen"],
+            "last_seen": now,
+            "occurrences": previous["occurrences"] + 1,
+            "max_confidence": max(confidences) if confidences else None,
+        }
+        updated = self._conn.execute(
+            "UPDATE alerts SET payload = ?, threat_level = ?, revision = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(merged), merged.get("threat_level", "Unknown"), self._next_revision(), now, entry["id"])
+        ).rowcount
+        if updated:
+            entry["alert"] = merged
+        return bool(updated)
+
+    def _next_revision(self) -> int:
+        # Caller holds the lock inside a transaction; the UPDATE takes the database write lock,
+        # so processes sharing the file never hand out the same revision
+        self._conn.execute("UPDATE alert_meta SET revision = revision + 1 WHERE id = 1")
+        return self._conn.execute("SELECT revision FROM alert_meta WHERE id = 1").fetchone()[0]
+
+    def query(self, since: Optional[float] = None, cursor: Optional[int] = None, limit: int = 100,
+              threat_level: Optional[str] = None, object_class: Optional[str] = None) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Return alerts matching the filters.
+
+        Args:
+            since: Only alerts stored at or after this Unix timestamp
+            cursor: Only alerts inserted or updated after this revision (the previous next_cursor)
+            limit: Maximum number of alerts returned
+            threat_level: Only alerts with this threat level
+            object_class: Only alerts of this class
+
+        Returns:
+            Tuple of (alerts, next_cursor). Without a cursor or since the newest
+            `limit` alerts are returned, oldest first; otherwise alerts come in
+            revision order. next_cursor is a revision: pass it back to poll
+            incrementally, and an alert updated in place by a repeated sighting
+            is returned again with its new occurrences and last_seen.
+        """
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if cursor is not None:
+            clauses.append("revision > ?")
+            params.append(cursor)
+        if threat_level is not None:
+            clauses.append("threat_level = ?")
+            params.append(threat_level)
+        if object_class is not None:
+            clauses.append("object_class = ?")
+            params.append(object_class)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # Incremental polls walk forward through revisions, first polls take the newest rows
+        incremental = cursor is not None or since is not None
+        order = "revision ASC" if incremental else "id DESC"
+        sql = f"SELECT id, created_at, revision, payload FROM alerts {where} ORDER BY {order} LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            current = self._conn.execute("SELECT revision FROM alert_meta WHERE id = 1").fetchone()[0]
+        if not incremental:
+            rows.reverse()
+
+        alerts = []
+        for alert_id, created_at, revision, payload in rows:
+            alert = json.loads(payload)
+            alert["id"] = alert_id
+            alert["created_at"] = created_at
+            alert["revision"] = revision
+            alerts.append(alert)
+        # A full page may have more behind it; otherwise everything up to now has been seen
+        next_cursor = rows[-1][2] if incremental and len(rows) == limit else current
+        return alerts, next_cursor
+
+    def changes(self, revision: int, limit: int = 500) -> Tuple[List[Dict], int]:
+        """
+        Alerts inserted or updated after a revision, in revision order.
+
+        Returns:
+            Tuple of (alerts, next_revision); each alert carries its revision
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, created_at, revision, payload FROM alerts WHERE revision > ? ORDER BY revision LIMIT ?",
+                (revision, limit)
+            ).fetchall()
+
+        alerts = []
+        for alert_id, created_at, alert_revision, payload in rows:
+            alert = json.loads(payload)
+            alert["id"] = alert_id
+            alert["created_at"] = created_at
+            alert["revision"] = alert_revision
+            alerts.append(alert)
+        return alerts, rows[-1][2] if rows else revision
+
+    def revision(self) -> int:
+        """Revision of the latest insert or update (where a new subscription starts)."""
+        with self._lock:
+            return self._conn.execute("SELECT revision FROM alert_meta WHERE id = 1").fetchone()[0]
+
+    def count(self) -> int:
+        """Return the number of retained alerts."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM alerts").fetchone()[0]
+
+    def clear(self):
+        """Delete every stored alert (revisions keep counting up from where they were)."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM alerts")
+            self._recent.clear()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self, now: float):
+        # Caller holds the lock inside a transaction
+        self._since_evict = 0
+        for key in [k for k, entries in self._recent.items()
+                    if all(now - e["alert"]["last_seen"] > self.dedupe_seconds for e in entries)]:
+            del self._recent[key]
+        if self.retention_seconds is not None:
+            self._conn.execute("DELETE FROM alerts WHERE created_at < ?", (now - self.retention_seconds,))
+        # Ids only grow, so everything at or below max_id - max_alerts is beyond the bound
+        self._conn.execute(
+            "DELETE FROM alerts WHERE id <= (SELECT MAX(id) FROM alerts) - ?", (self.max_alerts,)
+        )
@@ -0,0 +1,150 @@
+import os
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+# Codec choices for annotated videos: container extension and the FourCCs tried in order.
+# OpenCV builds without an H.264 encoder fall back to MPEG-4 Part 2 in the same container.
+CODECS = {
+    "mp4": (".mp4", ["avc1", "mp4v"]),
+    "h264": (".mp4", ["avc1", "H264", "mp4v"]),
+    "mp4v": (".mp4", ["mp4v"]),
+    "avi": (".avi", ["XVID", "MJPG"]),
+    "mjpg": (".avi", ["MJPG"]),
+}
+
+# Box colours (BGR) by threat level
+THREAT_COLOURS = {
+    "Critical": (0, 0, 255),
+    "High": (0, 140, 255),
+    "Low": (0, 200, 0),
+}
+DEFAULT_COLOUR = (200, 200, 200)
+
+
+def codec_extension(codec: str) -> str:
+    """File extension of the container a codec choice writes."""
+    if codec not in CODECS:
+        raise ValueError(f"Unknown video codec: {codec}")
+    return CODECS[codec][0]
+
+
+def draw_detections(frame: np.ndarray, detections: List[Dict]) -> np.ndarray:
+    """
+    Draw detection boxes and labels onto a frame in place.
+
+    Detections are detection log entries (class, confidence, bounding_box,
+    threat_level and optionally trajectory.track_id), so the video shows
+    exactly what was logged.
+    """
+    thickness = max(1, round(sum(frame.shape[:2]) / 600))
+    font_scale = thickness / 3.0
+    for detection in detections:
+        x1, y1, x2, y2 = (int(round(v)) for v in detection["bounding_box"])
+        colour = THREAT_COLOURS.get(detection.get("threat_level"), DEFAULT_COLOUR)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), colour, thickness, cv2.LINE_AA)
+
+        label = f"{detection.get('class', detection.get('object_class', ''))} {detection['confidence']:.2f}"
+        track_id = (detection.get("trajectory") or {}).get("track_id")
+        if track_id is not None:
+            label = f"#{track_id} {label}"
+        (text_width, text_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+        top = y1 - text_height - baseline if y1 - text_height - baseline >= 0 else y1
+        cv2.rectangle(frame, (x1, top), (x1 + text_width, top + text_height + baseline), colour, -1)
+        cv2.putText(frame, label, (x1, top + text_height), cv2.FONT_HERSHEY_SIMPLEX, font_scale,
+                    (255, 255, 255), max(1, thickness - 1), cv2.LINE_AA)
+    return frame
+
+
+class AnnotatedVideoWriter:
+    """
+    Writes a job's annotated video straight to its final path.
+
+    The encoder is opened on the first frame (when the frame size is known),
+    trying the codec's FourCCs in order. Nothing is written anywhere else, so
+    any number of jobs can run at once without sharing a directory.
+
+    The video has one slot per frame_step source frames, counted from
+    start_frame. Frames written with their frame_id land in their own slot:
+    slots the sampler skipped repeat the previous annotated frame, so the
+    video plays at the source's speed however sparsely frames were inferred.
+
+    Args:
+        path: Output file; its extension should match codec_extension(codec)
+        fps: Frame rate of the annotated video (source fps / frame_step)
+        codec: Key of CODECS
+        frame_step: Source frames per video slot (the smallest sampling stride)
+        start_frame: Source frame of the first slot (a segment's first frame)
+    """
+
+    def __init__(self, path: str, fps: float, codec: str = "mp4", frame_step: int = 1, start_frame: int = 0):
+        codec_extension(codec)
+        self.path = path
+        self.fps = fps
+        self.codec = codec
+        self.frame_step = max(1, frame_step)
+        self.start_frame = start_frame
+        self.fourcc: Optional[str] = None
+        self.frames_written = 0
+        self.frames_repeated = 0
+        self._writer: Optional[cv2.VideoWriter] = None
+        self._last: Optional[np.ndarray] = None
+
+    def write(self, frame: np.ndarray, detections: Optional[List[Dict]] = None, frame_id: Optional[int] = None):
+        """
+        Annotate a frame (in place) and append it to the video.
+
+        With a frame_id, the slots between the previous frame and this one are
+        filled first (with this frame if it is the first one written).
+        """
+        if detections:
+            draw_detections(frame, detections)
+        if frame_id is not None:
+            self._fill((frame_id - self.start_frame) // self.frame_step, frame)
+            # The caller may reuse the frame's buffer, so keep a copy to repeat
+            if self._last is None or self._last.shape != frame.shape:
+                self._last = frame.copy()
+            else:
+                np.copyto(self._last, frame)
+        self._append(frame)
+
+    def pad(self, end_frame: int):
+        """Repeat the last frame over the remaining slots up to end_frame (exclusive)."""
+        if self._last is not None and end_frame > self.start_frame:
+            self._fill(-(-(end_frame - self.start_frame) // self.frame_step), self._last)
+
+    def _fill(self, slot: int, frame: np.ndarray):
+        while self.frames_written < slot:
+            self._append(self._last if self._last is not None else frame)
+            self.frames_repeated += 1
+
+    def _append(self, frame: np.ndarray):
+        if self._writer is None:
+            self._open(frame.shape[1], frame.shape[0])
+        self._writer.write(frame)
+        self.frames_written += 1
+
+    def close(self) -> Optional[str]:
+        """Finish the file; returns its path, or None if no frame was written."""
+        if self._writer is None:
+            return None
+        self._writer.release()
+        self._writer = None
+        return self.path
+
+    def abort(self):
+        """Close and delete a partial video."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _open(self, width: int, height: int):
+        for fourcc in CODECS[self.codec][1]:
+            writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*fourcc), self.fps, (width, height))
+            if writer.isOpened():
+                self._writer, self.fourcc = writer, fourcc
+                return
+            writer.release()
+        raise RuntimeError(f"No working encoder for codec {self.codec} ({', '.join(CODECS[self.codec][1])})")
+
@@ -372,7 +372,7 @@ Map<String, int> _getThreatCounts(VideoJob job) {
     try {
       var request = http.MultipartRequest(
         'POST',
-        Uri.parse('https://orange-fiesta-rvgxwgwr6pq2wxq9-8000.app.github.dev/process-video/'),
+        Uri.parse('https://orange-fiesta-rvgxwgwr6pq2wxq9-8000.app.github.dev/process-video/?wait=true'),
       );
       request.files.add(await http.MultipartFile.fromPath('video', job.file.path));
       var response = await request.send();
@@ -1,230 +1,56 @@
-<<<<<<< HEAD
-import os
-import shutil
-import uuid
-import glob
-import json
-import time
-from datetime import datetime
-from fastapi import FastAPI, File, UploadFile, Request
-from fastapi.responses import JSONResponse, FileResponse
-from ultralytics import YOLO
-from fastapi.middleware.cors import CORSMiddleware
-
-app = FastAPI(
-    title="AeroSentinel API",
-    description="AI-powered airborne threat detection system for security and defense operations",
-    version="1.0.0"
-)
-
-# Allow all origins (for development)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Change to your frontend origin in production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Load YOLO model - using your trained model for airborne threat detection
-model = YOLO("best.pt")  # Assuming you've trained this on birds, drones, missiles
-
-# Define directories
-UPLOAD_DIR = "uploads"
-OUTPUT_DIR = "processed_videos"
-YOLO_OUTPUT_DIR = "runs/detect"
-LOG_DIR = "detection_logs"
-
-# Create necessary directories
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-os.makedirs(LOG_DIR, exist_ok=True)
-
-# Class name to threat level mapping
-THREAT_LEVELS = {
-    "bird": "Low",
-    "drone": "High",
-    "missile": "Critical"
-}
-
-def process_video(video_path: str, output_dir: str):
-    """
-    Runs YOLO detection on surveillance footage to identify airborne threats.
-    
-    Args:
-        video_path: Path to the surveillance video
-        output_dir: Directory to save the processed video with annotations
-        
-    Returns:
-        Tuple containing detection log and path to processed video
-    """
-    # Start timing for performance metrics
-    start_time = time.time()
-    
-    # Process with YOLO model optimized for airborne threat detection
-    results = model.predict(source=video_path, conf=0.6, save=True, show=False)
-
-    # Initialize detection log with metadata
-    detection_log = []
-    threat_summary = {
-        "birds": 0,
-        "drones": 0,
-        "missiles": 0,
-        "highest_threat_level": "None"
-    }
-    
-    # Process each frame result
-    for frame_idx, result in enumerate(results):
-        frame_data = {
-            "frame_id": frame_idx,
-            "timestamp": frame_idx / 30.0,  # Assuming 30fps video
-            "detections": []
-        }
-        
-        if hasattr(result, "boxes") and len(result.boxes) > 0:
-            for box in result.boxes:
-                class_id = int(box.cls[0])
-                class_name = model.names[class_id]
-                confidence = float(box.conf[0])
-                
-                # Create detection entry
-                detection_entry = {
-                    "class": class_name,
-                    "confidence": confidence,
-                    "bounding_box": box.xyxy[0].tolist(),
-                    "threat_level": THREAT_LEVELS.get(class_name.lower(), "Unknown")
-                }
-                
-                # Add trajectory data if available (placeholder)
-                detection_entry["trajectory"] = {
-                    "velocity": "medium",  # You would calculate this for real deployment
-                    "direction": "northeast",  # You would calculate this for real deployment
-                }
-                
-                frame_data["detections"].append(detection_entry)
-                
-                # Update threat summary
-                if "bird" in class_name.lower():
-                    threat_summary["birds"] += 1
-                elif "drone" in class_name.lower():
-                    threat_summary["drones"] += 1
-                    if threat_summary["highest_threat_level"] in ["None", "Low"]:
-                        threat_summary["highest_threat_level"] = "High"
-                elif "missile" in class_name.lower():
-                    threat_summary["missiles"] += 1
-                    threat_summary["highest_threat_level"] = "Critical"
-        
-        detection_log.append(frame_data)
-
-    # Calculate processing performance
-    end_time = time.time()
-    processing_time = end_time - start_time
-    fps = len(results) / processing_time if processing_time > 0 else 0
-    
-    # Add performance metrics and threat summary to log
-    detection_metadata = {
-        "processing_time_seconds": processing_time,
-        "processed_fps": fps,
-        "video_length_seconds": len(results) / 30.0,  # Assuming 30fps
-        "threat_summary": threat_summary,
-        "analysis_timestamp": datetime.now().isoformat()
-    }
-
-    # Find the processed video from YOLO output
-    predict_dirs = sorted(glob.glob(os.path.join(YOLO_OUTPUT_DIR, "predict*")), key=os.path.getmtime, reverse=True)
-    latest_predict_dir = predict_dirs[0] if predict_dirs else None
-    processed_video_path = None
-    
-    if latest_predict_dir:
-        # Find the processed AVI file inside predict folder
-        avi_files = glob.glob(os.path.join(latest_predict_dir, "*.avi"))
-        mp4_files = glob.glob(os.path.join(latest_predict_dir, "*.mp4"))
-        video_files = avi_files + mp4_files
-        
-        if video_files:
-            output_filename = f"aerosentinel_{os.path.basename(video_path)}"
-            if output_filename.endswith('.mp4'):
-                output_filename = output_filename.replace('.mp4', '.avi')
-            processed_video_path = os.path.join(output_dir, output_filename)
-            shutil.move(video_files[0], processed_video_path)
-            
-    # Save detailed detection log to file
-    log_filename = f"detection_log_{uuid.uuid4()}.json"
-    log_path = os.path.join(LOG_DIR, log_filename)
-    with open(log_path, 'w') as f:
-        json.dump({"metadata": detection_metadata, "frames": detection_log}, f, indent=2)
-            
-    return detection_log, detection_metadata, processed_video_path
-
-@app.post("/process-video/")
-async def process_uploaded_video(request: Request, video: UploadFile = File(...)):
-    """
-    API endpoint to process surveillance footage for airborne threat detection.
-    
-    Returns a detailed analysis of detected objects and a download link for the annotated video.
-    """
-    # Generate unique filename to prevent conflicts
-    unique_filename = f"{uuid.uuid4()}_{video.filename}"
-    input_video_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-    # Save uploaded video
-    with open(input_video_path, "wb") as buffer:
-        shutil.copyfileobj(video.file, buffer)
-
-    # Process video with YOLO model
-    detection_log, metadata, processed_video_path = process_video(input_video_path, OUTPUT_DIR)
-
-    # Prepare response data
-    response_data = {
-        "status": "success",
-        "message": "Surveillance footage processed successfully",
-        "metadata": metadata,
-        "detection_log": detection_log
-    }
-
-    # Add download URL if processing was successful
-    if processed_video_path:
-        base_url = str(request.base_url)
-        # Using the same URL you provided in your code
-        full_download_url = f'https://orange-fiesta-rvgxwgwr6pq2wxq9-8000.app.github.dev/download/{os.path.basename(processed_video_path)}'
-        response_data["download_url"] = full_download_url
-
-    return response_data
-
-@app.get("/download/{file_name}")
-def download_processed_video(file_name: str):
-    """Endpoint to download the processed video with threat annotations."""
-    file_path = os.path.join(OUTPUT_DIR, file_name)
-    if os.path.exists(file_path):
-        return FileResponse(file_path, media_type="video/x-msvideo", filename=file_name)
-    return JSONResponse(status_code=404, content={"error": "Processed surveillance footage not found"})
-
-@app.get("/health")
-def health_check():
-    """Simple health check endpoint."""
-    return {"status": "healthy", "model": "loaded", "version": "1.0.0"}
-
-
-if __name__ == "__main__":
-    import uvicorn
-=======
+import time
+
+# Reference point for the startup timing breakdown
+IMPORT_STARTED = time.perf_counter()
+
 import os
 import shutil
 import uuid
-import glob
 import json
-import time
+import hashlib
+import tempfile
 from datetime import datetime
-from fastapi import FastAPI, File, UploadFile, Request, HTTPException, WebSocket
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, File, UploadFile, Request, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from ultralytics import YOLO
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
 import cv2
 import numpy as np
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Optional
 from collections import deque
 import math
+import threading
+
+import queue
+
+from jobs import JobManager, QueueFullError, SharedJobManager, JOB_COMPLETED, JOB_FAILED, JOB_QUEUED, JOB_RUNNING
+from batching import BatchScheduler
+from backpressure import LatestFrameSlot, FrameRateLimiter
+from alert_store import AlertStore
+from alert_feed import AlertFeed, parse_filter, parse_rate_limits
+from detection_log import DetectionLogWriter, follow_detection_log, iter_log_frames
+from log_catalog import LogCatalog, run_id_from_log
+from chunked_upload import ChunkedUploadManager, UploadError
+from result_cache import ResultCache, cache_key, weights_sha256
+from tracker import IouTracker, TrackerRegistry, attach_tracks
+from sampler import AdaptiveFrameSampler, iter_sampled_frames, iter_strided_frames, probe_video
+from annotate import AnnotatedVideoWriter, CODECS, codec_extension
+from tiling import TilePlanner, TilingStats
+from pipeline import FramePool, VideoPipeline
+from streams import STREAM_STATES, SharedStreamManager, StreamLimitError, StreamManager
+from shared_state import WorkerMembership, open_state
+from stream_protocol import BinaryStreamSession, ProtocolError
+from sharding import concat_videos, create_shard_pool, iter_segment_records, merge_threat_summary, plan_segments
+from metrics import (
+    ACTIVE_WEBSOCKETS, CAMERA_STREAMS, DROPPED_FRAMES, PATH_CAMERA, PATH_FRAME, PATH_VIDEO, PATH_WEBSOCKET, QUEUE_DEPTH,
+    count_detections, gauge_from, observe_result, observe_stage, observe_tiling, refresh_gauges, render_metrics,
+    reset_multiprocess_dir, time_stage, worker_exited
+)
+from postprocess import THREAT_LEVELS, THREAT_RANK, get_postprocessor
+from cascade import CascadeDetector, CascadeStats
+from backends import LazyModel, load_model, load_parity_images, measure_latency, parity_check
 
 app = FastAPI(
     title="AeroSentinel API",
@@ -247,113 +73,569 @@ app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
 
 # Configure maximum upload size (500MB)
 import math
-from starlette.middleware.base import BaseHTTPMiddleware
 
-class LargeUploadMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        if request.method == "POST":
-            request.state.max_content_length = 500 * 1024 * 1024  # 500MB
-        return await call_next(request)
+MAX_UPLOAD_BYTES = int(os.environ.get("AEROSENTINEL_MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+
+class LargeUploadMiddleware:
+    """
+    Enforce MAX_UPLOAD_BYTES while a request body arrives, before any of it is parsed or spooled.
+
+    A declared Content-Length over the limit is rejected at once. Bodies without
+    one (chunked transfer encoding) are counted as they are received: past the
+    limit the client gets a 413 and the endpoint sees a disconnect, so a
+    multipart upload is never spooled to disk in full.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self.reject(scope, receive, send)
+            return
+
+        received = 0
+        rejected = started = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    rejected = True
+                    if not started:
+                        await self.reject(scope, receive, send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if rejected:
+                # The 413 already went out; drop the endpoint's reaction to the disconnect
+                return
+            started = True
+            await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+    async def reject(self, scope, receive, send):
+        response = JSONResponse(status_code=413, content={"detail": f"Request body exceeds {self.max_bytes} bytes"})
+        await response(scope, receive, send)
 
 app.add_middleware(LargeUploadMiddleware)
 
 # Load YOLO model - using your trained model for airborne threat detection
-model = YOLO("best-ram.pt")  # Assuming you've trained this on birds, drones, missiles
+MODEL_PATH = "best-ram.pt"
+# Inference backend: pytorch, onnx, openvino or openvino-int8 (exported from MODEL_PATH on first use)
+INFERENCE_BACKEND = os.environ.get("AEROSENTINEL_INFERENCE_BACKEND", "pytorch")
+BACKEND_PARITY_CHECK = os.environ.get("AEROSENTINEL_BACKEND_PARITY_CHECK", "true").lower() == "true"
+# Minimum confidence of a reported detection
+CONF_THRESHOLD = float(os.environ.get("AEROSENTINEL_CONF_THRESHOLD", "0.6"))
+# Loaded and warmed up in the background at startup so the API comes up (and answers /livez) immediately
+model = LazyModel(MODEL_PATH, INFERENCE_BACKEND)  # Assuming you've trained this on birds, drones, missiles
+
+# Two-stage cascade: a small screener (e.g. a YOLO nano trained with train_yolo.py on datasets/final)
+# runs on every frame and MODEL_PATH only where the screener finds something uncertain or High/Critical.
+# Empty disables the cascade.
+CASCADE_SCREENER_PATH = os.environ.get("AEROSENTINEL_CASCADE_SCREENER", "")
+# Screener detections below SCREEN_CONF are ignored; those below ACCEPT_CONF are uncertain and escalate
+CASCADE_SCREEN_CONF = float(os.environ.get("AEROSENTINEL_CASCADE_SCREEN_CONF", "0.25"))
+CASCADE_ACCEPT_CONF = float(os.environ.get("AEROSENTINEL_CASCADE_ACCEPT_CONF", "0.7"))
+# Detections at or above this threat level always escalate
+CASCADE_ESCALATE_LEVEL = os.environ.get("AEROSENTINEL_CASCADE_ESCALATE_LEVEL", "High")
+# "frame" re-runs an escalated frame whole, "crop" only padded crops around the escalated detections
+CASCADE_MODE = os.environ.get("AEROSENTINEL_CASCADE_MODE", "frame")
+CASCADE_CROP_PADDING = float(os.environ.get("AEROSENTINEL_CASCADE_CROP_PADDING", "0.5"))
+CASCADE_MIN_CROP_SIZE = int(os.environ.get("AEROSENTINEL_CASCADE_MIN_CROP_SIZE", "160"))
+CASCADE_MAX_CROPS = int(os.environ.get("AEROSENTINEL_CASCADE_MAX_CROPS", "4"))
+# Share of frames also run through MODEL_PATH alone to measure the cascade's accuracy against it
+CASCADE_AUDIT_RATE = float(os.environ.get("AEROSENTINEL_CASCADE_AUDIT_RATE", "0.05"))
+# Also cascade live frames (WebSocket, /process-frame/ and camera streams), not only videos
+CASCADE_LIVE = os.environ.get("AEROSENTINEL_CASCADE_LIVE", "true").lower() == "true"
+screener_model = LazyModel(CASCADE_SCREENER_PATH, INFERENCE_BACKEND) if CASCADE_SCREENER_PATH else None
 
 # Define directories
 UPLOAD_DIR = "uploads"
 OUTPUT_DIR = "processed_videos"
-YOLO_OUTPUT_DIR = "runs/detect"
 LOG_DIR = "detection_logs"
+# Columnar copies of the detection logs and their catalog index
+LOG_CATALOG_DIR = os.path.join(LOG_DIR, "columnar")
+# Finished analyses keyed on video content, weights and settings; LRU-evicted past the size budget
+RESULT_CACHE_ENABLED = os.environ.get("AEROSENTINEL_RESULT_CACHE", "true").lower() == "true"
+RESULT_CACHE_PATH = os.path.join(LOG_DIR, "result_cache.db")
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("AEROSENTINEL_RESULT_CACHE_MAX_BYTES", str(20 * 1024 ** 3)))
+
+# Public URL the download links point at
+DOWNLOAD_BASE_URL = "https://orange-fiesta-rvgxwgwr6pq2wxq9-8000.app.github.dev"
+
+# Video job queue configuration
+INFERENCE_WORKERS = int(os.environ.get("AEROSENTINEL_INFERENCE_WORKERS", "2"))
+INFERENCE_WORKER_MODE = os.environ.get("AEROSENTINEL_INFERENCE_WORKER_MODE", "thread")  # "thread" or "process"
+MAX_PENDING_JOBS = int(os.environ.get("AEROSENTINEL_MAX_PENDING_JOBS", "100"))
+# Uncommitted chunked uploads idle for longer than this are deleted
+UPLOAD_SESSION_TTL_SECONDS = float(os.environ.get("AEROSENTINEL_UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+
+# Multi-worker deployment: with a shared state URL (sqlite:///path or redis://host:port/db) the job
+# queue, camera stream registry and worker heartbeats live there, so several API processes can serve
+# one deployment. API_WORKERS > 1 starts that many uvicorn workers and defaults the shared state to
+# SQLite under LOG_DIR.
+API_WORKERS = int(os.environ.get("AEROSENTINEL_API_WORKERS", "1"))
+SHARED_STATE_URL = os.environ.get("AEROSENTINEL_SHARED_STATE", "")
+# Workers silent for longer than the TTL are considered gone: their running jobs fail and their
+# camera streams move to the remaining workers
+WORKER_HEARTBEAT_SECONDS = float(os.environ.get("AEROSENTINEL_WORKER_HEARTBEAT_SECONDS", "2"))
+WORKER_TTL_SECONDS = float(os.environ.get("AEROSENTINEL_WORKER_TTL_SECONDS", "10"))
+
+# Frame micro-batching configuration (shared by /ws/video-stream and /process-frame/)
+FRAME_BATCH_SIZE = int(os.environ.get("AEROSENTINEL_FRAME_BATCH_SIZE", "8"))
+FRAME_BATCH_TIMEOUT_MS = float(os.environ.get("AEROSENTINEL_FRAME_BATCH_TIMEOUT_MS", "10"))
+FRAME_QUEUE_SIZE = int(os.environ.get("AEROSENTINEL_FRAME_QUEUE_SIZE", "256"))
+
+# Alert store configuration
+ALERT_DB_PATH = os.environ.get("AEROSENTINEL_ALERT_DB", ":memory:")
+if SHARED_STATE_URL and ALERT_DB_PATH == ":memory:":
+    # Workers share alerts through one SQLite database (WAL mode)
+    ALERT_DB_PATH = os.path.join(LOG_DIR, "alerts.db")
+MAX_ALERTS = int(os.environ.get("AEROSENTINEL_MAX_ALERTS", "100000"))
+ALERT_RETENTION_SECONDS = float(os.environ.get("AEROSENTINEL_ALERT_RETENTION_SECONDS", str(24 * 3600)))
+# Sightings of the same object (same stream and class, same track or overlapping box) within
+# this window update one alert instead of adding new ones (0 disables)
+ALERT_DEDUPE_SECONDS = float(os.environ.get("AEROSENTINEL_ALERT_DEDUPE_SECONDS", "10"))
+ALERT_DEDUPE_IOU = float(os.environ.get("AEROSENTINEL_ALERT_DEDUPE_IOU", "0.3"))
+# Push subscriptions: alerts per second per threat level and subscriber (0 = unlimited),
+# store re-check interval (for alerts written by other processes) and idle heartbeat
+ALERT_PUSH_RATE_LIMITS = os.environ.get("AEROSENTINEL_ALERT_PUSH_RATE_LIMITS", "Low:1,High:10,Critical:0")
+ALERT_PUSH_POLL_SECONDS = float(os.environ.get("AEROSENTINEL_ALERT_PUSH_POLL_SECONDS", "1"))
+ALERT_PUSH_HEARTBEAT_SECONDS = float(os.environ.get("AEROSENTINEL_ALERT_PUSH_HEARTBEAT_SECONDS", "15"))
+
+# Object tracking configuration
+TRACK_MAX_IDLE_SECONDS = float(os.environ.get("AEROSENTINEL_TRACK_MAX_IDLE_SECONDS", "2.0"))
+
+# Video frame sampling: "adaptive" skips static stretches, "fixed" infers every VIDEO_STRIDE-th frame
+VIDEO_SAMPLING = os.environ.get("AEROSENTINEL_VIDEO_SAMPLING", "adaptive")
+VIDEO_STRIDE = int(os.environ.get("AEROSENTINEL_VIDEO_STRIDE", "4"))
+ADAPTIVE_MIN_STRIDE = int(os.environ.get("AEROSENTINEL_ADAPTIVE_MIN_STRIDE", "2"))
+ADAPTIVE_MAX_STRIDE = int(os.environ.get("AEROSENTINEL_ADAPTIVE_MAX_STRIDE", "12"))
+ADAPTIVE_MOTION_THRESHOLD = float(os.environ.get("AEROSENTINEL_ADAPTIVE_MOTION_THRESHOLD", "0.01"))
+
+# Segment-sharded processing of long videos: size of the shard process pool (0 or 1 disables it),
+# segments planned per worker (for load balance) and the shortest segment worth a shard
+SHARD_WORKERS = int(os.environ.get("AEROSENTINEL_SHARD_WORKERS", "0"))
+SHARD_SEGMENTS_PER_WORKER = int(os.environ.get("AEROSENTINEL_SHARD_SEGMENTS_PER_WORKER", "2"))
+SHARD_MIN_SEGMENT_SECONDS = float(os.environ.get("AEROSENTINEL_SHARD_MIN_SEGMENT_SECONDS", "60"))
+
+# Codec of annotated videos (mp4 = H.264 where OpenCV has an encoder for it, MPEG-4 otherwise)
+ANNOTATED_VIDEO_CODEC = os.environ.get("AEROSENTINEL_ANNOTATED_VIDEO_CODEC", "mp4")
+SEGMENT_VIDEO_CODEC = "mjpg"
+
+# Tiled inference for small, distant targets (selected per request): tile side in source pixels,
+# overlap between neighbouring tiles, whether the downscaled full frame also runs (for large
+# objects spanning tiles), cross-tile merge threshold and the ROI share a tile needs to run
+TILE_SIZE = int(os.environ.get("AEROSENTINEL_TILE_SIZE", "640"))
+TILE_OVERLAP = float(os.environ.get("AEROSENTINEL_TILE_OVERLAP", "0.2"))
+TILE_FULL_FRAME = os.environ.get("AEROSENTINEL_TILE_FULL_FRAME", "true").lower() == "true"
+TILE_NMS_THRESHOLD = float(os.environ.get("AEROSENTINEL_TILE_NMS_THRESHOLD", "0.6"))
+TILE_MIN_ROI_COVERAGE = float(os.environ.get("AEROSENTINEL_TILE_MIN_ROI_COVERAGE", "0.1"))
+
+# Long side of frames negotiated with binary WebSocket clients (the model's inference size)
+STREAM_FRAME_MAX_SIDE = int(os.environ.get("AEROSENTINEL_STREAM_FRAME_MAX_SIDE", "640"))
+
+# Video pipeline: decoding and inference run on their own threads ahead of annotation/encoding,
+# linked by queues holding this many frames; frames already decoded when the model frees up are
+# inferred together, up to VIDEO_PIPELINE_BATCH per call ("false" runs the stages in turn)
+VIDEO_PIPELINE = os.environ.get("AEROSENTINEL_VIDEO_PIPELINE", "true").lower() == "true"
+VIDEO_PIPELINE_QUEUE_SIZE = int(os.environ.get("AEROSENTINEL_VIDEO_PIPELINE_QUEUE_SIZE", "4"))
+VIDEO_PIPELINE_BATCH = int(os.environ.get("AEROSENTINEL_VIDEO_PIPELINE_BATCH", "1"))
+
+# Server-driven camera streams: most registered sources, default per-source inference rate,
+# reconnect backoff bounds, silence before a source counts as stalled and network read timeout
+STREAM_MAX_SOURCES = int(os.environ.get("AEROSENTINEL_STREAM_MAX_SOURCES", "64"))
+STREAM_DEFAULT_FPS = float(os.environ.get("AEROSENTINEL_STREAM_DEFAULT_FPS", "5"))
+STREAM_RECONNECT_MIN_SECONDS = float(os.environ.get("AEROSENTINEL_STREAM_RECONNECT_MIN_SECONDS", "1"))
+STREAM_RECONNECT_MAX_SECONDS = float(os.environ.get("AEROSENTINEL_STREAM_RECONNECT_MAX_SECONDS", "30"))
+STREAM_STALL_SECONDS = float(os.environ.get("AEROSENTINEL_STREAM_STALL_SECONDS", "10"))
+STREAM_READ_TIMEOUT_MS = int(os.environ.get("AEROSENTINEL_STREAM_READ_TIMEOUT_MS", "10000"))
+
+# Raise one alert per tracked object instead of one per box per frame (when ALERT_DEDUPE_SECONDS is 0;
+# with dedupe on every sighting updates its track's alert)
+ALERT_PER_TRACK = os.environ.get("AEROSENTINEL_ALERT_PER_TRACK", "true").lower() == "true"
 
 # Create necessary directories
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(LOG_DIR, exist_ok=True)
 
-# Class name to threat level mapping
-THREAT_LEVELS = {
-    "bird": "Low",
-    "drone": "High",
-    "missile": "Critical",
-    'hot air balloon': "High", 'paraglider': "High", 'airplane': "Critical", 'car': "High", 'fighter jet': "Critical", 'helicopter': "Critical", 'landing deck': "Critical", 'person': "High", 'ship': "High"
-}
+# Index of processed runs; queries read the memory-mapped detection columns
+log_catalog = LogCatalog(LOG_CATALOG_DIR, THREAT_LEVELS)
 
-# Shared in-memory storage for alerts (replace with a database in production)
-alerts: List[Dict] = []
+def forget_cached_run(entry: Dict):
+    """Drop an evicted cache entry's run from the log catalog (its files are already deleted)."""
+    log_catalog.remove(run_id_from_log(entry["paths"]["log"]))
 
-# Remove these functions and variables
-# HISTORY_LENGTH, object_history, last_frame_time, calculate_movement_vector
+result_cache = ResultCache(RESULT_CACHE_PATH, RESULT_CACHE_MAX_BYTES, on_evict=forget_cached_run)
 
-# WebSocket endpoint for real-time video processing
-@app.websocket("/ws/video-stream")
-async def websocket_video_stream(websocket: WebSocket):
+def cascade_settings() -> Dict:
+    """CascadeDetector thresholds from the AEROSENTINEL_CASCADE_* settings."""
+    return {"screen_conf": CASCADE_SCREEN_CONF, "accept_conf": CASCADE_ACCEPT_CONF,
+            "escalate_level": CASCADE_ESCALATE_LEVEL, "mode": CASCADE_MODE, "crop_padding": CASCADE_CROP_PADDING,
+            "min_crop_size": CASCADE_MIN_CROP_SIZE, "max_crops": CASCADE_MAX_CROPS, "audit_rate": CASCADE_AUDIT_RATE}
+
+# Live frames go through the cascade when it is enabled for them
+live_cascade: Optional[CascadeDetector] = None
+
+def get_live_detector():
     """
-    WebSocket endpoint for real-time video streaming and processing.
+    Detector for live frames: the current module model, behind the screener cascade when enabled.
+
+    The model is looked up on every call, so replacing it (e.g. bench.py's
+    mock) takes effect; the cascade is rebuilt around a replaced model.
     """
-    await websocket.accept()
-    print("WebSocket connection established")
+    global live_cascade
+    if screener_model is None or not CASCADE_LIVE:
+        return model
+    if live_cascade is None or live_cascade.heavy is not model or live_cascade.screener is not screener_model:
+        live_cascade = CascadeDetector(screener_model, model, THREAT_LEVELS, **cascade_settings())
+    return live_cascade
 
-    try:
-        while True:
-            # Receive video frame data from the client
-            data = await websocket.receive_bytes()
+def predict_frames(frames):
+    """Run one batched predict over frames from any number of callers."""
+    with time_stage("batcher", "batch_predict"):
+        return get_live_detector().predict(source=frames, conf=CONF_THRESHOLD, verbose=False)
+
+# The batcher thread is the only user of the shared module model
+frame_batcher = BatchScheduler(
+    predict_frames,
+    max_batch_size=FRAME_BATCH_SIZE,
+    max_delay_ms=FRAME_BATCH_TIMEOUT_MS,
+    max_queue=FRAME_QUEUE_SIZE
+)
+
+# Shared state of a multi-worker deployment (None when this process serves alone)
+shared_state = open_state(SHARED_STATE_URL) if SHARED_STATE_URL else None
+
+def worker_load() -> Dict:
+    """This worker's load, published with its heartbeat (used to place camera streams)."""
+    return {
+        "jobs_running": job_manager.running_jobs,
+        "streams": stream_manager.running_here(),
+        "frame_queue": frame_batcher.stats()["queue_depth"],
+    }
+
+membership = WorkerMembership(shared_state, worker_load, interval_seconds=WORKER_HEARTBEAT_SECONDS,
+                              ttl_seconds=WORKER_TTL_SECONDS) if shared_state is not None else None
+
+@app.on_event("startup")
+def start_frame_batcher():
+    frame_batcher.start()
+
+@app.on_event("shutdown")
+def stop_frame_batcher():
+    frame_batcher.stop()
+
+def tiling_options(tiled: bool = False, roi: Optional[str] = None, tile_size: Optional[int] = None) -> Optional[Dict]:
+    """
+    Validated tiled-inference settings of a request, or None to run whole frames.
+
+    An ROI implies tiling, since it works by skipping tiles outside it.
+
+    Raises:
+        ValueError: On an invalid ROI or tile size
+    """
+    if not (tiled or roi or tile_size):
+        return None
+    planner = TilePlanner(tile_size or TILE_SIZE, TILE_OVERLAP, roi, min_roi_coverage=TILE_MIN_ROI_COVERAGE,
+                          full_frame=TILE_FULL_FRAME, nms_threshold=TILE_NMS_THRESHOLD)
+    return planner.describe()
+
+# Planners per settings, so tile plans and ROI masks are built once per camera resolution
+tile_planners: Dict[tuple, TilePlanner] = {}
+
+def get_tile_planner(options: Optional[Dict]) -> Optional[TilePlanner]:
+    """Shared planner for tiling_options() settings (None for whole-frame inference)."""
+    if options is None:
+        return None
+    key = tuple(sorted(options.items()))
+    planner = tile_planners.get(key)
+    if planner is None:
+        planner = tile_planners.setdefault(key, TilePlanner(min_roi_coverage=TILE_MIN_ROI_COVERAGE, **options))
+    return planner
+
+async def batched_predict(path: str, frame: np.ndarray, planner: Optional[TilePlanner] = None):
+    """
+    Run one frame through the frame batcher.
+
+    With a planner the frame's tiles are submitted as separate images, so
+    they are batched together (and with other callers' frames) and merged
+    back into one result carrying the tiling report.
+    """
+    if planner is None:
+        return await frame_batcher.predict(frame)
+    started = time.perf_counter()
+    images, tiles = planner.crops(frame)
+    results = await asyncio.gather(*(frame_batcher.predict(image) for image in images))
+    result = planner.merge(results, tiles, frame.shape[:2], model.names, started)
+    observe_tiling(path, result.tiling)
+    return result
+
+# Shared bounded storage for alerts, indexed by time and threat level
+alert_store = AlertStore(ALERT_DB_PATH, max_alerts=MAX_ALERTS, retention_seconds=ALERT_RETENTION_SECONDS,
+                         dedupe_seconds=ALERT_DEDUPE_SECONDS, dedupe_iou=ALERT_DEDUPE_IOU)
+
+# Push subscriptions (/ws/alerts, /alerts/stream), woken on every alert write
+alert_feed = AlertFeed(alert_store, parse_rate_limits(ALERT_PUSH_RATE_LIMITS), poll_seconds=ALERT_PUSH_POLL_SECONDS,
+                       heartbeat_seconds=ALERT_PUSH_HEARTBEAT_SECONDS)
+
+# Trackers for /process-frame/ callers, keyed by their stream_id
+frame_trackers = TrackerRegistry(max_idle_seconds=TRACK_MAX_IDLE_SECONDS)
+
+def track_detections(tracker: IouTracker, detections: List[Dict], boxes: np.ndarray, class_ids: np.ndarray,
+                     timestamp: float) -> List[Dict]:
+    """
+    Attach track ids and movement to a frame's detections.
+
+    Returns the detections for the alert store. With dedupe on, that is every
+    sighting, which the store folds into one alert per track (keeping
+    last_seen and occurrences current); otherwise ALERT_PER_TRACK limits it
+    to the first sighting of each tracked object.
+    """
+    return attach_tracks(tracker, detections, boxes, class_ids, timestamp,
+                         first_sighting_only=ALERT_PER_TRACK and ALERT_DEDUPE_SECONDS <= 0)
+
+async def detect_stream_frame(data: bytes, tracker: IouTracker, timestamp: float,
+                              planner: Optional[TilePlanner] = None,
+                              session: Optional[BinaryStreamSession] = None, stream_id: Optional[str] = None) -> Dict:
+    """
+    Decode one WebSocket frame, run batched (optionally tiled) detection, track objects and record alerts.
+
+    Binary-protocol frames are parsed by the session; their responses also
+    carry the frame's sequence number, decoded size and latency for packing.
+    """
+    seq = None
+
+    def error(message: str) -> Dict:
+        return {"error": message, "seq": seq} if session is not None else {"error": message}
+
+    with time_stage(PATH_WEBSOCKET, "decode"):
+        if session is not None:
+            try:
+                seq, frame = session.decode(data)
+            except ProtocolError as e:
+                return error(str(e))
+        else:
             frame = np.frombuffer(data, dtype=np.uint8)
             frame = cv2.imdecode(frame, cv2.IMREAD_COLOR)
 
-            if frame is None:
-                await websocket.send_json({"error": "Invalid frame data"})
-                continue
+    if frame is None:
+        return error("Invalid frame data")
 
-            # Perform object detection on the frame
-            results = model.predict(source=frame, conf=0.6)
+    # Perform object detection on the frame (batched with other callers)
+    try:
+        with time_stage(PATH_WEBSOCKET, "predict"):
+            results = [await batched_predict(PATH_WEBSOCKET, frame, planner)]
+    except queue.Full:
+        DROPPED_FRAMES.labels(PATH_WEBSOCKET, "queue_full").inc()
+        return error("Inference queue is full, frame dropped")
 
-            # Prepare detection results
-            detections = []
-            for result in results:
-                for box in result.boxes:
-                    class_id = int(box.cls[0])
-                    class_name = model.names[class_id]
-                    confidence = float(box.conf[0])
-                    bbox = box.xyxy[0].tolist()
+    # Prepare detection results
+    postprocess_started = time.perf_counter()
+    result = results[0]
+    observe_result(PATH_WEBSOCKET, result)
+    postprocessor = get_postprocessor(model.names, THREAT_LEVELS)
+    columns = postprocessor.extract(result)
+    detections = postprocessor.records(columns)
 
-                    detection = {
-                        "object_class": class_name,
-                        "confidence": confidence,
-                        "bounding_box": bbox,
-                        "threat_level": THREAT_LEVELS.get(class_name.lower(), "Unknown")
-                    }
+    # Record tracked sightings; repeat sightings of a track update its alert
+    alert_store.add_many(track_detections(tracker, detections, columns["xyxy"], columns["cls"], timestamp),
+                         stream_id=stream_id)
+    observe_stage(PATH_WEBSOCKET, "postprocess", time.perf_counter() - postprocess_started)
+    count_detections(PATH_WEBSOCKET, (d["object_class"] for d in detections))
 
-                    detections.append(detection)
+    response = {
+        "status": "success",
+        "detections": detections
+    }
+    if planner is not None:
+        response["tiling"] = result.tiling
+    if session is not None:
+        response.update(seq=seq, frame_shape=frame.shape[:2], latency_ms=(time.monotonic() - timestamp) * 1000.0)
+    return response
 
-                    # Add detection to alerts list
-                    alerts.append(detection)
+async def send_stream_response(websocket: WebSocket, response: Dict, session: Optional[BinaryStreamSession] = None):
+    """
+    Serialise and send a WebSocket response, timing both stages.
 
-            # Send detection results back to the client
-            await websocket.send_json({
-                "status": "success",
-                "detections": detections
-            })
+    Binary-protocol detections are sent as one packed message; errors are
+    always text JSON.
+    """
+    with time_stage(PATH_WEBSOCKET, "serialize"):
+        if session is not None and "detections" in response:
+            payload = session.pack(response["seq"], response["detections"], response["frame_shape"],
+                                   response["latency_ms"], response.get("frame_stats", {}).get("dropped", 0))
+        else:
+            payload = None
+            if session is not None:
+                response = {"type": "error", **response}
+            text = json.dumps(response, separators=(",", ":"))
+    with time_stage(PATH_WEBSOCKET, "send"):
+        if payload is not None:
+            await websocket.send_bytes(payload)
+        else:
+            await websocket.send_text(text)
+
+def negotiate_stream_protocol(text: str, planner: Optional[TilePlanner] = None):
+    """
+    Answer a WebSocket client's hello.
 
+    Returns:
+        Tuple of the binary session (None to fall back to JSON) and the welcome message
+    """
+    try:
+        hello = json.loads(text)
+        if not isinstance(hello, dict):
+            raise ProtocolError("hello must be a JSON object")
+        # Tiled inference needs the native resolution, so frames are not negotiated down
+        session = BinaryStreamSession(hello, model.names, THREAT_LEVELS,
+                                      max_side=None if planner is not None else STREAM_FRAME_MAX_SIDE)
+    except ValueError as e:
+        return None, {"type": "welcome", "protocol": "json", "reason": str(e)}
+    return session, session.welcome()
+
+async def read_latest_frames(websocket: WebSocket, slot: LatestFrameSlot):
+    """Reader task for latest-frame mode: keep only the newest frame in the slot."""
+    try:
+        while True:
+            slot.put(await websocket.receive_bytes())
+    finally:
+        slot.close()
+
+# WebSocket endpoint for real-time video processing
+@app.websocket("/ws/video-stream")
+async def websocket_video_stream(websocket: WebSocket, mode: str = "ordered",
+                                 target_fps: Optional[float] = None, max_latency_ms: Optional[float] = None,
+                                 tiled: bool = False, roi: Optional[str] = None, tile_size: Optional[int] = None,
+                                 stream_id: Optional[str] = None):
+    """
+    WebSocket endpoint for real-time video streaming and processing.
+
+    mode=ordered (default) answers every frame in the order it was sent.
+    mode=latest drops frames the server cannot keep up with and always runs
+    inference on the newest one; target_fps caps the inference rate and
+    max_latency_ms drops frames that waited longer than the budget.
+
+    tiled=true runs each frame as overlapping tile_size tiles for small,
+    distant targets; roi (e.g. top:0.6 for the sky above the horizon) skips
+    tiles outside the region. Every response then carries a tiling report.
+
+    A client whose first message is a text hello negotiates the binary
+    protocol (see stream_protocol): downscaled frames in, packed detection
+    records out. Clients that start with a frame get the JSON protocol.
+
+    Alerts raised by the connection carry stream_id (one per connection if not given).
+    """
+    await websocket.accept()
+    try:
+        planner = get_tile_planner(tiling_options(tiled, roi, tile_size))
+    except ValueError as e:
+        await websocket.send_json({"error": str(e)})
+        await websocket.close(code=1008)
+        return
+    print(f"WebSocket connection established (mode={mode})")
+    ACTIVE_WEBSOCKETS.inc()
+
+    reader = None
+    session = None
+    tracker = IouTracker(max_idle_seconds=TRACK_MAX_IDLE_SECONDS)
+    stream_id = stream_id or f"ws-{uuid.uuid4().hex[:12]}"
+    try:
+        # A text hello negotiates the binary protocol; a frame starts the JSON protocol
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        pending = message.get("bytes")
+        if message.get("text") is not None:
+            session, welcome = negotiate_stream_protocol(message["text"], planner)
+            await websocket.send_json(welcome)
+
+        if mode == "latest":
+            slot = LatestFrameSlot(max_latency_ms=max_latency_ms,
+                                   on_drop=lambda reason: DROPPED_FRAMES.labels(PATH_WEBSOCKET, reason).inc())
+            limiter = FrameRateLimiter(target_fps)
+            if pending is not None:
+                slot.put(pending)
+            reader = asyncio.create_task(read_latest_frames(websocket, slot))
+            while True:
+                await limiter.wait()
+                item = await slot.get()
+                if item is None:
+                    break
+                data, received_at = item
+                response = await detect_stream_frame(data, tracker, received_at, planner, session, stream_id)
+                response["frame_stats"] = slot.stats()
+                response["frame_stats"]["latency_ms"] = (time.monotonic() - received_at) * 1000.0
+                await send_stream_response(websocket, response, session)
+            # Surface the reader's disconnect/error
+            await reader
+        else:
+            while True:
+                # Receive video frame data from the client
+                data = pending if pending is not None else await websocket.receive_bytes()
+                pending = None
+
+                # Send detection results back to the client
+                response = await detect_stream_frame(data, tracker, time.monotonic(), planner, session, stream_id)
+                await send_stream_response(websocket, response, session)
+
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         print(f"WebSocket error: {e}")
-        await websocket.send_json({"error": str(e)})
+        try:
+            await websocket.send_json({"error": str(e)})
+        except Exception:
+            pass
     finally:
-        await websocket.close()
+        ACTIVE_WEBSOCKETS.dec()
+        if reader is not None and not reader.done():
+            reader.cancel()
+        try:
+            await websocket.close()
+        except Exception:
+            pass
         print("WebSocket connection closed")
 
 # Endpoint for processing a single video frame
 @app.post("/process-frame/")
-async def process_frame(file: UploadFile = File(...)):
+async def process_frame(file: UploadFile = File(...), stream_id: str = "default", format: str = "records",
+                        tiled: bool = False, roi: Optional[str] = None, tile_size: Optional[int] = None):
     """
     Process a single video frame sent as an image file.
     Returns detection results for the frame.
+
+    Frames sharing a stream_id are tracked together, so send one id per camera.
+    format=columnar returns one list per field instead of one object per detection.
+    tiled=true (or an roi such as top:0.6) runs overlapping tiles instead of the
+    downscaled frame and adds a tiling report with the tiles run and their cost.
     """
+    try:
+        planner = get_tile_planner(tiling_options(tiled, roi, tile_size))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         # Read the image file
-        contents = await file.read()
-        frame = np.frombuffer(contents, dtype=np.uint8)
-        frame = cv2.imdecode(frame, cv2.IMREAD_COLOR)
+        with time_stage(PATH_FRAME, "upload_read"):
+            contents = await file.read()
+        with time_stage(PATH_FRAME, "decode"):
+            frame = np.frombuffer(contents, dtype=np.uint8)
+            frame = cv2.imdecode(frame, cv2.IMREAD_COLOR)
 
         if frame is None:
             raise HTTPException(status_code=400, detail="Invalid image file")
@@ -361,58 +643,515 @@ async def process_frame(file: UploadFile = File(...)):
         # Get frame dimensions
         height, width, _ = frame.shape
 
-        # Process the frame with YOLO
-        results = model.predict(source=frame, conf=0.6)
+        # Process the frame with YOLO (batched with other callers)
+        try:
+            with time_stage(PATH_FRAME, "predict"):
+                results = [await batched_predict(PATH_FRAME, frame, planner)]
+        except queue.Full:
+            DROPPED_FRAMES.labels(PATH_FRAME, "queue_full").inc()
+            raise HTTPException(status_code=503, detail="Inference queue is full")
 
         # Prepare detection results
-        detections = []
+        postprocess_started = time.perf_counter()
         current_time = time.time()
-        for result in results:
-            for box in result.boxes:
-                class_id = int(box.cls[0])
-                class_name = model.names[class_id]
-                confidence = float(box.conf[0])
-                detection = process_detection(box, class_name, confidence, (width, height), current_time)
-                detections.append(detection)
-
-                # Add detection to alerts list
-                alerts.append(detection)
-
-        return JSONResponse({
-            "status": "success",
-            "detections": detections
-        })
+        result = results[0]
+        observe_result(PATH_FRAME, result)
+        postprocessor = get_postprocessor(model.names, THREAT_LEVELS)
+        columns = postprocessor.extract(result)
+
+        # Normalise for radar display
+        normalised = postprocessor.normalised_boxes(columns, width, height)
+        detections = postprocessor.records(columns, boxes=normalised)
+        for detection, (x, y) in zip(detections, postprocessor.centres(normalised).tolist()):
+            detection["position"] = {"x": x, "y": y}
+            detection["timestamp"] = current_time
+
+        # Record tracked sightings; repeat sightings of a track update its alert
+        tracker = frame_trackers.get(stream_id)
+        alert_store.add_many(track_detections(tracker, detections, columns["xyxy"], columns["cls"], current_time),
+                             stream_id=stream_id)
+        observe_stage(PATH_FRAME, "postprocess", time.perf_counter() - postprocess_started)
+        count_detections(PATH_FRAME, (d["object_class"] for d in detections))
+
+        extra = {"tiling": result.tiling} if planner is not None else {}
+        with time_stage(PATH_FRAME, "serialize"):
+            if format == "columnar":
+                body = postprocessor.columnar(columns, boxes=normalised)
+                body["track_id"] = [d["track_id"] for d in detections]
+                body["timestamp"] = current_time
+                return JSONResponse({"status": "success", "format": "columnar", "detections": body, **extra})
+            return JSONResponse({
+                "status": "success",
+                "detections": detections,
+                **extra
+            })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/alerts")
-def get_alerts():
+def get_alerts(since: Optional[float] = None, cursor: Optional[int] = None, limit: int = 100,
+               threat_level: Optional[str] = None, object_class: Optional[str] = None):
     """
-    Fetch the list of detected threats (alerts).
+    Fetch detected threats (alerts), paginated.
+
+    Without a cursor the newest `limit` alerts are returned. Pass the returned
+    next_cursor back as `cursor` to poll only for alerts stored or updated since
+    the last call (the cursor is an alert revision, so an alert whose repeated
+    sightings were collapsed into it comes back with its new occurrences and
+    last_seen). `since` is a Unix timestamp and `threat_level` one of
+    Low/High/Critical. To have changes pushed as they happen, use /ws/alerts or /alerts/stream.
     """
+    limit = max(1, min(limit, 1000))
+    page, next_cursor = alert_store.query(since=since, cursor=cursor, limit=limit, threat_level=threat_level,
+                                          object_class=object_class)
     return JSONResponse({
         "status": "success",
-        "alerts": alerts
+        "alerts": page,
+        "next_cursor": next_cursor,
+        "total_alerts": alert_store.count()
     })
 
+def subscribe_alerts(threat_level: Optional[str], object_class: Optional[str], stream_id: Optional[str],
+                     cursor: Optional[int]):
+    """Open a push subscription from comma-separated filters."""
+    return alert_feed.subscribe(threat_levels=parse_filter(threat_level), object_classes=parse_filter(object_class),
+                                stream_ids=parse_filter(stream_id), revision=cursor)
+
+@app.websocket("/ws/alerts")
+async def websocket_alerts(websocket: WebSocket, threat_level: Optional[str] = None,
+                           object_class: Optional[str] = None, stream_id: Optional[str] = None,
+                           cursor: Optional[int] = None):
+    """
+    Push new and updated alerts as JSON messages instead of polling /alerts.
+
+    threat_level, object_class and stream_id take comma-separated values
+    (e.g. threat_level=High,Critical). Each message is an "alert" (event
+    "new", or "update" when a repeated sighting refreshed an earlier alert),
+    a "suppressed" count of alerts held back by the per-level rate limits,
+    or a "heartbeat". Reconnect with cursor=<last revision> to resume.
+    """
+    await websocket.accept()
+    subscription = subscribe_alerts(threat_level, object_class, stream_id, cursor)
+
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    disconnected = asyncio.create_task(wait_for_disconnect())
+    messages = alert_feed.messages(subscription)
+    next_message = None
+    try:
+        while True:
+            next_message = asyncio.ensure_future(messages.__anext__())
+            await asyncio.wait({next_message, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                break
+            await websocket.send_json(next_message.result())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        disconnected.cancel()
+        # The generator must be idle before it can be closed
+        if next_message is not None and not next_message.done():
+            next_message.cancel()
+            await asyncio.wait({next_message})
+        await messages.aclose()
+        alert_feed.unsubscribe(subscription)
+
+@app.get("/alerts/stream")
+async def stream_alerts(request: Request, threat_level: Optional[str] = None, object_class: Optional[str] = None,
+                        stream_id: Optional[str] = None, cursor: Optional[int] = None):
+    """
+    Server-sent events version of /ws/alerts (same filters and messages).
+
+    The event id is the alert revision, so a reconnecting EventSource resumes
+    from Last-Event-ID without missing alerts.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if cursor is None and last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+    subscription = subscribe_alerts(threat_level, object_class, stream_id, cursor)
+
+    async def events():
+        try:
+            async for message in alert_feed.messages(subscription):
+                yield f"id: {message['revision']}\nevent: {message['type']}\ndata: {json.dumps(message)}\n\n"
+        finally:
+            alert_feed.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/alerts/subscriptions")
+def get_alert_subscriptions():
+    """Open push subscriptions, alerts delivered and alerts held back by the rate limits."""
+    return {"status": "success", **alert_feed.stats()}
+
+# Trackers of server-driven camera streams, keyed by stream id
+camera_trackers = TrackerRegistry(max_streams=STREAM_MAX_SOURCES, max_idle_seconds=TRACK_MAX_IDLE_SECONDS)
+
+def handle_camera_result(source, frame: np.ndarray, result, timestamp: float):
+    """Track one inferred camera frame's detections and record new ones as alerts (runs on the source's thread)."""
+    postprocess_started = time.perf_counter()
+    observe_result(PATH_CAMERA, result)
+    postprocessor = get_postprocessor(model.names, THREAT_LEVELS)
+    columns = postprocessor.extract(result)
+    height, width = frame.shape[:2]
+    normalised = postprocessor.normalised_boxes(columns, width, height)
+    detections = postprocessor.records(columns, boxes=normalised)
+    for detection, (x, y) in zip(detections, postprocessor.centres(normalised).tolist()):
+        detection["position"] = {"x": x, "y": y}
+        detection["timestamp"] = timestamp
+
+    tracker = camera_trackers.get(source.source_id)
+    alert_store.add_many(track_detections(tracker, detections, columns["xyxy"], columns["cls"], timestamp),
+                         stream_id=source.source_id)
+    observe_stage(PATH_CAMERA, "postprocess", time.perf_counter() - postprocess_started)
+    count_detections(PATH_CAMERA, (d["object_class"] for d in detections))
+    source.detections += len(detections)
+
+# Camera sources feed the shared frame batcher, like WebSocket and HTTP frames
+stream_options = dict(
+    max_streams=STREAM_MAX_SOURCES,
+    reconnect_min_seconds=STREAM_RECONNECT_MIN_SECONDS,
+    reconnect_max_seconds=STREAM_RECONNECT_MAX_SECONDS,
+    stall_seconds=STREAM_STALL_SECONDS,
+    read_timeout_ms=STREAM_READ_TIMEOUT_MS
+)
+if membership is not None:
+    # Each stream is decoded by one worker, placed by load and moved when its worker dies
+    stream_manager = SharedStreamManager(frame_batcher.submit, handle_camera_result, shared_state, membership,
+                                         **stream_options)
+    membership.add_task(stream_manager.rebalance)
+else:
+    stream_manager = StreamManager(frame_batcher.submit, handle_camera_result, **stream_options)
+
+for state in STREAM_STATES:
+    gauge_from(CAMERA_STREAMS.labels(state), lambda state=state: stream_manager.stats()["states"][state])
+
+@app.on_event("shutdown")
+def stop_camera_streams():
+    stream_manager.stop_all()
+
+@app.post("/streams")
+def add_stream(url: str, stream_id: Optional[str] = None, max_fps: Optional[float] = None, loop: bool = False,
+               name: Optional[str] = None):
+    """
+    Register a camera source that the server decodes and monitors itself.
+
+    url is an rtsp://, rtmp:// or http(s):// stream, a local video file or
+    device:N. Up to max_fps frames per second (AEROSENTINEL_STREAM_DEFAULT_FPS
+    by default) go through the shared detector; new tracked objects become
+    alerts tagged with the stream_id. loop=true replays a file endlessly,
+    as a stand-in camera for testing.
+    """
+    try:
+        stream = stream_manager.add(url, stream_id=stream_id, max_fps=STREAM_DEFAULT_FPS if max_fps is None else max_fps,
+                                    loop=loop, name=name)
+    except StreamLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(status_code=201, content={"status": "success", "stream": stream})
+
+@app.get("/streams")
+def list_streams():
+    """List registered camera sources with their health and frame counters."""
+    return {"status": "success", "streams": stream_manager.list(), **stream_manager.stats()}
+
+@app.get("/streams/{stream_id}")
+def get_stream(stream_id: str):
+    stream = stream_manager.get(stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return {"status": "success", "stream": stream}
+
+@app.delete("/streams/{stream_id}")
+def remove_stream(stream_id: str):
+    """Stop decoding a camera source and unregister it."""
+    stream = stream_manager.remove(stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return {"status": "success", "stream": stream}
+
+@app.get("/logs/runs")
+def get_log_runs(since: Optional[float] = None, until: Optional[float] = None, limit: int = 100):
+    """List catalogued video runs (newest first) with their time range and threat summary."""
+    runs = log_catalog.runs(since=since, until=until, limit=max(1, min(limit, 1000)))
+    return JSONResponse({"status": "success", "runs": runs})
+
+@app.get("/logs/query")
+def query_logs(object_class: Optional[str] = None, threat_level: Optional[str] = None,
+               min_confidence: Optional[float] = None, since: Optional[float] = None,
+               until: Optional[float] = None, run_id: Optional[str] = None, limit: int = 1000):
+    """
+    Search the detections of all processed videos.
+
+    Filters by class, threat level and minimum confidence; `since` and `until`
+    are Unix timestamps bounding when a video was analysed. Older JSON logs are
+    included once converted with `python log_catalog.py convert`.
+    """
+    limit = max(1, min(limit, 10000))
+    detections, total = log_catalog.query(
+        object_class=object_class, threat_level=threat_level, min_confidence=min_confidence,
+        since=since, until=until, run_id=run_id, limit=limit
+    )
+    return JSONResponse({
+        "status": "success",
+        "detections": detections,
+        "returned": len(detections),
+        "total_matches": total
+    })
+
+# Parity and latency of the configured backend against the .pt model
+backend_report: Dict = {"status": "pending"}
+
+def run_backend_check():
+    """Compare the configured backend with the PyTorch checkpoint on a few test images."""
+    global backend_report
+    try:
+        # Let the serving model warm up first so the check never delays readiness
+        model.get()
+        images = load_parity_images()
+        if INFERENCE_BACKEND == "pytorch":
+            report = {"latency": measure_latency(load_model(MODEL_PATH), images)}
+        else:
+            report = parity_check(load_model(MODEL_PATH), load_model(MODEL_PATH, INFERENCE_BACKEND), images)
+            if report["recall"] < 0.9 or report["precision"] < 0.9:
+                print(f"WARNING: {INFERENCE_BACKEND} backend deviates from {MODEL_PATH}: {report}")
+        backend_report = {"status": "done", **report}
+    except Exception as e:
+        backend_report = {"status": "failed", "error": str(e)}
+
+@app.on_event("startup")
+def start_backend_check():
+    if BACKEND_PARITY_CHECK:
+        # Uses its own model instances, so it never competes with the batcher for the shared model
+        threading.Thread(target=run_backend_check, name="backend-check", daemon=True).start()
+    else:
+        global backend_report
+        backend_report = {"status": "disabled"}
+
+@app.get("/backend")
+def get_backend():
+    """Report the active inference backend with its parity check and latency."""
+    return {
+        "status": "success",
+        "backend": INFERENCE_BACKEND,
+        "model_path": MODEL_PATH,
+        "report": backend_report
+    }
+
+@app.get("/batching/stats")
+def get_batching_stats():
+    """Report queue depth and batch fill for the shared frame batcher (and the live cascade, if on)."""
+    live_detector = get_live_detector()
+    cascade = live_detector.stats.summary() if isinstance(live_detector, CascadeDetector) else None
+    return {"status": "success", **frame_batcher.stats(), "cascade": cascade}
+
+# Startup timing breakdown, completed by the model loader
+startup_timings: Dict[str, float] = {}
+
+@app.on_event("startup")
+def start_model_warmup():
+    startup_timings["app_import_seconds"] = APP_IMPORTED - IMPORT_STARTED
+    model.start()
+    if screener_model is not None:
+        screener_model.start()
+
+def startup_report() -> Dict:
+    """Model state plus where startup time went (imports, weights load, first inference)."""
+    return {
+        "model": model.state,
+        "backend": INFERENCE_BACKEND,
+        "error": model.error,
+        "timings": {**startup_timings, **{f"model_{k}": v for k, v in model.timings.items()}}
+    }
+
 # Health check endpoint
 @app.get("/health")
 def health_check():
-    """Simple health check endpoint."""
-    return {"status": "healthy", "model": "loaded", "version": "1.0.0"}
+    """Health check endpoint reporting the real model state."""
+    status = "healthy" if model.is_ready else "starting" if model.state == "loading" else "unhealthy"
+    return {"status": status, "version": "1.0.0", **startup_report()}
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics of every API worker: stage latency histograms, frame/detection/drop counters, queue gauges."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/livez")
+def liveness_probe():
+    """Liveness probe: the process and its event loop are responsive."""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readiness_probe():
+    """Readiness probe: 200 only once the model is loaded and warmed up."""
+    if not model.is_ready:
+        return JSONResponse(status_code=503, content={"status": "not_ready", **startup_report()})
+    return {"status": "ready", **startup_report()}
+
+def annotated_video_name(video_path: str, codec: Optional[str] = None) -> str:
+    """Name of the annotated copy of an uploaded video (unique per upload, so per job)."""
+    stem, _ = os.path.splitext(os.path.basename(video_path))
+    return f"aerosentinel_{stem}{codec_extension(codec or ANNOTATED_VIDEO_CODEC)}"
+
+def video_pipeline(video_path: str, detector, sampler: Optional[AdaptiveFrameSampler] = None,
+                   planner: Optional[TilePlanner] = None, start_frame: int = 0,
+                   end_frame: Optional[int] = None) -> VideoPipeline:
+    """
+    Decode -> inference -> annotate/encode pipeline over a video (or one segment of it).
 
-def process_video(video_path: str, output_dir: str):
+    Frames are decoded into a fixed pool of reusable buffers; the caller
+    iterates the pipeline for (frame_id, frame, result) and releases each
+    frame once it is written. With a planner each frame's tiles run as one
+    batch and are merged into one result.
+
+    With adaptive sampling, detections reach the sampler up to two queue
+    lengths after the decoder has moved past their frame, so dense sampling
+    starts a few candidate frames later than in a sequential pass.
+    """
+    pool = FramePool(2 * VIDEO_PIPELINE_QUEUE_SIZE + VIDEO_PIPELINE_BATCH + 2)
+    if sampler is not None:
+        frames = iter_sampled_frames(video_path, sampler, start_frame, end_frame, pool)
+    else:
+        frames = iter_strided_frames(video_path, VIDEO_STRIDE, start_frame, end_frame, pool)
+
+    def infer(batch: List[np.ndarray]) -> List:
+        if planner is not None:
+            return [planner.predict(detector, frame, CONF_THRESHOLD) for frame in batch]
+        return detector.predict(source=batch if len(batch) > 1 else batch[0], conf=CONF_THRESHOLD, verbose=False)
+
+    return VideoPipeline(frames, infer, pool, queue_size=VIDEO_PIPELINE_QUEUE_SIZE,
+                         batch_size=VIDEO_PIPELINE_BATCH, threaded=VIDEO_PIPELINE)
+
+def process_video(video_path: str, output_dir: str, detector=None, log_path: Optional[str] = None,
+                  keep_log: bool = True, sampling: Optional[str] = None, codec: Optional[str] = None,
+                  tiling: Optional[Dict] = None):
     """
     Runs YOLO detection on surveillance footage to identify airborne threats.
+
+    Frame records are appended to the detection log on disk as they are
+    produced, so the log can be followed while the video is processed.
+
+    Args:
+        video_path: Path to the surveillance video
+        output_dir: Directory to save the processed video with annotations
+        detector: YOLO model to run; defaults to the shared module model. With
+            AEROSENTINEL_CASCADE_SCREENER set it runs behind the screener cascade
+            and metadata.cascade reports the escalation rate and audited accuracy per answer path
+        log_path: Detection log destination; defaults to a new file in LOG_DIR
+        keep_log: Also return the frame records in memory (disable for long videos)
+        sampling: "adaptive" to skip static stretches using a motion pre-filter,
+            "fixed" to infer every VIDEO_STRIDE-th frame; defaults to VIDEO_SAMPLING
+        codec: Annotated video codec (a key of annotate.CODECS); defaults to ANNOTATED_VIDEO_CODEC
+        tiling: Tiled inference settings from tiling_options(); None runs whole frames
+
+    With SHARD_WORKERS > 1, videos long enough to split are processed as
+    parallel segments (see process_video_sharded).
     """
+    sampling = sampling or VIDEO_SAMPLING
+    if sampling not in ("adaptive", "fixed"):
+        raise ValueError(f"Unknown sampling mode: {sampling}")
+    codec = codec or ANNOTATED_VIDEO_CODEC
+    processed_video_path = os.path.join(output_dir, annotated_video_name(video_path, codec))
     start_time = time.time()
     frame_count = 0
+
+    # Timestamps come from the container's real frame rate
+    source_fps, total_frames = probe_video(video_path)
+    if log_path is None:
+        log_path = os.path.join(LOG_DIR, f"detection_log_{uuid.uuid4()}.json")
+
+    # Long videos are split into segments that run in parallel on the shard pool
+    if SHARD_WORKERS > 1:
+        segments = plan_segments(total_frames, source_fps, SHARD_WORKERS * SHARD_SEGMENTS_PER_WORKER,
+                                 SHARD_MIN_SEGMENT_SECONDS, align=sampling_stride(sampling))
+        if len(segments) > 1:
+            return process_video_sharded(video_path, processed_video_path, segments, source_fps, total_frames,
+                                         log_path, keep_log, sampling, codec, tiling)
     
+    # The shared module model pairs with the shared screener, worker models with the worker's own
+    detector = cascade_detector(detector) if detector is not None else cascade_detector(model, screener_model)
+
     # Initialize detection log with metadata
-    detection_log = []
+    detection_log = [] if keep_log else None
+    log_writer = DetectionLogWriter(log_path)
+    run_id = run_id_from_log(log_path)
+    columnar_writer = log_catalog.writer(run_id, [detector.names[i].lower() for i in sorted(detector.names)])
+    tracker = IouTracker(max_idle_seconds=TRACK_MAX_IDLE_SECONDS)
+    threat_summary = new_threat_summary()
+    planner = get_tile_planner(tiling)
+    tiling_stats = TilingStats(tiling) if tiling else None
     
-    # Updated threat summary to include all classes
-    threat_summary = {
+    # Process video with frame skipping; annotated frames are encoded straight to this job's output file
+    sampler = None
+    if sampling == "adaptive":
+        sampler = AdaptiveFrameSampler(min_stride=ADAPTIVE_MIN_STRIDE, max_stride=ADAPTIVE_MAX_STRIDE,
+                                       motion_threshold=ADAPTIVE_MOTION_THRESHOLD)
+    pipeline = video_pipeline(video_path, detector, sampler, planner)
+    stride = sampling_stride(sampling)
+    annotated_writer = AnnotatedVideoWriter(processed_video_path, source_fps / stride, codec, frame_step=stride)
+    
+    try:
+        for frame_id, frame, result in pipeline:
+            frame_count += 1
+            observe_result(PATH_VIDEO, result)
+            if tiling_stats is not None:
+                observe_tiling(PATH_VIDEO, result.tiling)
+                tiling_stats.add(result.tiling)
+            with time_stage(PATH_VIDEO, "postprocess"):
+                frame_data = process_video_frame(result, frame_id, frame_id / source_fps, detector, threat_summary, tracker)
+            count_detections(PATH_VIDEO, (d["class"] for d in frame_data["detections"]))
+            with time_stage(PATH_VIDEO, "log_write"):
+                log_writer.write_frame(frame_data)
+                columnar_writer.write_frame(frame_data)
+            if keep_log:
+                detection_log.append(frame_data)
+
+            if sampler is not None:
+                sampler.report_detections(frame_id, len(frame_data["detections"]))
+            with time_stage(PATH_VIDEO, "annotate"):
+                annotated_writer.write(frame, frame_data["detections"], frame_id)
+            pipeline.release(frame)
+        annotated_writer.pad(total_frames)
+    except Exception:
+        log_writer.abort()
+        annotated_writer.abort()
+        raise
+    processed_video_path = annotated_writer.close()
+
+    detection_metadata = video_metadata(
+        time.time() - start_time, frame_count, source_fps, total_frames,
+        sampler.stats() if sampler is not None else {"mode": "fixed", "stride": VIDEO_STRIDE},
+        threat_summary,
+        {detector.names[class_id].lower(): count for class_id, count in tracker.tracks_created.items()}
+    )
+    if sampler is not None:
+        detection_metadata["sampling"]["mode"] = "adaptive"
+    detection_metadata["annotated_video"] = {"codec": codec, "fourcc": annotated_writer.fourcc,
+                                             "frames": annotated_writer.frames_written,
+                                             "repeated_frames": annotated_writer.frames_repeated}
+    if tiling_stats is not None:
+        detection_metadata["tiling"] = tiling_stats.summary()
+    if isinstance(detector, CascadeDetector):
+        detection_metadata["cascade"] = detector.stats.summary()
+    detection_metadata["pipeline"] = pipeline.stats()
+    
+    # Finish the detection log and index its columnar copy
+    log_writer.close(detection_metadata)
+    with time_stage(PATH_VIDEO, "log_write"):
+        log_catalog.register(run_id, columnar_writer.close(), detection_metadata, json_log=log_path)
+            
+    return detection_log, detection_metadata, processed_video_path
+
+def new_threat_summary() -> Dict:
+    """Per-class detection counts of a run, covering all classes."""
+    return {
         "bird": 0,
         "drone": 0,
         "missile": 0,
@@ -427,74 +1166,20 @@ def process_video(video_path: str, output_dir: str):
         "ship": 0,
         "highest_threat_level": "None"
     }
-    
-    # Process video with frame skipping
-    results = model.predict(
-        source=video_path, 
-        conf=0.6, 
-        save=True, 
-        show=False,
-        stream=True,
-        vid_stride=4
-    )
-    
-    for frame_idx, result in enumerate(results):
-        frame_count += 1
-        frame_data = {
-            "frame_id": frame_idx * 4,
-            "timestamp": (frame_idx * 4) / 30.0,
-            "detections": []
-        }
-        
-        if hasattr(result, "boxes") and len(result.boxes) > 0:
-            for box in result.boxes:
-                class_id = int(box.cls[0])
-                class_name = model.names[class_id].lower()
-                confidence = float(box.conf[0])
-                
-                # Create detection entry
-                detection_entry = {
-                    "class": class_name,
-                    "confidence": confidence,
-                    "bounding_box": box.xyxy[0].tolist(),
-                    "threat_level": THREAT_LEVELS.get(class_name, "Unknown")
-                }
-                
-                # Add trajectory data
-                detection_entry["trajectory"] = {
-                    "velocity": "medium",
-                    "direction": "northeast",
-                }
-                
-                frame_data["detections"].append(detection_entry)
-                
-                # Update threat summary for all classes
-                if class_name in threat_summary:
-                    threat_summary[class_name] += 1
-                    
-                    # Update highest threat level
-                    current_threat = THREAT_LEVELS.get(class_name, "Unknown")
-                    if current_threat == "Critical":
-                        threat_summary["highest_threat_level"] = "Critical"
-                    elif current_threat == "High" and threat_summary["highest_threat_level"] in ["None", "Low"]:
-                        threat_summary["highest_threat_level"] = "High"
-                    elif current_threat == "Low" and threat_summary["highest_threat_level"] == "None":
-                        threat_summary["highest_threat_level"] = "Low"
-        
-        detection_log.append(frame_data)
-
-    # Calculate processing performance
-    end_time = time.time()
-    processing_time = end_time - start_time
+
+def video_metadata(processing_time: float, frame_count: int, source_fps: float, total_frames: int,
+                   sampling_stats: Dict, threat_summary: Dict, unique_objects: Dict) -> Dict:
+    """Performance metrics and threat summary stored with a run's detection log."""
     fps = frame_count / processing_time if processing_time > 0 else 0
-    
-    # Add performance metrics and threat summary to log
-    detection_metadata = {
+    return {
         "processing_time_seconds": processing_time,
         "processed_fps": fps,
         "frames_processed": frame_count,
-        "video_length_seconds": (frame_count * 4) / 30.0,
+        "source_fps": source_fps,
+        "video_length_seconds": total_frames / source_fps,
+        "sampling": sampling_stats,
         "threat_summary": threat_summary,
+        "unique_objects": unique_objects,
         "analysis_timestamp": datetime.now().isoformat(),
         "detection_statistics": {
             "total_detections": sum(threat_summary[k] for k in threat_summary if k != "highest_threat_level"),
@@ -509,96 +1194,693 @@ def process_video(video_path: str, output_dir: str):
         }
     }
 
-    # Process output video file
-    predict_dirs = sorted(glob.glob(os.path.join(YOLO_OUTPUT_DIR, "predict*")), key=os.path.getmtime, reverse=True)
-    latest_predict_dir = predict_dirs[0] if predict_dirs else None
-    processed_video_path = None
-    
-    if latest_predict_dir:
-        avi_files = glob.glob(os.path.join(latest_predict_dir, "*.avi"))
-        mp4_files = glob.glob(os.path.join(latest_predict_dir, "*.mp4"))
-        video_files = avi_files + mp4_files
-        
-        if video_files:
-            output_filename = f"aerosentinel_{os.path.basename(video_path)}"
-            if output_filename.endswith('.mp4'):
-                output_filename = output_filename.replace('.mp4', '.avi')
-            processed_video_path = os.path.join(output_dir, output_filename)
-            shutil.move(video_files[0], processed_video_path)
-    
-    # Save detection log
-    log_filename = f"detection_log_{uuid.uuid4()}.json"
-    log_path = os.path.join(LOG_DIR, log_filename)
-    with open(log_path, 'w') as f:
-        json.dump({"metadata": detection_metadata, "frames": detection_log}, f, indent=2)
-            
+def sampling_stride(sampling: Optional[str]) -> int:
+    """Frame step between candidate frames of a sampling mode."""
+    return ADAPTIVE_MIN_STRIDE if (sampling or VIDEO_SAMPLING) == "adaptive" else VIDEO_STRIDE
+
+shard_pool = None
+shard_pool_lock = threading.Lock()
+
+def get_shard_pool():
+    """Process pool the video segments run on, created on first use."""
+    global shard_pool
+    with shard_pool_lock:
+        if shard_pool is None:
+            shard_pool = create_shard_pool(SHARD_WORKERS)
+        return shard_pool
+
+@app.on_event("shutdown")
+def stop_shard_pool():
+    if shard_pool is not None:
+        shard_pool.shutdown(wait=False, cancel_futures=True)
+
+def process_video_segment(video_path: str, index: int, start_frame: int, end_frame: int, sampling: str,
+                          work_dir: str, source_fps: float, tiling: Optional[Dict] = None) -> Dict:
+    """
+    Shard worker: run detection over frames [start_frame, end_frame) of a video.
+
+    Frame records go to a JSON-lines file and annotated frames to a segment
+    video in work_dir; the returned summary tells the parent how to merge them.
+    Frame ids and timestamps are global; track ids start at 1 in every segment.
+    """
+    started_at = time.time()
+    started = time.perf_counter()
+    detector = cascade_detector(get_worker_model())
+    model_ready = time.perf_counter()
+    tracker = IouTracker(max_idle_seconds=TRACK_MAX_IDLE_SECONDS)
+    threat_summary = new_threat_summary()
+    planner = get_tile_planner(tiling)
+    tiling_stats = TilingStats(tiling) if tiling else None
+    sampler = None
+    if sampling == "adaptive":
+        sampler = AdaptiveFrameSampler(min_stride=ADAPTIVE_MIN_STRIDE, max_stride=ADAPTIVE_MAX_STRIDE,
+                                       motion_threshold=ADAPTIVE_MOTION_THRESHOLD)
+    pipeline = video_pipeline(video_path, detector, sampler, planner, start_frame, end_frame)
+
+    records_path = os.path.join(work_dir, f"segment_{index:04d}.jsonl")
+    # Segments are re-encoded once when they are joined, so they use a fast intra-frame codec
+    stride = sampling_stride(sampling)
+    annotated_writer = AnnotatedVideoWriter(os.path.join(work_dir, f"segment_{index:04d}.avi"), source_fps / stride,
+                                            SEGMENT_VIDEO_CODEC, frame_step=stride, start_frame=start_frame)
+    frames_inferred = detections = 0
+    with open(records_path, "w") as records:
+        for frame_id, frame, result in pipeline:
+            if tiling_stats is not None:
+                tiling_stats.add(result.tiling)
+            frame_data = process_video_frame(result, frame_id, frame_id / source_fps, detector, threat_summary, tracker)
+            records.write(json.dumps(frame_data, separators=(",", ":")) + "\n")
+            frames_inferred += 1
+            detections += len(frame_data["detections"])
+            if sampler is not None:
+                sampler.report_detections(frame_id, len(frame_data["detections"]))
+            annotated_writer.write(frame, frame_data["detections"], frame_id)
+            pipeline.release(frame)
+    # Segments are padded to their full length so the joined video keeps the source's timeline
+    annotated_writer.pad(end_frame)
+
+    pipeline_stats = pipeline.stats()
+    return {
+        "index": index,
+        "start_frame": start_frame,
+        "end_frame": end_frame,
+        "records_path": records_path,
+        "annotated_path": annotated_writer.close(),
+        "annotated_repeated": annotated_writer.frames_repeated,
+        "frames_inferred": frames_inferred,
+        "detections": detections,
+        "threat_summary": threat_summary,
+        "unique_objects": {
+            detector.names[class_id].lower(): count for class_id, count in tracker.tracks_created.items()
+        },
+        "tracks_created": sum(tracker.tracks_created.values()),
+        "sampling": sampler.stats() if sampler is not None else None,
+        "tiling": tiling_stats.totals if tiling_stats is not None else None,
+        "cascade": detector.stats.totals if isinstance(detector, CascadeDetector) else None,
+        "worker_pid": os.getpid(),
+        "model_load_seconds": model_ready - started,
+        "inference_seconds": pipeline_stats["stages"]["inference"]["busy_seconds"],
+        "pipeline": pipeline_stats,
+        "segment_seconds": time.perf_counter() - started,
+        "started_at": started_at,
+        "finished_at": time.time(),
+    }
+
+def process_video_sharded(video_path: str, processed_video_path: str, segments: List, source_fps: float,
+                          total_frames: int, log_path: str, keep_log: bool, sampling: str, codec: str,
+                          tiling: Optional[Dict] = None):
+    """
+    Process a video as parallel segments on the shard pool and merge them in order.
+
+    Segments are merged as soon as every earlier one has finished, so the
+    detection log still grows front to back and can be followed live. Track
+    ids of later segments are shifted past those of earlier ones; objects
+    crossing a segment boundary get a new id there.
+    """
+    start_time = time.time()
+    detection_log = [] if keep_log else None
+    log_writer = DetectionLogWriter(log_path)
+    run_id = run_id_from_log(log_path)
+    columnar_writer = log_catalog.writer(run_id)
+    threat_summary = new_threat_summary()
+    unique_objects: Dict[str, int] = {}
+    sampling_stats: Dict[str, int] = {}
+    tiling_stats = TilingStats(tiling) if tiling else None
+    cascade_stats = CascadeStats(cascade_settings()) if CASCADE_SCREENER_PATH else None
+    shard_reports = []
+    annotated_paths = []
+    frame_count = track_offset = repeated_frames = 0
+    annotated_writer = AnnotatedVideoWriter(processed_video_path, source_fps / sampling_stride(sampling), codec)
+
+    work_dir = tempfile.mkdtemp(prefix="shards_", dir=os.path.dirname(processed_video_path))
+    submitted_at = time.time()
+    futures = [
+        get_shard_pool().submit(process_video_segment, video_path, index, start, end, sampling, work_dir, source_fps,
+                                tiling)
+        for index, (start, end) in enumerate(segments)
+    ]
+    try:
+        for future in futures:
+            segment = future.result()
+            merge_started = time.time()
+            with time_stage(PATH_VIDEO, "log_write"):
+                for frame_data in iter_segment_records(segment["records_path"], track_offset):
+                    count_detections(PATH_VIDEO, (d["class"] for d in frame_data["detections"]))
+                    log_writer.write_frame(frame_data)
+                    columnar_writer.write_frame(frame_data)
+                    if keep_log:
+                        detection_log.append(frame_data)
+
+            annotated_paths.append(segment["annotated_path"])
+            repeated_frames += segment["annotated_repeated"]
+            track_offset += segment["tracks_created"]
+            frame_count += segment["frames_inferred"]
+            merge_threat_summary(threat_summary, segment["threat_summary"])
+            for class_name, count in segment["unique_objects"].items():
+                unique_objects[class_name] = unique_objects.get(class_name, 0) + count
+            for key, value in (segment["sampling"] or {}).items():
+                if key not in ("min_stride", "max_stride"):
+                    sampling_stats[key] = sampling_stats.get(key, 0) + value
+            if tiling_stats is not None:
+                tiling_stats.merge(segment["tiling"])
+            if cascade_stats is not None:
+                cascade_stats.merge(segment["cascade"])
+            shard_reports.append({
+                **{k: segment[k] for k in ("index", "start_frame", "end_frame", "frames_inferred", "detections",
+                                           "worker_pid", "model_load_seconds", "inference_seconds",
+                                           "segment_seconds", "pipeline")},
+                # Time queued behind other segments, and finished but waiting for earlier ones to merge
+                "queue_wait_seconds": segment["started_at"] - submitted_at,
+                "merge_wait_seconds": merge_started - segment["finished_at"],
+                "merge_seconds": time.time() - merge_started,
+            })
+
+        concat_started = time.perf_counter()
+        processed_video_path = concat_videos(annotated_paths, annotated_writer)
+        concat_seconds = time.perf_counter() - concat_started
+    except Exception:
+        for future in futures:
+            future.cancel()
+        log_writer.abort()
+        annotated_writer.abort()
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if sampling == "adaptive":
+        sampling_stats.update({"mode": "adaptive", "min_stride": ADAPTIVE_MIN_STRIDE, "max_stride": ADAPTIVE_MAX_STRIDE})
+    else:
+        sampling_stats = {"mode": "fixed", "stride": VIDEO_STRIDE}
+    detection_metadata = video_metadata(time.time() - start_time, frame_count, source_fps, total_frames,
+                                        sampling_stats, threat_summary, unique_objects)
+    detection_metadata["sharding"] = {
+        "workers": SHARD_WORKERS,
+        "segments": len(segments),
+        "video_concat_seconds": concat_seconds,
+        "shards": shard_reports,
+    }
+    detection_metadata["annotated_video"] = {"codec": codec, "fourcc": annotated_writer.fourcc,
+                                             "frames": annotated_writer.frames_written,
+                                             "repeated_frames": repeated_frames}
+    if tiling_stats is not None:
+        detection_metadata["tiling"] = tiling_stats.summary()
+    if cascade_stats is not None:
+        detection_metadata["cascade"] = cascade_stats.summary()
+
+    log_writer.close(detection_metadata)
+    with time_stage(PATH_VIDEO, "log_write"):
+        log_catalog.register(run_id, columnar_writer.close(), detection_metadata, json_log=log_path)
+
     return detection_log, detection_metadata, processed_video_path
 
-@app.post("/process-video/")
-async def process_uploaded_video(request: Request, video: UploadFile = File(...)):
+def process_video_frame(result, frame_id: int, timestamp: float, detector, threat_summary: Dict,
+                        tracker: IouTracker) -> Dict:
+    """Build the detection log record for one video frame and update the threat summary."""
+    postprocessor = get_postprocessor(detector.names, THREAT_LEVELS)
+    columns = postprocessor.extract(result)
+    frame_data = {
+        "frame_id": frame_id,
+        "timestamp": timestamp,
+        "detections": postprocessor.records(columns, class_key="class", lower_case=True)
+    }
+
+    # Update threat summary for all classes
+    for class_name, count in postprocessor.class_counts(columns).items():
+        if class_name in threat_summary:
+            threat_summary[class_name] += count
+
+    # Update highest threat level
+    frame_threat = postprocessor.highest_threat(columns)
+    if THREAT_RANK[frame_threat] > THREAT_RANK[threat_summary["highest_threat_level"]]:
+        threat_summary["highest_threat_level"] = frame_threat
+
+    # Add trajectory data from the tracker (video time, so velocities are per second of footage)
+    tracks = tracker.update(columns["xyxy"], columns["cls"], timestamp)
+    for i, detection_entry in enumerate(frame_data["detections"]):
+        detection_entry["trajectory"] = tracker.describe(tracks, i)
+
+    return frame_data
+
+# Each inference worker thread owns its own model instance (YOLO predictors are not thread-safe)
+_worker_state = threading.local()
+
+def get_worker_model():
+    """Return the YOLO model owned by the calling worker thread, loading it on first use."""
+    if not hasattr(_worker_state, "model"):
+        _worker_state.model = load_model(MODEL_PATH, INFERENCE_BACKEND)
+    return _worker_state.model
+
+def get_worker_screener():
+    """Return the cascade screener owned by the calling worker thread, loading it on first use."""
+    if not hasattr(_worker_state, "screener"):
+        _worker_state.screener = load_model(CASCADE_SCREENER_PATH, INFERENCE_BACKEND)
+    return _worker_state.screener
+
+def cascade_detector(heavy, screener=None):
     """
-    API endpoint to process surveillance footage for airborne threat detection.
-    
-    Returns a detailed analysis of detected objects and a download link for the annotated video.
+    Wrap a video run's detector in the screening cascade when it is enabled.
+
+    Each run gets its own CascadeDetector so its stats cover that run only;
+    screener defaults to the calling worker thread's screener model.
     """
-    # Generate unique filename to prevent conflicts
-    unique_filename = f"{uuid.uuid4()}_{video.filename}"
-    input_video_path = os.path.join(UPLOAD_DIR, unique_filename)
+    if not CASCADE_SCREENER_PATH:
+        return heavy
+    return CascadeDetector(screener or get_worker_screener(), heavy, THREAT_LEVELS, **cascade_settings())
 
-    # Save uploaded video
-    with open(input_video_path, "wb") as buffer:
-        shutil.copyfileobj(video.file, buffer)
+def run_video_job(video_path: str, log_path: Optional[str] = None, include_log: bool = True,
+                  sampling: Optional[str] = None, cache_key: Optional[str] = None,
+                  video_sha256: Optional[str] = None, codec: Optional[str] = None, tiling: Optional[Dict] = None):
+    """
+    Job handler executed by the inference workers for an uploaded video.
 
-    # Process video with YOLO model
-    detection_log, metadata, processed_video_path = process_video(input_video_path, OUTPUT_DIR)
+    Returns the JSON-serialisable response body for the job result endpoint.
+    Streaming jobs pass include_log=False: their frames are read from the log
+    file instead of being held in memory. With a cache_key the finished
+    analysis is stored in the result cache.
+    """
+    detection_log, metadata, processed_video_path = process_video(
+        video_path, OUTPUT_DIR, detector=get_worker_model(), log_path=log_path, keep_log=include_log,
+        sampling=sampling, codec=codec, tiling=tiling
+    )
 
-    # Prepare response data
     response_data = {
         "status": "success",
         "message": "Surveillance footage processed successfully",
-        "metadata": metadata,
-        "detection_log": detection_log
+        "metadata": metadata
     }
+    if include_log:
+        response_data["detection_log"] = detection_log
 
     # Add download URL if processing was successful
     if processed_video_path:
-        base_url = str(request.base_url)
-        # Using the same URL you provided in your code
-        full_download_url = f'https://orange-fiesta-rvgxwgwr6pq2wxq9-8000.app.github.dev/download/{os.path.basename(processed_video_path)}'
-        response_data["download_url"] = full_download_url
+        response_data["download_url"] = f"{DOWNLOAD_BASE_URL}/download/{os.path.basename(processed_video_path)}"
+
+    if cache_key and log_path:
+        response_data["cache"] = {"hit": False, "key": cache_key}
+        result_cache.store(cache_key, video_sha256, {
+            "video": video_path,
+            "processed_video": processed_video_path,
+            "log": log_path,
+            "columns": log_catalog.columns_dir(run_id_from_log(log_path)),
+        }, {k: v for k, v in response_data.items() if k != "detection_log"})
 
     return response_data
 
-def process_detection(box, class_name, confidence, frame_dims, current_time):
-    """Process a single detection for radar display"""
-    width, height = frame_dims
-    bbox = box.xyxy[0].tolist()
-    
-    # Calculate center point
-    center_x = (bbox[0] + bbox[2]) / 2 / width  # Normalize to [0,1]
-    center_y = (bbox[1] + bbox[3]) / 2 / height  # Normalize to [0,1]
-    
-    # Normalize bounding box
-    normalized_bbox = [
-        bbox[0] / width,
-        bbox[1] / height,
-        bbox[2] / width,
-        bbox[3] / height
-    ]
-    
-    return {
-        "object_class": class_name,
-        "confidence": confidence,
-        "bounding_box": normalized_bbox,
-        "threat_level": THREAT_LEVELS.get(class_name.lower(), "Unknown"),
-        "position": {
-            "x": center_x,
-            "y": center_y
-        },
-        "timestamp": current_time
+if membership is not None:
+    # Any worker accepts jobs; idle workers claim them from the shared queue
+    job_manager = SharedJobManager(
+        run_video_job,
+        shared_state,
+        membership.worker_id,
+        workers=INFERENCE_WORKERS,
+        mode=INFERENCE_WORKER_MODE,
+        max_pending=MAX_PENDING_JOBS
+    )
+else:
+    job_manager = JobManager(
+        run_video_job,
+        workers=INFERENCE_WORKERS,
+        mode=INFERENCE_WORKER_MODE,
+        max_pending=MAX_PENDING_JOBS
+    )
+
+def reap_departed_workers():
+    """Fail the jobs of workers that stopped sending heartbeats, then forget those workers."""
+    departed = membership.departed_workers()
+    if departed:
+        job_manager.fail_orphaned_jobs(departed)
+        for worker_id in departed:
+            shared_state.remove_worker(worker_id)
+
+@app.on_event("startup")
+def start_job_workers():
+    job_manager.start()
+    if membership is not None:
+        membership.add_task(reap_departed_workers)
+        membership.start()
+
+# Queue depth gauges are read from the queues whenever /metrics is scraped (and, with several
+# workers, on every heartbeat so workers that do not answer the scrape stay current)
+gauge_from(QUEUE_DEPTH.labels("frame_batcher"), lambda: frame_batcher.stats()["queue_depth"])
+gauge_from(QUEUE_DEPTH.labels("video_jobs"), lambda: job_manager.stats()["jobs"][JOB_QUEUED])
+if membership is not None:
+    membership.add_task(refresh_gauges)
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    job_manager.stop()
+    if membership is not None:
+        # Deregistering hands this worker's camera streams to the others straight away
+        membership.stop()
+    worker_exited()
+
+def save_upload(upload: UploadFile, path: str) -> str:
+    """
+    Copy an uploaded file to disk (blocking, run it in the threadpool).
+
+    Returns:
+        SHA-256 of the file, computed while copying
+    """
+    written = 0
+    hasher = hashlib.sha256()
+    with time_stage(PATH_VIDEO, "upload_write"), open(path, "wb") as buffer:
+        for block in iter(lambda: upload.file.read(1024 * 1024), b""):
+            written += len(block)
+            if written > MAX_UPLOAD_BYTES:
+                break
+            hasher.update(block)
+            buffer.write(block)
+    if written > MAX_UPLOAD_BYTES:
+        os.remove(path)
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+    return hasher.hexdigest()
+
+def validate_video_options(sampling: Optional[str], codec: Optional[str] = None, tiled: bool = False,
+                           roi: Optional[str] = None, tile_size: Optional[int] = None) -> Optional[Dict]:
+    """Reject unsupported options with a 400 and return the tiled inference settings (if any)."""
+    if sampling not in (None, "adaptive", "fixed"):
+        raise HTTPException(status_code=400, detail=f"Unsupported sampling mode: {sampling}")
+    if codec is not None and codec not in CODECS:
+        raise HTTPException(status_code=400, detail=f"Unsupported video codec: {codec} (one of {', '.join(CODECS)})")
+    try:
+        return tiling_options(tiled, roi, tile_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def queue_uploaded_video(video: UploadFile, priority: int, include_log: bool = True,
+                               sampling: Optional[str] = None, codec: Optional[str] = None,
+                               tiling: Optional[Dict] = None) -> Dict:
+    """Save an uploaded video and queue it for the inference workers (options already validated)."""
+
+    # Generate unique filename to prevent conflicts
+    unique_filename = f"{uuid.uuid4()}_{video.filename}"
+    input_video_path = os.path.join(UPLOAD_DIR, unique_filename)
+
+    # Save uploaded video without blocking the event loop
+    video_sha256 = await run_in_threadpool(save_upload, video, input_video_path)
+    return await run_in_threadpool(queue_video_file, input_video_path, priority, include_log, sampling,
+                                   video_sha256, codec, tiling)
+
+def video_cache_key(video_sha256: str, sampling: Optional[str], codec: Optional[str] = None,
+                    tiling: Optional[Dict] = None) -> Optional[str]:
+    """Result cache key of analysing a video with the current model and settings."""
+    try:
+        weights_hash = weights_sha256(MODEL_PATH)
+    except OSError:
+        return None
+    sampling = sampling or VIDEO_SAMPLING
+    if sampling == "fixed":
+        sampling_settings = {"stride": VIDEO_STRIDE}
+    else:
+        sampling_settings = {"min_stride": ADAPTIVE_MIN_STRIDE, "max_stride": ADAPTIVE_MAX_STRIDE,
+                             "motion_threshold": ADAPTIVE_MOTION_THRESHOLD}
+    if CASCADE_SCREENER_PATH:
+        try:
+            sampling_settings["cascade"] = {"screener": weights_sha256(CASCADE_SCREENER_PATH), **cascade_settings()}
+        except OSError:
+            return None
+    return cache_key(video_sha256, weights_hash, backend=INFERENCE_BACKEND, conf=CONF_THRESHOLD,
+                     sampling=sampling, sharded=SHARD_WORKERS > 1, codec=codec or ANNOTATED_VIDEO_CODEC,
+                     tiling=tiling, **sampling_settings)
+
+# Jobs still queued or running per (cache key, include_log), so concurrent duplicates share one job
+inflight_jobs: Dict[tuple, str] = {}
+inflight_lock = threading.Lock()
+
+def cached_video_job(key: str, input_video_path: str, priority: int, include_log: bool) -> Optional[Dict]:
+    """Return a finished or in-flight job for the same analysis, discarding the duplicate upload."""
+    entry = result_cache.lookup(key)
+    if entry is not None:
+        result = dict(entry["result"], cache={"hit": True, "key": key, "cached_at": entry["created_at"]})
+        if include_log:
+            result["detection_log"] = list(iter_log_frames(entry["paths"]["log"]))
+        payload = {"video_path": entry["paths"]["video"], "log_path": entry["paths"]["log"],
+                   "include_log": include_log, "cache_key": key}
+        job = job_manager.record_completed(payload, result, priority=priority)
+    else:
+        with inflight_lock:
+            job_id = inflight_jobs.get((key, include_log))
+            job = job_manager.status(job_id) if job_id else None
+            if job is None or job["status"] not in (JOB_QUEUED, JOB_RUNNING):
+                inflight_jobs.pop((key, include_log), None)
+                return None
+    if os.path.abspath(input_video_path) != os.path.abspath(job_manager.get(job["job_id"])["payload"]["video_path"]):
+        os.remove(input_video_path)
+    return job
+
+def queue_video_file(input_video_path: str, priority: int, include_log: bool = True,
+                     sampling: Optional[str] = None, video_sha256: Optional[str] = None,
+                     codec: Optional[str] = None, tiling: Optional[Dict] = None) -> Dict:
+    """
+    Queue a video already stored under UPLOAD_DIR for the inference workers.
+
+    With the video's SHA-256, footage that was already analysed with the same
+    model and settings is answered from the result cache without inference.
+    """
+    key = video_cache_key(video_sha256, sampling, codec, tiling) if RESULT_CACHE_ENABLED and video_sha256 else None
+    if key:
+        job = cached_video_job(key, input_video_path, priority, include_log)
+        if job is not None:
+            return job
+
+    payload = {
+        "video_path": input_video_path,
+        "log_path": os.path.join(LOG_DIR, f"detection_log_{uuid.uuid4()}.json"),
+        "include_log": include_log,
+        "sampling": sampling,
+        "codec": codec,
+        "tiling": tiling,
+        "cache_key": key,
+        "video_sha256": video_sha256
     }
+    try:
+        job = job_manager.submit(payload, priority=priority)
+    except QueueFullError as e:
+        os.remove(input_video_path)
+        raise HTTPException(status_code=503, detail=str(e))
+    if key:
+        with inflight_lock:
+            for inflight_key, job_id in list(inflight_jobs.items()):
+                status = job_manager.status(job_id)
+                if status is None or status["status"] not in (JOB_QUEUED, JOB_RUNNING):
+                    del inflight_jobs[inflight_key]
+            inflight_jobs[(key, include_log)] = job["job_id"]
+    return job
+
+@app.post("/process-video/")
+async def process_uploaded_video(request: Request, video: UploadFile = File(...), priority: int = 5, wait: bool = False,
+                                 sampling: Optional[str] = None, codec: Optional[str] = None, tiled: bool = False,
+                                 roi: Optional[str] = None, tile_size: Optional[int] = None):
+    """
+    API endpoint to process surveillance footage for airborne threat detection.
+
+    Queues the video for the inference workers and returns a job id at once.
+    Poll /jobs/{job_id} for progress and fetch /jobs/{job_id}/result when done,
+    or follow /jobs/{job_id}/stream for per-frame records as they are produced.
+    Lower priority values are processed first. Pass wait=true to get the full
+    analysis in the response like older clients expect. sampling=adaptive|fixed
+    overrides the server's frame sampling mode and codec=mp4|h264|mp4v|avi|mjpg
+    the annotated video's codec. tiled=true (with an optional roi and tile_size)
+    selects tiled inference; its cost is reported in metadata.tiling.
+    """
+    tiling = validate_video_options(sampling, codec, tiled, roi, tile_size)
+    job = await queue_uploaded_video(video, priority, sampling=sampling, codec=codec, tiling=tiling)
+    return await queued_job_response(job, wait)
+
+async def queued_job_response(job: Dict, wait: bool = False, **extra):
+    """202 with the job's status/result/stream URLs (plus any extra fields), or the finished result when wait=true."""
+    if wait:
+        await run_in_threadpool(job_manager.wait, job["job_id"])
+        return get_job_result(job["job_id"])
+
+    return JSONResponse(status_code=202, content={
+        "status": "queued",
+        "message": "Surveillance footage queued for processing",
+        "job": job,
+        "status_url": f"/jobs/{job['job_id']}",
+        "result_url": f"/jobs/{job['job_id']}/result",
+        "stream_url": f"/jobs/{job['job_id']}/stream",
+        **extra
+    })
+
+@app.post("/process-video/stream")
+async def process_uploaded_video_streaming(video: UploadFile = File(...), priority: int = 5, format: str = "ndjson",
+                                           sampling: Optional[str] = None, codec: Optional[str] = None,
+                                           tiled: bool = False, roi: Optional[str] = None,
+                                           tile_size: Optional[int] = None):
+    """
+    Process surveillance footage and stream per-frame detection records back
+    as NDJSON (format=ndjson) or Server-Sent Events (format=sse).
+
+    The full detection log is never held in memory: frames are streamed from
+    the log file while the inference worker appends to it.
+    """
+    if format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported stream format: {format}")
+    tiling = validate_video_options(sampling, codec, tiled, roi, tile_size)
+    job = await queue_uploaded_video(video, priority, include_log=False, sampling=sampling, codec=codec, tiling=tiling)
+    return stream_job_response(job["job_id"], format)
+
+# Resumable uploads for large footage over unreliable links
+chunked_uploads = ChunkedUploadManager(UPLOAD_DIR, MAX_UPLOAD_BYTES, session_ttl_seconds=UPLOAD_SESSION_TTL_SECONDS)
+
+def upload_error_response(e: UploadError) -> JSONResponse:
+    content = {"status": "error", "detail": str(e)}
+    if e.offset is not None:
+        content["offset"] = e.offset
+    return JSONResponse(status_code=e.status_code, content=content)
+
+@app.post("/uploads")
+def init_upload(filename: str, size: Optional[int] = None, sha256: Optional[str] = None):
+    """
+    Start a resumable upload.
+
+    Send the file in chunks with PATCH /uploads/{upload_id}?offset=N (raw bytes
+    as the body), then POST /uploads/{upload_id}/commit. After a dropped
+    connection, GET /uploads/{upload_id} returns the offset to resume from.
+    `size` and `sha256` are optional and checked on commit.
+    """
+    try:
+        upload = chunked_uploads.init(filename, total_size=size, sha256=sha256)
+    except UploadError as e:
+        return upload_error_response(e)
+    return JSONResponse(status_code=201, content={
+        "status": "success",
+        "upload": upload,
+        "chunk_url": f"/uploads/{upload['upload_id']}",
+        "max_bytes": MAX_UPLOAD_BYTES
+    })
+
+@app.get("/uploads/{upload_id}")
+def get_upload(upload_id: str):
+    """Return how many bytes of an upload have been received."""
+    try:
+        return {"status": "success", "upload": chunked_uploads.status(upload_id)}
+    except UploadError as e:
+        return upload_error_response(e)
+
+@app.patch("/uploads/{upload_id}")
+async def append_upload_chunk(upload_id: str, request: Request, offset: int):
+    """
+    Append the request body to an upload at `offset`.
+
+    The body is written as it arrives, so whatever reached the server before a
+    disconnect is kept and the next chunk resumes from there.
+    """
+    try:
+        position = await run_in_threadpool(chunked_uploads.append, upload_id, b"", offset)
+        try:
+            async for piece in request.stream():
+                if piece:
+                    with time_stage(PATH_VIDEO, "upload_write"):
+                        position = await run_in_threadpool(chunked_uploads.append, upload_id, piece, position)
+        except ClientDisconnect:
+            return Response(status_code=400)
+        return {"status": "success", "upload": chunked_uploads.status(upload_id)}
+    except UploadError as e:
+        return upload_error_response(e)
+
+@app.post("/uploads/{upload_id}/commit")
+async def commit_upload(upload_id: str, sha256: Optional[str] = None, priority: int = 5, wait: bool = False,
+                        sampling: Optional[str] = None, codec: Optional[str] = None, tiled: bool = False,
+                        roi: Optional[str] = None, tile_size: Optional[int] = None):
+    """Verify a finished upload (size and SHA-256) and queue it like /process-video/."""
+    tiling = validate_video_options(sampling, codec, tiled, roi, tile_size)
+    try:
+        upload = await run_in_threadpool(chunked_uploads.commit, upload_id, sha256)
+    except UploadError as e:
+        return upload_error_response(e)
+    job = await run_in_threadpool(queue_video_file, upload["path"], priority, True, sampling, upload["sha256"], codec,
+                                  tiling)
+    upload.pop("path")
+    return await queued_job_response(job, wait, upload=upload)
+
+@app.delete("/uploads/{upload_id}")
+def abort_upload(upload_id: str):
+    """Abandon an upload and delete the bytes received so far."""
+    try:
+        chunked_uploads.abort(upload_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    return {"status": "success"}
+
+@app.get("/jobs")
+def list_jobs():
+    """Report queue depth and worker counters for the video job subsystem."""
+    return {"status": "success", **job_manager.stats(), "result_cache": result_cache.stats()}
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str):
+    """Return the state of a queued video job."""
+    job = job_manager.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": "success", "job": job}
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    """
+    Return the analysis of a finished video job.
+
+    Responds with 202 while the job is still queued or running.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == JOB_FAILED:
+        return JSONResponse(status_code=500, content={"status": "error", "error": job["error"], "job": job_manager.status(job_id)})
+    if job["status"] != JOB_COMPLETED:
+        return JSONResponse(status_code=202, content={"status": job["status"], "job": job_manager.status(job_id)})
+    return job["result"]
+
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def format_stream_record(record: Dict, format: str) -> str:
+    """Encode one stream record as an NDJSON line or an SSE event."""
+    if format == "sse":
+        return f"event: {record['type']}\ndata: {json.dumps(record, separators=(',', ':'))}\n\n"
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+def iter_job_stream(job_id: str, format: str):
+    """Yield a job's frame records while it runs, followed by a completion or error record."""
+    job = job_manager.get(job_id)
+    done = job["_done"]
+    for frame in follow_detection_log(job["payload"]["log_path"], done.is_set):
+        yield format_stream_record({"type": "frame", **frame}, format)
+
+    done.wait()
+    # Shared-state jobs are snapshots; read the finished record
+    job = job_manager.get(job_id) or job
+    if job["status"] == JOB_COMPLETED:
+        result = {k: v for k, v in job["result"].items() if k != "detection_log"}
+        yield format_stream_record({"type": "complete", "job_id": job_id, **result}, format)
+    else:
+        yield format_stream_record({"type": "error", "job_id": job_id, "error": job["error"]}, format)
+
+def stream_job_response(job_id: str, format: str) -> StreamingResponse:
+    # A sync generator is iterated in the threadpool, so following the log never blocks the event loop
+    return StreamingResponse(iter_job_stream(job_id, format), media_type=STREAM_MEDIA_TYPES[format],
+                             headers={"X-Job-Id": job_id, "Cache-Control": "no-cache"})
+
+@app.get("/jobs/{job_id}/stream")
+def stream_job(job_id: str, format: str = "ndjson"):
+    """Follow a video job's detection records as NDJSON or Server-Sent Events."""
+    if format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported stream format: {format}")
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return stream_job_response(job_id, format)
+
+APP_IMPORTED = time.perf_counter()
 
 if __name__ == "__main__":
     import uvicorn
->>>>>>> e43f7ae9 (Final commit, uploading flutter app code)
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    if API_WORKERS > 1:
+        # Worker processes import the app themselves and share jobs, streams and alerts through shared state
+        os.environ.setdefault("AEROSENTINEL_SHARED_STATE",
+                              "sqlite:///" + os.path.abspath(os.path.join(LOG_DIR, "shared_state.db")))
+        # Metrics go through files so a scrape answered by any worker covers all of them
+        os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.abspath(os.path.join(LOG_DIR, "prometheus")))
+        reset_multiprocess_dir(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+        uvicorn.run("app:app", host="0.0.0.0", port=8000, workers=API_WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
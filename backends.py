@@ -0,0 +1,271 @@
+import argparse
+import glob
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from tracker import box_iou
+
+# Inference backends and the ultralytics export arguments that produce them
+BACKENDS = {
+    "pytorch": None,
+    "onnx": {"format": "onnx", "dynamic": True, "simplify": True},
+    "openvino": {"format": "openvino"},
+    "openvino-int8": {"format": "openvino", "int8": True},
+}
+
+# Dataset used to calibrate INT8 quantisation and sample images for parity checks
+CALIBRATION_DATA = "datasets/final/data.yaml"
+PARITY_IMAGE_GLOB = "datasets/final/test/images/*.jpg"
+
+
+def exported_path(weights: str, backend: str) -> str:
+    """Where ultralytics writes the exported model of a backend."""
+    stem, _ = os.path.splitext(weights)
+    if backend == "pytorch":
+        return weights
+    if backend == "onnx":
+        return f"{stem}.onnx"
+    if backend == "openvino":
+        return f"{stem}_openvino_model"
+    if backend == "openvino-int8":
+        return f"{stem}_int8_openvino_model"
+    raise ValueError(f"Unknown inference backend: {backend}")
+
+
+def export_model(weights: str, backend: str, imgsz: int = 640) -> str:
+    """
+    Export a trained .pt checkpoint to an optimised inference backend.
+
+    Returns:
+        Path of the exported model (file or directory)
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    if backend == "pytorch":
+        return weights
+    export_args = dict(BACKENDS[backend])
+    if export_args.get("int8"):
+        export_args["data"] = CALIBRATION_DATA
+    from ultralytics import YOLO
+    path = YOLO(weights).export(imgsz=imgsz, **export_args)
+    print(f"Exported {weights} to {backend}: {path}")
+    return str(path)
+
+
+def load_model(weights: str, backend: str = "pytorch", auto_export: bool = True):
+    """
+    Load the detector for the configured backend, exporting it first if needed.
+
+    Every backend is wrapped in a YOLO object, so callers keep using
+    predict() and names regardless of what runs underneath.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    path = exported_path(weights, backend)
+    if not os.path.exists(path):
+        if not auto_export:
+            raise FileNotFoundError(f"No {backend} export of {weights} at {path}")
+        path = export_model(weights, backend)
+    # Imported here so that importing this module (and the API) stays fast
+    from ultralytics import YOLO
+    return YOLO(path, task="detect")
+
+
+class LazyModel:
+    """
+    Detector that loads and warms up in the background instead of at import time.
+
+    start() kicks off a thread that imports ultralytics/torch, loads the
+    weights for the backend and runs one dummy inference so the first real
+    request does not pay for lazy initialisation. predict() and names block
+    until loading has finished, so the object can stand in for a YOLO model.
+
+    Args:
+        weights: Path of the trained .pt checkpoint
+        backend: Inference backend passed to load_model()
+        warmup_imgsz: Side of the blank image used for the warm-up inference
+    """
+
+    def __init__(self, weights: str, backend: str = "pytorch", warmup_imgsz: int = 640):
+        self.weights = weights
+        self.backend = backend
+        self.warmup_imgsz = warmup_imgsz
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self._model = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def state(self) -> str:
+        if self._thread is None:
+            return "not_started"
+        if not self._ready.is_set():
+            return "loading"
+        return "failed" if self._model is None else "ready"
+
+    @property
+    def is_ready(self) -> bool:
+        return self._model is not None
+
+    def start(self):
+        """Begin loading in the background (no-op if already started)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._load, name="model-loader", daemon=True)
+                self._thread.start()
+
+    def get(self, timeout: Optional[float] = None):
+        """Return the loaded model, starting and waiting for the load if needed."""
+        self.start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f"Model {self.weights} is still loading")
+        if self._model is None:
+            raise RuntimeError(f"Model {self.weights} failed to load: {self.error}")
+        return self._model
+
+    @property
+    def names(self):
+        return self.get().names
+
+    def predict(self, *args, **kwargs):
+        return self.get().predict(*args, **kwargs)
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            step = time.perf_counter()
+            import ultralytics  # noqa: F401 (pulls in torch)
+            self.timings["import_seconds"] = time.perf_counter() - step
+
+            step = time.perf_counter()
+            model = load_model(self.weights, self.backend)
+            self.timings["weights_load_seconds"] = time.perf_counter() - step
+
+            step = time.perf_counter()
+            dummy = np.zeros((self.warmup_imgsz, self.warmup_imgsz, 3), dtype=np.uint8)
+            model.predict(source=dummy, verbose=False)
+            self.timings["first_inference_seconds"] = time.perf_counter() - step
+
+            self._model = model
+        except Exception as e:
+            self.error = str(e)
+            print(f"Model loading failed: {e}")
+        finally:
+            self.timings["total_seconds"] = time.perf_counter() - started
+            self._ready.set()
+
+
+def load_parity_images(pattern: str = PARITY_IMAGE_GLOB, limit: int = 16) -> List[np.ndarray]:
+    """Read a handful of test images for parity and latency checks."""
+    images = []
+    for path in sorted(glob.glob(pattern))[:limit]:
+        image = cv2.imread(path)
+        if image is not None:
+            images.append(image)
+    return images
+
+
+def measure_latency(model, images: List[np.ndarray], conf: float = 0.6, warmup: int = 2) -> Dict:
+    """Time single-image predict calls and return latency percentiles in milliseconds."""
+    for image in images[:warmup]:
+        model.predict(source=image, conf=conf, verbose=False)
+    timings = []
+    for image in images:
+        start = time.perf_counter()
+        model.predict(source=image, conf=conf, verbose=False)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    timings = np.array(timings) if timings else np.zeros(1)
+    return {
+        "images": len(images),
+        "mean_ms": float(timings.mean()),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+    }
+
+
+def _detections(model, image: np.ndarray, conf: float):
+    boxes = model.predict(source=image, conf=conf, verbose=False)[0].boxes
+    return boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy().astype(int), boxes.conf.cpu().numpy()
+
+
+def parity_check(reference, candidate, images: List[np.ndarray], conf: float = 0.6,
+                 iou_threshold: float = 0.5) -> Dict:
+    """
+    Compare a candidate backend's detections against the reference .pt model.
+
+    A candidate detection matches a reference one when the classes agree and
+    the boxes overlap by at least iou_threshold.
+
+    Returns:
+        Recall and precision of the candidate against the reference, the mean
+        absolute confidence difference of matched boxes and both latencies
+    """
+    matched = ref_total = cand_total = 0
+    conf_diffs = []
+    for image in images:
+        ref_boxes, ref_cls, ref_conf = _detections(reference, image, conf)
+        cand_boxes, cand_cls, cand_conf = _detections(candidate, image, conf)
+        ref_total += len(ref_boxes)
+        cand_total += len(cand_boxes)
+        iou = box_iou(ref_boxes, cand_boxes)
+        if iou.size:
+            iou[ref_cls[:, None] != cand_cls[None, :]] = 0.0
+            # Greedy one-to-one matching
+            while True:
+                i, j = np.unravel_index(np.argmax(iou), iou.shape)
+                if iou[i, j] < iou_threshold:
+                    break
+                matched += 1
+                conf_diffs.append(abs(float(ref_conf[i]) - float(cand_conf[j])))
+                iou[i, :] = 0.0
+                iou[:, j] = 0.0
+
+    return {
+        "images": len(images),
+        "reference_detections": ref_total,
+        "candidate_detections": cand_total,
+        "recall": matched / ref_total if ref_total else 1.0,
+        "precision": matched / cand_total if cand_total else 1.0,
+        "mean_confidence_diff": float(np.mean(conf_diffs)) if conf_diffs else 0.0,
+        "reference_latency": measure_latency(reference, images, conf),
+        "candidate_latency": measure_latency(candidate, images, conf),
+    }
+
+
+def compare_backends(weights: str, backends: Optional[List[str]] = None, limit: int = 16) -> Dict:
+    """Export (if needed), parity-check and time every backend against the .pt model."""
+    images = load_parity_images(limit=limit)
+    reference = load_model(weights)
+    report = {"pytorch": {"latency": measure_latency(reference, images)}}
+    for backend in backends or [b for b in BACKENDS if b != "pytorch"]:
+        try:
+            candidate = load_model(weights, backend)
+            report[backend] = parity_check(reference, candidate, images)
+        except Exception as e:
+            report[backend] = {"error": str(e)}
+    return report
+
+
+if __name__ == "__main__":
+    import json
+
+    parser = argparse.ArgumentParser(description="Export and compare AeroSentinel inference backends")
+    parser.add_argument("command", choices=["export", "compare"])
+    parser.add_argument("--weights", default="best-ram.pt")
+    parser.add_argument("--backend", action="append", choices=[b for b in BACKENDS if b != "pytorch"],
+                        help="Backend to export/compare (repeatable, default: all)")
+    parser.add_argument("--images", type=int, default=16, help="Number of test images for the comparison")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        for backend in args.backend or [b for b in BACKENDS if b != "pytorch"]:
+            export_model(args.weights, backend)
+    else:
+        print(json.dumps(compare_backends(args.weights, args.backend, args.images), indent=2))
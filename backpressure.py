@@ -0,0 +1,96 @@
+import asyncio
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+
+class LatestFrameSlot:
+    """
+    Single-slot mailbox between a WebSocket reader task and its inference loop.
+
+    The reader overwrites the slot with every frame it receives, so the
+    inference loop always picks up the newest frame and anything it did not
+    get to in time is dropped and counted rather than queued.
+
+    Args:
+        max_latency_ms: Frames older than this when inference picks them up are
+            dropped as stale (None disables the check)
+        on_drop: Called with "overwritten" or "stale" for every dropped frame
+    """
+
+    def __init__(self, max_latency_ms: Optional[float] = None, on_drop: Optional[Callable[[str], None]] = None):
+        self.max_latency = max_latency_ms / 1000.0 if max_latency_ms else None
+        self.on_drop = on_drop
+        self._item: Optional[Tuple[bytes, float]] = None
+        self._event = asyncio.Event()
+        self.closed = False
+        self.received = 0
+        self.processed = 0
+        self.dropped_overwritten = 0
+        self.dropped_stale = 0
+
+    def put(self, data: bytes):
+        """Store a newly received frame, replacing (and dropping) any unprocessed one."""
+        self.received += 1
+        if self._item is not None:
+            self.dropped_overwritten += 1
+            if self.on_drop:
+                self.on_drop("overwritten")
+        self._item = (data, time.monotonic())
+        self._event.set()
+
+    def close(self):
+        """Wake the inference loop so it can exit once the reader is gone."""
+        self.closed = True
+        self._event.set()
+
+    async def get(self) -> Optional[Tuple[bytes, float]]:
+        """
+        Wait for the freshest frame within the latency budget.
+
+        Returns:
+            Tuple of frame bytes and receive time, or None once the slot is closed
+        """
+        while True:
+            while self._item is None:
+                if self.closed:
+                    return None
+                self._event.clear()
+                await self._event.wait()
+
+            data, received_at = self._item
+            self._item = None
+            if self.max_latency is not None and time.monotonic() - received_at > self.max_latency:
+                self.dropped_stale += 1
+                if self.on_drop:
+                    self.on_drop("stale")
+                continue
+            self.processed += 1
+            return data, received_at
+
+    def stats(self) -> Dict:
+        """Return per-connection frame counters."""
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped_overwritten + self.dropped_stale,
+            "dropped_overwritten": self.dropped_overwritten,
+            "dropped_stale": self.dropped_stale,
+        }
+
+
+class FrameRateLimiter:
+    """Paces an inference loop to at most target_fps iterations per second."""
+
+    def __init__(self, target_fps: Optional[float] = None):
+        self.interval = 1.0 / target_fps if target_fps and target_fps > 0 else 0.0
+        self._next_time = 0.0
+
+    async def wait(self):
+        """Sleep until the next frame slot is due."""
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if now < self._next_time:
+            await asyncio.sleep(self._next_time - now)
+            now = self._next_time
+        self._next_time = now + self.interval
@@ -0,0 +1,141 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+
+class BatchScheduler:
+    """
+    Shared micro-batching engine for single-frame inference.
+
+    Frames submitted from any WebSocket connection or HTTP request are collected
+    for up to max_batch_size frames or max_delay_ms milliseconds (whichever comes
+    first), run through one batched predict call on a dedicated thread, and each
+    result is handed back to the caller that submitted the frame.
+
+    Args:
+        predict_fn: Function taking a list of frames and returning one result per frame
+        max_batch_size: Largest number of frames run in one predict call
+        max_delay_ms: Longest time the first frame of a batch waits for company
+        max_queue: Maximum number of frames waiting for a batch
+    """
+
+    def __init__(self, predict_fn: Callable[[List], List], max_batch_size: int = 8,
+                 max_delay_ms: float = 10.0, max_queue: int = 256):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_delay = max_delay_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "batches": 0,
+            "frames": 0,
+            "rejected_frames": 0,
+            "failed_batches": 0,
+            "inference_seconds": 0.0,
+            "batch_size_counts": {},
+        }
+
+    def start(self):
+        """Start the batching thread."""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the batching thread after the queued frames have been served."""
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, frame) -> Future:
+        """
+        Queue a frame for the next batch and return a future for its result.
+
+        Raises:
+            queue.Full: If the scheduler is saturated
+        """
+        future = Future()
+        try:
+            self._queue.put_nowait((frame, future, time.perf_counter()))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["rejected_frames"] += 1
+            raise
+        return future
+
+    async def predict(self, frame):
+        """Await the detection result for a single frame."""
+        return await asyncio.wrap_future(self.submit(frame))
+
+    def stats(self) -> Dict:
+        """Return queue depth and batch fill metrics."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats["batch_size_counts"] = dict(self._stats["batch_size_counts"])
+        batches = stats["batches"]
+        stats["queue_depth"] = self._queue.qsize()
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_delay_ms"] = self.max_delay * 1000.0
+        stats["avg_batch_size"] = stats["frames"] / batches if batches else 0.0
+        stats["avg_batch_fill"] = stats["avg_batch_size"] / self.max_batch_size
+        stats["avg_inference_ms"] = stats["inference_seconds"] * 1000.0 / batches if batches else 0.0
+        return stats
+
+    def _collect(self, first) -> List:
+        batch = [first]
+        deadline = first[2] + self.max_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Re-queue the stop sentinel for the main loop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            # Skip frames whose caller already gave up (e.g. a closed socket)
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            start_time = time.perf_counter()
+            try:
+                results = self.predict_fn([frame for frame, _, _ in batch])
+            except Exception as e:
+                with self._stats_lock:
+                    self._stats["failed_batches"] += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start_time
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+            with self._stats_lock:
+                size = len(batch)
+                self._stats["batches"] += 1
+                self._stats["frames"] += size
+                self._stats["inference_seconds"] += elapsed
+                counts = self._stats["batch_size_counts"]
+                counts[size] = counts.get(size, 0) + 1
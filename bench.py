@@ -0,0 +1,553 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Sample inputs replayed by the benchmark
+VIDEO_GLOB = "uploads/*.mp4"
+IMAGE_GLOB = "datasets/final/test/images/*.jpg"
+DATA_YAML = "datasets/final/data.yaml"
+
+SCENARIOS = ("video", "frame", "websocket")
+
+# Relative change of a metric that counts as a regression in compare mode
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+# Metrics compared between runs and whether a higher value is better
+COMPARED_METRICS = {
+    "latency_ms.p50": False,
+    "latency_ms.p95": False,
+    "latency_ms.p99": False,
+    "frames_per_second": True,
+    "rss_mb.peak": False,
+}
+
+
+class MockResult:
+    """Minimal stand-in for an ultralytics Results object."""
+
+    class Boxes:
+        def __init__(self, data: np.ndarray):
+            self.data = data
+
+        def __len__(self):
+            return len(self.data)
+
+    def __init__(self, data: np.ndarray, names: Dict[int, str], speed: Dict[str, float]):
+        self.boxes = MockResult.Boxes(data)
+        self.names = names
+        self.speed = speed
+
+
+class MockModel:
+    """
+    Weight-free detector that can stand in for the served model.
+
+    Detections are pseudo-random but derived from the image content, so
+    repeated runs over the same inputs produce the same boxes (and tracks).
+    latency_ms simulates the model's cost per image, which lets the HTTP,
+    decode and serialisation overhead be measured on its own (latency_ms=0)
+    or under a realistic inference load.
+
+    Implements the parts of backends.LazyModel the app uses.
+    """
+
+    def __init__(self, names: Dict[int, str], latency_ms: float = 0.0, max_detections: int = 5):
+        self.names = names
+        self.latency_ms = latency_ms
+        self.max_detections = max_detections
+        self.state = "ready"
+        self.is_ready = True
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+
+    def start(self):
+        pass
+
+    def get(self, timeout: Optional[float] = None):
+        return self
+
+    def predict(self, source=None, conf: float = 0.25, verbose: bool = False, **kwargs) -> List[MockResult]:
+        images = source if isinstance(source, list) else [source]
+        started = time.perf_counter()
+        if self.latency_ms:
+            time.sleep(self.latency_ms * len(images) / 1000.0)
+        inference_ms = (time.perf_counter() - started) * 1000.0 / max(1, len(images))
+        return [self._result(image, conf, inference_ms) for image in images]
+
+    def _result(self, image: np.ndarray, conf: float, inference_ms: float) -> MockResult:
+        height, width = image.shape[:2]
+        rng = np.random.default_rng(int(image[::max(1, height // 8), ::max(1, width // 8)].sum()))
+        count = int(rng.integers(0, self.max_detections + 1))
+        xy = rng.uniform(0, 0.9, (count, 2)) * [width, height]
+        wh = rng.uniform(0.02, 0.1, (count, 2)) * [width, height]
+        data = np.column_stack([
+            xy, np.minimum(xy + wh, [width, height]),
+            rng.uniform(conf, 1.0, count), rng.integers(0, len(self.names), count)
+        ]).astype(np.float32).reshape(-1, 6)
+        return MockResult(data, self.names, {"preprocess": 0.0, "inference": inference_ms, "postprocess": 0.0})
+
+
+def dataset_names(path: str = DATA_YAML) -> Dict[int, str]:
+    """Class table of the training dataset (used by the mock model)."""
+    import yaml
+
+    with open(path, "r") as f:
+        return dict(enumerate(yaml.safe_load(f)["names"]))
+
+
+class RemoteWebSocket:
+    """websocket-client connection with the TestClient WebSocket session interface."""
+
+    def __init__(self, url: str):
+        import websocket
+
+        self._conn = websocket.create_connection(url)
+
+    def send_bytes(self, data: bytes):
+        self._conn.send_binary(data)
+
+    def send_text(self, text: str):
+        self._conn.send(text)
+
+    def receive_text(self) -> str:
+        return self._conn.recv()
+
+    def receive_bytes(self) -> bytes:
+        return self._conn.recv()
+
+    def receive_json(self):
+        return json.loads(self._conn.recv())
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RemoteClient:
+    """HTTP/WebSocket client for a running server, shaped like fastapi's TestClient."""
+
+    def __init__(self, url: str):
+        import httpx
+
+        self.http = httpx.Client(base_url=url, timeout=600)
+        self.ws_url = "ws" + url[len("http"):] if url.startswith("http") else url
+
+    def get(self, path: str, **kwargs):
+        return self.http.get(path, **kwargs)
+
+    def post(self, path: str, **kwargs):
+        return self.http.post(path, **kwargs)
+
+    def websocket_connect(self, path: str) -> RemoteWebSocket:
+        return RemoteWebSocket(self.ws_url.rstrip("/") + path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.http.close()
+
+
+class RssSampler:
+    """Samples the resident set size of this process in the background."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.samples: List[int] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.samples.append(current_rss())
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.samples.append(current_rss())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.samples.append(current_rss())
+
+    def summary(self) -> Dict:
+        mb = np.array(self.samples, dtype=np.float64) / (1024 * 1024)
+        return {"start": float(mb[0]), "peak": float(mb.max()), "end": float(mb[-1])}
+
+
+def current_rss() -> int:
+    """Resident set size in bytes (peak RSS where psutil is unavailable)."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    import resource
+
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def latency_summary(latencies_ms: List[float]) -> Dict:
+    if not latencies_ms:
+        return {"count": 0}
+    values = np.array(latencies_ms)
+    return {
+        "count": len(values),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+def stage_totals(client) -> Dict[str, Dict[str, float]]:
+    """Per (path, stage) sums and counts of the server's stage latency histogram, from /metrics."""
+    from prometheus_client.parser import text_string_to_metric_families
+
+    totals: Dict[str, Dict[str, float]] = {}
+    for family in text_string_to_metric_families(client.get("/metrics").text):
+        if family.name != "aerosentinel_stage_latency_seconds":
+            continue
+        for sample in family.samples:
+            field = "sum" if sample.name.endswith("_sum") else "count" if sample.name.endswith("_count") else None
+            if field:
+                key = f"{sample.labels['path']}/{sample.labels['stage']}"
+                totals.setdefault(key, {"sum": 0.0, "count": 0.0})[field] = sample.value
+    return totals
+
+
+def stage_deltas(before: Dict, after: Dict) -> Dict[str, Dict[str, float]]:
+    """Mean stage timings of the work done between two stage_totals() snapshots."""
+    stages = {}
+    for key, total in sorted(after.items()):
+        previous = before.get(key, {"sum": 0.0, "count": 0.0})
+        count = total["count"] - previous["count"]
+        if count > 0:
+            stages[key] = {"count": int(count), "mean_ms": (total["sum"] - previous["sum"]) * 1000.0 / count}
+    return stages
+
+
+def run_scenario(client, name: str, concurrency: int, work: List, task: Callable) -> Dict:
+    """
+    Run task over the work items on concurrency threads and summarise the run.
+
+    task(worker_index, item) returns (latencies in ms, frames processed); an
+    exception counts as one failed request.
+    """
+    latencies: List[float] = []
+    frames = errors = 0
+    lock = threading.Lock()
+    shares = [work[i::concurrency] for i in range(concurrency)]
+
+    def worker(index: int):
+        nonlocal frames, errors
+        for item in shares[index]:
+            try:
+                item_latencies, item_frames = task(index, item)
+            except Exception as e:
+                print(f"[{name}] request failed: {e}", file=sys.stderr)
+                with lock:
+                    errors += 1
+                continue
+            with lock:
+                latencies.extend(item_latencies)
+                frames += item_frames
+
+    stages_before = stage_totals(client)
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        wall_seconds = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(work),
+        "errors": errors,
+        "frames": frames,
+        "wall_seconds": wall_seconds,
+        "frames_per_second": frames / wall_seconds if wall_seconds > 0 else 0.0,
+        "latency_ms": latency_summary(latencies),
+        "rss_mb": rss.summary(),
+        "stages": stage_deltas(stages_before, stage_totals(client)),
+    }
+
+
+def video_scenario(client, app_module, videos: List[str], concurrency: int, work_dir: str, sampling: str) -> Dict:
+    """Whole videos through process_video (in process) or /process-video/?wait=true (remote)."""
+
+    def task(index: int, path: str):
+        started = time.perf_counter()
+        if app_module is None:
+            with open(path, "rb") as f:
+                response = client.post("/process-video/", params={"wait": "true", "sampling": sampling},
+                                       files={"video": (os.path.basename(path), f, "video/mp4")})
+            response.raise_for_status()
+            frames = response.json()["metadata"]["frames_processed"]
+        else:
+            _, metadata, _ = app_module.process_video(
+                path, work_dir, detector=app_module.get_worker_model(),
+                log_path=os.path.join(work_dir, f"detection_log_{index}_{time.time_ns()}.json"),
+                keep_log=False, sampling=sampling
+            )
+            frames = metadata["frames_processed"]
+        # One latency sample per video; frames/s covers throughput
+        return [(time.perf_counter() - started) * 1000.0], frames
+
+    return run_scenario(client, "video", concurrency, videos, task)
+
+
+def frame_scenario(client, images: List[bytes], requests: int, concurrency: int, params: Dict) -> Dict:
+    """Single images through POST /process-frame/, one tracked stream per client thread."""
+    work = [images[i % len(images)] for i in range(requests)]
+
+    def task(index: int, image: bytes):
+        started = time.perf_counter()
+        response = client.post("/process-frame/", params={"stream_id": f"bench-{index}", **params},
+                               files={"file": ("frame.jpg", image, "image/jpeg")})
+        response.raise_for_status()
+        return [(time.perf_counter() - started) * 1000.0], 1
+
+    return run_scenario(client, "frame", concurrency, work, task)
+
+
+def websocket_scenario(client, images: List[bytes], requests: int, concurrency: int, protocol: str,
+                       params: Dict) -> Dict:
+    """
+    One /ws/video-stream connection per client thread, each sending its share
+    of frames and waiting for every answer (round-trip latency per frame).
+    """
+    from stream_protocol import FRAME_HEADER, MSG_FRAME, PROTOCOL_NAME, PROTOCOL_VERSION
+
+    per_client = max(1, requests // concurrency)
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    path = "/ws/video-stream" + (f"?{query}" if query else "")
+    decoded = [cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR) for image in images]
+
+    def task(index: int, _):
+        latencies = []
+        with client.websocket_connect(path) as ws:
+            frames = images
+            if protocol == "binary":
+                height, width = decoded[0].shape[:2]
+                ws.send_text(json.dumps({"type": "hello", "protocol": PROTOCOL_NAME, "version": PROTOCOL_VERSION,
+                                         "width": width, "height": height, "encodings": ["jpeg"],
+                                         "resize": "client"}))
+                welcome = ws.receive_json()
+                if welcome.get("protocol") != PROTOCOL_NAME:
+                    raise RuntimeError(f"Binary protocol refused: {welcome.get('reason')}")
+                # Downscale once up front, like a client encoding at the negotiated size
+                size = (welcome["frame_width"], welcome["frame_height"])
+                frames = [cv2.imencode(".jpg", cv2.resize(image, size, interpolation=cv2.INTER_AREA))[1].tobytes()
+                          for image in decoded]
+            for seq in range(per_client):
+                frame = frames[(index * per_client + seq) % len(frames)]
+                started = time.perf_counter()
+                if protocol == "binary":
+                    ws.send_bytes(FRAME_HEADER.pack(MSG_FRAME, PROTOCOL_VERSION, 0, seq) + frame)
+                    ws.receive_bytes()
+                else:
+                    ws.send_bytes(frame)
+                    ws.receive_text()
+                latencies.append((time.perf_counter() - started) * 1000.0)
+        return latencies, per_client
+
+    return run_scenario(client, "websocket", concurrency, list(range(concurrency)), task)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(args) -> Dict:
+    images = [open(path, "rb").read() for path in sorted(glob.glob(args.images))[:args.image_limit]]
+    videos = sorted(glob.glob(args.videos))[:args.video_limit]
+    params = {"tiled": "true"} if args.tiled else {}
+
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "target": args.url or "in-process",
+            "mock_model": args.mock,
+            "mock_latency_ms": args.mock_latency_ms if args.mock else None,
+            # In process the RSS covers the server; against a URL only this client
+            "rss_scope": "client" if args.url else "server",
+            "args": {k: v for k, v in vars(args).items() if k not in ("func", "output")},
+        },
+        "scenarios": {},
+    }
+
+    app_module = None
+    if args.url:
+        client_context = RemoteClient(args.url)
+    else:
+        if args.mock:
+            # The parity check would load the real weights
+            os.environ.setdefault("AEROSENTINEL_BACKEND_PARITY_CHECK", "false")
+        import app as app_module
+        from fastapi.testclient import TestClient
+
+        if args.mock:
+            mock = MockModel(dataset_names(), args.mock_latency_ms)
+            app_module.model = mock
+            app_module.get_worker_model = lambda: mock
+            # With the cascade enabled the mock screens too, so no real weights are loaded
+            if app_module.screener_model is not None:
+                app_module.screener_model = mock
+                app_module.get_worker_screener = lambda: mock
+        work_dir = tempfile.mkdtemp(prefix="bench_")
+        # Keep benchmark runs out of the real log catalog
+        app_module.log_catalog = app_module.LogCatalog(os.path.join(work_dir, "catalog"), app_module.THREAT_LEVELS)
+        client_context = TestClient(app_module.app)
+
+    with client_context as client:
+        if app_module is not None and not args.mock:
+            # Load and warm the model before anything is timed
+            app_module.model.get()
+        for scenario in args.scenario or SCENARIOS:
+            print(f"Running {scenario} scenario...", file=sys.stderr)
+            if scenario == "video":
+                if not videos:
+                    report["scenarios"][scenario] = {"error": f"No videos match {args.videos}"}
+                    continue
+                result = video_scenario(client, app_module, videos, args.concurrency,
+                                        work_dir if app_module is not None else None, args.sampling)
+            elif scenario == "frame":
+                result = frame_scenario(client, images, args.requests, args.concurrency, params)
+            else:
+                result = websocket_scenario(client, images, args.requests, args.concurrency, args.ws_protocol, params)
+            report["scenarios"][scenario] = result
+
+    if app_module is not None:
+        import shutil
+
+        shutil.rmtree(work_dir, ignore_errors=True)
+    report["meta"]["finished_at"] = datetime.now().isoformat()
+    return report
+
+
+def metric_value(scenario: Dict, metric: str) -> Optional[float]:
+    value = scenario
+    for part in metric.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare_reports(baseline: Dict, candidate: Dict, threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> Dict:
+    """
+    Compare two benchmark reports scenario by scenario.
+
+    A metric regresses when it moves in the bad direction by more than
+    threshold (relative to the baseline); stage timings are listed for
+    context but never fail the comparison.
+    """
+    comparison = {"threshold": threshold, "regressions": [], "scenarios": {}}
+    for name, base in baseline["scenarios"].items():
+        new = candidate["scenarios"].get(name)
+        if new is None or "error" in base or "error" in new:
+            continue
+        metrics = {}
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old_value, new_value = metric_value(base, metric), metric_value(new, metric)
+            if old_value is None or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value if old_value else 0.0
+            regressed = (-change if higher_is_better else change) > threshold
+            metrics[metric] = {"baseline": old_value, "candidate": new_value, "change": change, "regressed": regressed}
+            if regressed:
+                comparison["regressions"].append(f"{name}.{metric}")
+        stages = {}
+        for stage, timing in new.get("stages", {}).items():
+            old_timing = base.get("stages", {}).get(stage)
+            if old_timing and old_timing["mean_ms"]:
+                stages[stage] = {"baseline_ms": old_timing["mean_ms"], "candidate_ms": timing["mean_ms"],
+                                 "change": (timing["mean_ms"] - old_timing["mean_ms"]) / old_timing["mean_ms"]}
+        comparison["scenarios"][name] = {"metrics": metrics, "stages": stages}
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AeroSentinel detection API's hot paths")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run the benchmark and write a JSON report")
+    run.add_argument("--scenario", action="append", choices=SCENARIOS, help="Scenario to run (repeatable, default: all)")
+    run.add_argument("--concurrency", type=int, default=4, help="Concurrent clients (videos for the video scenario)")
+    run.add_argument("--requests", type=int, default=200, help="Frames sent by the frame and websocket scenarios")
+    run.add_argument("--images", default=IMAGE_GLOB, help="Glob of the frames to replay")
+    run.add_argument("--image-limit", type=int, default=64, help="Number of distinct frames to load")
+    run.add_argument("--videos", default=VIDEO_GLOB, help="Glob of the videos to replay")
+    run.add_argument("--video-limit", type=int, default=4, help="Number of videos to process")
+    run.add_argument("--sampling", choices=["adaptive", "fixed"], default="fixed",
+                     help="Frame sampling of the video scenario (fixed is reproducible)")
+    run.add_argument("--ws-protocol", choices=["json", "binary"], default="json")
+    run.add_argument("--tiled", action="store_true", help="Request tiled inference on the frame/websocket paths")
+    run.add_argument("--mock", action="store_true", help="Replace the model with a weight-free mock")
+    run.add_argument("--mock-latency-ms", type=float, default=0.0, help="Simulated inference time per image")
+    run.add_argument("--url", help="Benchmark a running server instead of the app in this process")
+    run.add_argument("--output", help="Write the report here instead of stdout")
+
+    compare = commands.add_parser("compare", help="Compare two reports and flag regressions")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                         help="Relative change that counts as a regression")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        if args.url and args.mock:
+            parser.error("--mock only applies to the in-process app; start the server with its own model instead")
+        report = run_benchmark(args)
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(text)
+        else:
+            print(text)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.candidate) as f:
+            candidate = json.load(f)
+        comparison = compare_reports(baseline, candidate, args.threshold)
+        print(json.dumps(comparison, indent=2))
+        # Non-zero exit so CI can gate on performance regressions
+        sys.exit(1 if comparison["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from postprocess import THREAT_RANK, get_postprocessor, to_numpy
+from tiling import TiledBoxes, nms
+
+CASCADE_MODES = ("frame", "crop")
+
+# Overlap at which an audited cascade detection counts as the main model's detection
+AUDIT_MATCH_IOU = 0.5
+
+# Answer paths the audit checks: the screener's own answer, and crops re-run on the main model.
+# Whole-image escalations are the main model's answer already, so they are never audited.
+AUDIT_PATHS = ("screened", "crop")
+AUDIT_COUNTS = ("images", "matched", "extra", "missed", "missed_high_threat")
+
+
+def box_iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of (N, 4) and (M, 4) x1, y1, x2, y2 boxes."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def match_detections(found: np.ndarray, reference: np.ndarray, iou_threshold: float = AUDIT_MATCH_IOU) -> np.ndarray:
+    """
+    Greedily pair detections with reference detections of the same class, best overlap first.
+
+    Args:
+        found: (N, 6) x1, y1, x2, y2, conf, cls
+        reference: (M, 6) x1, y1, x2, y2, conf, cls
+
+    Returns:
+        (M,) bool array, True for the reference detections that were found
+    """
+    matched = np.zeros(len(reference), dtype=bool)
+    if len(found) == 0 or len(reference) == 0:
+        return matched
+    iou = box_iou_matrix(found[:, :4], reference[:, :4])
+    iou[found[:, None, 5] != reference[None, :, 5]] = 0.0
+    used = np.zeros(len(found), dtype=bool)
+    for flat in np.argsort(-iou, axis=None):
+        i, j = divmod(int(flat), len(reference))
+        if iou[i, j] < iou_threshold:
+            break
+        if not used[i] and not matched[j]:
+            used[i] = matched[j] = True
+    return matched
+
+
+def crop_regions(boxes: np.ndarray, width: int, height: int, padding: float, min_size: int) -> np.ndarray:
+    """
+    Padded square regions around boxes, with overlapping regions joined.
+
+    Returns:
+        (K, 4) int array of x1, y1, x2, y2 within the frame
+    """
+    regions = []
+    for x1, y1, x2, y2 in boxes.tolist():
+        side = max(min_size, max(x2 - x1, y2 - y1) * (1.0 + 2.0 * padding))
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        regions.append([max(0, int(cx - side / 2)), max(0, int(cy - side / 2)),
+                        min(width, int(np.ceil(cx + side / 2))), min(height, int(np.ceil(cy + side / 2)))])
+    merged = True
+    while merged and len(regions) > 1:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return np.array(regions, dtype=np.int64).reshape(-1, 4)
+
+
+def result_data(result) -> np.ndarray:
+    """x1, y1, x2, y2, conf, cls rows of a YOLO (or stand-in) result."""
+    boxes = getattr(result, "boxes", None)
+    if boxes is None or len(boxes) == 0:
+        return np.empty((0, 6), dtype=np.float32)
+    data = to_numpy(boxes.data).astype(np.float32)
+    # Tracked results carry an extra id column before conf and cls
+    return np.concatenate([data[:, :4], data[:, -2:]], axis=1)
+
+
+class CascadeResult:
+    """
+    Stand-in for an ultralytics Results object holding the cascade's detections for one image.
+
+    speed sums the screener's and the main model's timings for the image;
+    cascade is the per-image decision report.
+    """
+
+    def __init__(self, data: np.ndarray, names: Dict[int, str], orig_shape: Tuple[int, int],
+                 speed: Dict[str, float], cascade: Dict):
+        self.boxes = TiledBoxes(data)
+        self.names = names
+        self.orig_shape = orig_shape
+        self.speed = speed
+        self.cascade = cascade
+
+
+class CascadeStats:
+    """Running totals of a cascade's decisions, cost and audited accuracy, for run metadata."""
+
+    FIELDS = ("images", "escalated", "escalated_uncertain", "escalated_threat", "escalated_unknown_class",
+              "heavy_images", "screener_ms", "heavy_ms", "audit_ms") + tuple(
+        f"audit_{path}_{count}" for path in AUDIT_PATHS for count in AUDIT_COUNTS)
+
+    def __init__(self, settings: Dict):
+        self.settings = settings
+        self.totals = {field: 0 for field in self.FIELDS}
+
+    def add(self, report: Dict):
+        for field in self.FIELDS:
+            self.totals[field] += report.get(field, 0)
+
+    def merge(self, totals: Dict):
+        """Add another run's totals (e.g. a video segment's)."""
+        self.add(totals or {})
+
+    def summary(self) -> Dict:
+        t = self.totals
+        images = max(1, t["images"])
+        return {
+            **self.settings,
+            **t,
+            "escalation_rate": t["escalated"] / images,
+            "heavy_images_per_image": t["heavy_images"] / images,
+            "screener_ms_per_image": t["screener_ms"] / images,
+            "heavy_ms_per_image": t["heavy_ms"] / images,
+            # Agreement with the main model run alone, per answer path (None where nothing was audited)
+            "accuracy": {path: self._accuracy(path) for path in AUDIT_PATHS},
+        }
+
+    def _accuracy(self, path: str) -> Optional[Dict]:
+        counts = {count: self.totals[f"audit_{path}_{count}"] for count in AUDIT_COUNTS}
+        if not counts["images"]:
+            return None
+        found = counts["matched"] + counts["extra"]
+        expected = counts["matched"] + counts["missed"]
+        precision = counts["matched"] / found if found else 1.0
+        recall = counts["matched"] / expected if expected else 1.0
+        return {
+            "audited_images": counts["images"],
+            "precision": precision,
+            "recall": recall,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "missed_high_threat": counts["missed_high_threat"],
+        }
+
+
+class CascadeDetector:
+    """
+    Two-stage detector: a small screener model runs on every image and the
+    main (heavy) model only where the screener's answer cannot be trusted.
+
+    An image escalates when the screener finds a detection that is uncertain
+    (confidence between screen_conf and accept_conf), at or above
+    escalate_level, or of a class the main model does not know. Images with
+    nothing above screen_conf, or only confident low-threat detections, keep
+    the screener's answer. In "frame" mode an escalated image is re-run whole
+    on the main model; in "crop" mode only padded crops around the escalated
+    detections are (falling back to the whole image past max_crops), and the
+    screener's trusted detections are kept alongside.
+
+    A random audit_rate share of the images the main model did not answer
+    whole (kept screener answers and crop re-runs) is also run through the
+    main model alone and compared with the cascade's output, so the run
+    reports precision and recall against the main model, and how many
+    High/Critical objects the cascade missed, separately for each path.
+
+    The detector stands in for a YOLO model (predict() and names); stats
+    accumulate over its lifetime, so use one per run.
+
+    Args:
+        screener: Small YOLO model run on every image
+        heavy: Main YOLO model; its class table is the cascade's
+        threat_levels: Lower-case class name -> threat level
+        screen_conf: Screener confidence below which detections are ignored
+        accept_conf: Screener confidence from which a detection is trusted
+        escalate_level: Threat level from which detections always escalate
+        mode: "frame" or "crop"
+        crop_padding: Context added around an escalated box on each side, as a fraction of its size
+        min_crop_size: Smallest crop side in pixels
+        max_crops: Most crops per image before the whole image is re-run instead
+        audit_rate: Fraction of screened and crop-answered images also run through the main model alone
+        seed: Seed of the audit sampling
+    """
+
+    def __init__(self, screener, heavy, threat_levels: Dict[str, str], screen_conf: float = 0.25,
+                 accept_conf: float = 0.7, escalate_level: str = "High", mode: str = "frame",
+                 crop_padding: float = 0.5, min_crop_size: int = 160, max_crops: int = 4,
+                 audit_rate: float = 0.05, seed: Optional[int] = None):
+        if mode not in CASCADE_MODES:
+            raise ValueError(f"Unknown cascade mode: {mode} (use {' or '.join(CASCADE_MODES)})")
+        if escalate_level not in THREAT_RANK:
+            raise ValueError(f"Unknown threat level: {escalate_level}")
+        if not 0.0 <= screen_conf <= accept_conf <= 1.0:
+            raise ValueError("Cascade thresholds must satisfy 0 <= screen_conf <= accept_conf <= 1")
+        self.screener = screener
+        self.heavy = heavy
+        self.threat_levels = threat_levels
+        self.screen_conf = screen_conf
+        self.accept_conf = accept_conf
+        self.escalate_level = escalate_level
+        self.escalate_rank = THREAT_RANK[escalate_level]
+        self.mode = mode
+        self.crop_padding = crop_padding
+        self.min_crop_size = min_crop_size
+        self.max_crops = max_crops
+        self.audit_rate = max(0.0, min(1.0, audit_rate))
+        self.stats = CascadeStats(self.describe())
+        self._random = random.Random(seed)
+        self._class_map: Optional[np.ndarray] = None
+
+    def describe(self) -> Dict:
+        """Settings of this cascade (for reports)."""
+        return {"screen_conf": self.screen_conf, "accept_conf": self.accept_conf,
+                "escalate_level": self.escalate_level, "mode": self.mode, "crop_padding": self.crop_padding,
+                "min_crop_size": self.min_crop_size, "max_crops": self.max_crops, "audit_rate": self.audit_rate}
+
+    @property
+    def names(self):
+        return self.heavy.names
+
+    def predict(self, source, conf: float = 0.25, verbose: bool = False, **kwargs) -> List[CascadeResult]:
+        images = source if isinstance(source, list) else [source]
+        if not images:
+            return []
+        heavy_names = self.heavy.names
+        postprocessor = get_postprocessor(heavy_names, self.threat_levels)
+        class_map = self._screener_class_map(heavy_names)
+
+        started = time.perf_counter()
+        screened = self.screener.predict(source=images, conf=self.screen_conf, verbose=False, **kwargs)
+        screener_ms = (time.perf_counter() - started) * 1000.0 / len(images)
+
+        # Decide per image and collect everything the main model has to run in one batch
+        plans = []
+        heavy_inputs: List[np.ndarray] = []
+        for image, result in zip(images, screened):
+            data = result_data(result)
+            if len(data):
+                data[:, 5] = class_map[data[:, 5].astype(np.int64)]
+            known = data[:, 5] >= 0
+            ranks = np.where(known, postprocessor.threat_ranks[np.where(known, data[:, 5], 0).astype(np.int64)], 0)
+            uncertain = data[:, 4] < self.accept_conf
+            threat = known & (ranks >= self.escalate_rank)
+            escalate = uncertain | threat | ~known
+            report = {"images": 1, "screener_ms": screener_ms,
+                      "escalated": int(escalate.any()),
+                      "escalated_uncertain": int(uncertain.any()),
+                      "escalated_threat": int(threat.any()),
+                      "escalated_unknown_class": int((~known).any())}
+            plan = {"image": image, "data": data, "escalate": escalate, "report": report,
+                    "speed": dict(getattr(result, "speed", None) or {}), "regions": None, "whole": False,
+                    "path": "screened", "first": len(heavy_inputs)}
+            if escalate.any():
+                height, width = image.shape[:2]
+                regions = np.array([[0, 0, width, height]], dtype=np.int64)
+                if self.mode == "crop":
+                    crops = crop_regions(data[escalate, :4], width, height, self.crop_padding, self.min_crop_size)
+                    if len(crops) <= self.max_crops:
+                        regions = crops
+                plan["regions"] = regions
+                plan["whole"] = tuple(regions[0]) == (0, 0, width, height)
+                plan["path"] = "frame" if plan["whole"] else "crop"
+                heavy_inputs.extend(image[y1:y2, x1:x2] for x1, y1, x2, y2 in regions)
+            plans.append(plan)
+
+        heavy_results = []
+        heavy_ms = 0.0
+        if heavy_inputs:
+            started = time.perf_counter()
+            heavy_results = self.heavy.predict(source=heavy_inputs, conf=conf, verbose=False, **kwargs)
+            heavy_ms = (time.perf_counter() - started) * 1000.0
+
+        outputs = []
+        for plan in plans:
+            data, report, speed = plan["data"], plan["report"], plan["speed"]
+            regions = plan["regions"]
+            if regions is None:
+                final = data[data[:, 4] >= conf]
+            else:
+                # Crops only replace the escalated detections; the trusted ones stand
+                parts = [] if plan["whole"] else [data[~plan["escalate"] & (data[:, 4] >= conf)]]
+                region_results = heavy_results[plan["first"]:plan["first"] + len(regions)]
+                for region_result, (x1, y1, _, _) in zip(region_results, regions):
+                    part = result_data(region_result)
+                    part[:, [0, 2]] += x1
+                    part[:, [1, 3]] += y1
+                    parts.append(part)
+                    for key, value in (getattr(region_result, "speed", None) or {}).items():
+                        speed[key] = (speed.get(key) or 0.0) + (value or 0.0)
+                final = np.concatenate(parts) if parts else np.empty((0, 6), dtype=np.float32)
+                if not plan["whole"]:
+                    final = final[nms(final[:, :4], final[:, 4], final[:, 5].astype(np.int64), 0.6)]
+                report["heavy_images"] = len(regions)
+                report["heavy_ms"] = heavy_ms * len(regions) / len(heavy_inputs)
+            plan["final"] = final.astype(np.float32)
+            outputs.append(CascadeResult(plan["final"], heavy_names, plan["image"].shape[:2], speed, report))
+
+        self._audit(plans, conf, postprocessor, kwargs)
+        for output in outputs:
+            self.stats.add(output.cascade)
+        return outputs
+
+    def _audit(self, plans: List[Dict], conf: float, postprocessor, kwargs: Dict):
+        """Compare a random share of the screened and crop-answered images with the main model run alone."""
+        audited = [plan for plan in plans
+                   if plan["path"] in AUDIT_PATHS and self.audit_rate > 0 and self._random.random() < self.audit_rate]
+        if not audited:
+            return
+        started = time.perf_counter()
+        results = self.heavy.predict(source=[plan["image"] for plan in audited], conf=conf, verbose=False, **kwargs)
+        audit_ms = (time.perf_counter() - started) * 1000.0
+        for plan, result in zip(audited, results):
+            final = plan["final"]
+            reference = result_data(result)
+            found = match_detections(final, reference)
+            missed = reference[~found]
+            ranks = postprocessor.threat_ranks[missed[:, 5].astype(np.int64)] if len(missed) else np.empty(0)
+            report = plan["report"]
+            prefix = f"audit_{plan['path']}_"
+            report["audit_ms"] = audit_ms / len(audited)
+            report[prefix + "images"] = 1
+            report[prefix + "matched"] = int(found.sum())
+            report[prefix + "extra"] = len(final) - int(found.sum())
+            report[prefix + "missed"] = len(missed)
+            report[prefix + "missed_high_threat"] = int((ranks >= self.escalate_rank).sum())
+
+    def _screener_class_map(self, heavy_names: Dict[int, str]) -> np.ndarray:
+        """Screener class id -> main model class id by name (-1 where the main model lacks the class)."""
+        if self._class_map is None:
+            by_name = {name.lower(): class_id for class_id, name in heavy_names.items()}
+            names = self.screener.names
+            size = max(names) + 1 if names else 0
+            self._class_map = np.array([by_name.get(names.get(i, "").lower(), -1) for i in range(size)],
+                                       dtype=np.float32)
+        return self._class_map
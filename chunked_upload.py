@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process servers only
+    fcntl = None
+
+# Session descriptors live next to the uploads so they survive a server restart
+SESSION_DIR_NAME = ".sessions"
+
+
+class UploadError(Exception):
+    """A chunk or commit was rejected; status_code is the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, message: str, offset: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+class UploadSession:
+    """
+    One resumable upload, written in place at its final path.
+
+    The number of bytes received is the size of the file on disk, so after a
+    dropped connection (or a server restart) the client asks for the offset
+    and continues from there. The SHA-256 is updated as chunks arrive; bytes
+    another worker process appended are folded in by sync(), and the hash is
+    rebuilt from the file only when a session is reloaded or the file shrank.
+    """
+
+    def __init__(self, upload_id: str, path: str, filename: str, total_size: Optional[int] = None,
+                 sha256: Optional[str] = None, created_at: Optional[float] = None):
+        self.upload_id = upload_id
+        self.path = path
+        self.filename = filename
+        self.total_size = total_size
+        self.expected_sha256 = sha256.lower() if sha256 else None
+        self.created_at = created_at or time.time()
+        self.updated_at = self.created_at
+        self.lock = threading.Lock()
+        self._hasher = hashlib.sha256()
+        self.received = 0
+        if os.path.exists(path):
+            self.sync(os.path.getsize(path))
+
+    def sync(self, size: int):
+        """Catch up with the file on disk, which other worker processes may have appended to."""
+        if size == self.received:
+            return
+        if size < self.received:
+            self._hasher = hashlib.sha256()
+            self.received = 0
+        with open(self.path, "rb") as f:
+            f.seek(self.received)
+            while self.received < size:
+                block = f.read(min(1024 * 1024, size - self.received))
+                if not block:
+                    break
+                self._hasher.update(block)
+                self.received += len(block)
+        self.updated_at = time.time()
+
+    def write(self, f, data: bytes):
+        """Append bytes through the locked file handle and fold them into the checksum."""
+        f.write(data)
+        f.flush()
+        self._hasher.update(data)
+        self.received += len(data)
+        self.updated_at = time.time()
+
+    def sha256(self) -> str:
+        return self._hasher.hexdigest()
+
+    def descriptor(self) -> Dict:
+        return {
+            "upload_id": self.upload_id,
+            "path": self.path,
+            "filename": self.filename,
+            "total_size": self.total_size,
+            "sha256": self.expected_sha256,
+            "created_at": self.created_at,
+        }
+
+    def status(self) -> Dict:
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "offset": self.received,
+            "total_size": self.total_size,
+            "complete": self.total_size is not None and self.received == self.total_size,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class ChunkedUploadManager:
+    """
+    Resumable uploads: init, append chunks at an offset, commit.
+
+    Chunks are appended straight to the file the job will read, so nothing is
+    spooled and copied afterwards, and the size limit is checked against every
+    piece before it is written.
+
+    Several worker processes may serve the same session: every operation
+    takes an exclusive lock on the upload file and re-reads its size first,
+    so offsets, size limits and checksums always reflect what is on disk.
+
+    Args:
+        upload_dir: Directory the finished uploads end up in
+        max_bytes: Largest accepted upload
+        session_ttl_seconds: Uncommitted uploads idle for longer than this are deleted
+    """
+
+    def __init__(self, upload_dir: str, max_bytes: int, session_ttl_seconds: float = 24 * 3600):
+        self.upload_dir = upload_dir
+        self.max_bytes = max_bytes
+        self.session_ttl_seconds = session_ttl_seconds
+        self.session_dir = os.path.join(upload_dir, SESSION_DIR_NAME)
+        os.makedirs(self.session_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, UploadSession] = {}
+
+    def init(self, filename: str, total_size: Optional[int] = None, sha256: Optional[str] = None) -> Dict:
+        """Open a new upload session and return its status."""
+        if total_size is not None and total_size > self.max_bytes:
+            raise UploadError(413, f"Upload of {total_size} bytes exceeds the {self.max_bytes} byte limit")
+        if sha256 is not None and not re.fullmatch(r"[0-9a-fA-F]{64}", sha256):
+            raise UploadError(400, "sha256 must be 64 hex digits")
+        self.expire()
+
+        upload_id = uuid.uuid4().hex
+        safe_name = os.path.basename(filename or "video") or "video"
+        path = os.path.join(self.upload_dir, f"{upload_id}_{safe_name}")
+        session = UploadSession(upload_id, path, safe_name, total_size, sha256)
+        open(path, "wb").close()
+        with open(self._descriptor_path(upload_id), "w") as f:
+            json.dump(session.descriptor(), f)
+        with self._lock:
+            self._sessions[upload_id] = session
+        return session.status()
+
+    def append(self, upload_id: str, data: bytes, offset: int) -> int:
+        """
+        Append one piece of a chunk at offset and return the new offset.
+
+        Request handlers call this for every piece of the body as it arrives,
+        so bytes received before a dropped connection are kept. The offset
+        must equal the bytes already received; otherwise a 409 is raised
+        carrying the offset to resume from (this also rejects a second client
+        writing to the same session).
+        """
+        session = self.get(upload_id)
+        with self._locked(session) as f:
+            if session.received != offset:
+                raise UploadError(409, f"Expected offset {session.received}, got {offset}", session.received)
+            self._check_size(session, len(data))
+            if data:
+                session.write(f, data)
+            return session.received
+
+    def status(self, upload_id: str) -> Dict:
+        session = self.get(upload_id)
+        with self._locked(session):
+            return session.status()
+
+    def commit(self, upload_id: str, sha256: Optional[str] = None) -> Dict:
+        """
+        Finish an upload after checking its size and checksum.
+
+        Returns:
+            Status of the finished upload, including its path and sha256
+        """
+        session = self.get(upload_id)
+        with self._locked(session):
+            if session.received == 0:
+                raise UploadError(400, "Upload is empty", 0)
+            if session.total_size is not None and session.received != session.total_size:
+                raise UploadError(409, f"Upload incomplete: {session.received} of {session.total_size} bytes",
+                                  session.received)
+            expected = (sha256 or session.expected_sha256 or "").lower()
+            actual = session.sha256()
+            if expected and expected != actual:
+                raise UploadError(422, f"Checksum mismatch: expected {expected}, got {actual}", session.received)
+            self._forget(upload_id)
+        result = session.status()
+        result.update({"path": session.path, "sha256": actual, "complete": True})
+        return result
+
+    def abort(self, upload_id: str):
+        """Drop an upload and delete what was received."""
+        session = self.get(upload_id)
+        with self._locked(session):
+            self._forget(upload_id)
+            os.remove(session.path)
+
+    def get(self, upload_id: str) -> UploadSession:
+        """Return a live session, reloading it from its descriptor after a restart."""
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is not None:
+                return session
+            descriptor_path = self._descriptor_path(upload_id)
+            if not re.fullmatch(r"[0-9a-f]{32}", upload_id) or not os.path.exists(descriptor_path):
+                raise UploadError(404, "Upload not found")
+            with open(descriptor_path) as f:
+                descriptor = json.load(f)
+            descriptor.pop("upload_id", None)
+            session = self._sessions[upload_id] = UploadSession(upload_id, **descriptor)
+            session.updated_at = os.path.getmtime(session.path) if os.path.exists(session.path) else time.time()
+            return session
+
+    def expire(self):
+        """Delete uncommitted uploads that have been idle for longer than the TTL."""
+        cutoff = time.time() - self.session_ttl_seconds
+        for name in os.listdir(self.session_dir):
+            upload_id, ext = os.path.splitext(name)
+            if ext != ".json" or upload_id in self._sessions:
+                continue
+            descriptor_path = self._descriptor_path(upload_id)
+            try:
+                with open(descriptor_path) as f:
+                    path = json.load(f)["path"]
+                idle_since = os.path.getmtime(path) if os.path.exists(path) else os.path.getmtime(descriptor_path)
+            except (OSError, ValueError, KeyError):
+                continue
+            if idle_since < cutoff:
+                if os.path.exists(path):
+                    os.remove(path)
+                os.remove(descriptor_path)
+        with self._lock:
+            stale = [s for s in self._sessions.values() if s.updated_at < cutoff]
+        for session in stale:
+            try:
+                self.abort(session.upload_id)
+            except UploadError:
+                pass
+
+    @contextmanager
+    def _locked(self, session: UploadSession) -> Iterator:
+        """
+        Hold a session exclusively across threads and worker processes, synced with its file.
+
+        Yields the file opened for appending. A session committed or aborted
+        by another process is dropped here and reported as not found.
+        """
+        with session.lock:
+            try:
+                fd = os.open(session.path, os.O_WRONLY | os.O_APPEND)
+            except FileNotFoundError:
+                self._forget(session.upload_id)
+                raise UploadError(404, "Upload not found")
+            with os.fdopen(fd, "ab") as f:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                if not os.path.exists(self._descriptor_path(session.upload_id)):
+                    with self._lock:
+                        self._sessions.pop(session.upload_id, None)
+                    raise UploadError(404, "Upload not found")
+                session.sync(os.fstat(fd).st_size)
+                yield f
+
+    def _check_size(self, session: UploadSession, size: int):
+        limit = min(self.max_bytes, session.total_size) if session.total_size is not None else self.max_bytes
+        if session.received + size > limit:
+            raise UploadError(413, f"Upload exceeds its {limit} byte limit", session.received)
+
+    def _forget(self, upload_id: str):
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+        try:
+            os.remove(self._descriptor_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def _descriptor_path(self, upload_id: str) -> str:
+        return os.path.join(self.session_dir, f"{upload_id}.json")
@@ -0,0 +1,134 @@
+import json
+import os
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+# Layout of a detection log file. It stays a valid JSON document, but every
+# frame record sits on its own line so the file can be written incrementally
+# and followed while a video is still being processed:
+#
+#   {"frames": [
+#   {"frame_id": 0, ...}
+#   ,{"frame_id": 4, ...}
+#   ],
+#   "metadata": {...}}
+LOG_HEADER = '{"frames": [\n'
+LOG_FOOTER = "],\n"
+
+
+class DetectionLogWriter:
+    """
+    Writes a detection log frame by frame so memory use does not grow with video length.
+
+    Args:
+        path: Destination .json file
+        flush_every: Number of frames buffered before the file is flushed for followers
+    """
+
+    def __init__(self, path: str, flush_every: int = 1):
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self.frames_written = 0
+        self._file = open(path, "w")
+        self._file.write(LOG_HEADER)
+        self._file.flush()
+
+    def write_frame(self, frame_data: Dict):
+        """Append one frame record to the log."""
+        prefix = "," if self.frames_written else ""
+        self._file.write(prefix + json.dumps(frame_data, separators=(",", ":")) + "\n")
+        self.frames_written += 1
+        if self.frames_written % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self, metadata: Optional[Dict] = None):
+        """Terminate the frames array, write the run metadata and close the file."""
+        if self._file.closed:
+            return
+        self._file.write(LOG_FOOTER)
+        self._file.write('"metadata": ' + json.dumps(metadata or {}) + "}\n")
+        self._file.close()
+
+    def abort(self):
+        """Close the file without metadata (the run failed part way)."""
+        if not self._file.closed:
+            self._file.close()
+
+
+def parse_frame_line(line: str) -> Optional[Dict]:
+    """Return the frame record stored on a log line, or None for structural lines."""
+    line = line.strip().lstrip(",")
+    if not line.startswith('{"frame_id"'):
+        return None
+    return json.loads(line)
+
+
+def follow_detection_log(path: str, is_finished: Callable[[], bool],
+                         poll_interval: float = 0.2) -> Iterator[Dict]:
+    """
+    Yield frame records from a detection log as they are written, like `tail -f`.
+
+    Args:
+        path: Log file being written by a DetectionLogWriter
+        is_finished: Returns True once the writer is done (successfully or not)
+        poll_interval: Seconds to sleep when no new complete line is available
+    """
+    while not os.path.exists(path):
+        if is_finished():
+            return
+        time.sleep(poll_interval)
+
+    with open(path, "r") as f:
+        pending = ""
+        while True:
+            # Check before reading so a finished writer's last lines are still drained
+            finished = is_finished()
+            chunk = f.readline()
+            if chunk:
+                pending += chunk
+                if not pending.endswith("\n"):
+                    continue
+                line, pending = pending, ""
+                if line.startswith("]"):
+                    return
+                frame = parse_frame_line(line)
+                if frame is not None:
+                    yield frame
+            elif finished:
+                return
+            else:
+                time.sleep(poll_interval)
+
+
+def iter_log_frames(path: str) -> Iterator[Dict]:
+    """Yield the frame records of a finished log without loading the whole file."""
+    with open(path, "r") as f:
+        first = f.readline()
+        if first != LOG_HEADER:
+            # Logs written before incremental logging are a single JSON document
+            f.seek(0)
+            yield from json.load(f).get("frames", [])
+            return
+        for line in f:
+            if line.startswith("]"):
+                return
+            frame = parse_frame_line(line)
+            if frame is not None:
+                yield frame
+
+
+def read_log_metadata(path: str) -> Dict:
+    """Return the run metadata of a finished log ({} if the run never finished)."""
+    with open(path, "r") as f:
+        first = f.readline()
+        if first != LOG_HEADER:
+            f.seek(0)
+            return json.load(f).get("metadata", {})
+        # Incremental logs end with the metadata line, so only the tail is read
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 65536))
+        for line in reversed(f.read().splitlines()):
+            if line.startswith('"metadata": '):
+                return json.loads(line[len('"metadata": '):-1])
+    return {}
@@ -0,0 +1,391 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# Job states reported by the status endpoint
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue already holds the maximum number of pending jobs."""
+
+
+class JobManager:
+    """
+    Bounded pool of inference workers draining a priority queue of jobs.
+
+    Jobs are plain dicts so they can be returned straight from the API. Lower
+    priority numbers run first; jobs with the same priority run in submission order.
+
+    Args:
+        handler: Function called with the job payload as keyword arguments.
+            In "process" mode it must be a top-level (picklable) function.
+        workers: Number of jobs allowed to run at the same time
+        mode: "thread" to run jobs on worker threads, "process" to run them
+            in a process pool so inference never competes with the API for the GIL
+        max_pending: Maximum number of queued (not yet running) jobs
+        max_finished: Number of finished jobs kept around for status/result lookups
+    """
+
+    def __init__(self, handler: Callable, workers: int = 2, mode: str = "thread",
+                 max_pending: int = 100, max_finished: int = 500):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown worker mode: {mode}")
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.mode = mode
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._jobs: Dict[str, Dict] = {}
+        self._finished: List[str] = []
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._running = False
+
+    def start(self):
+        """Start the worker threads (and the process pool in "process" mode)."""
+        if self._running:
+            return
+        self._running = True
+        if self.mode == "process":
+            # Spawned, not forked: the server already runs threads whose locks a fork could copy while held
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"inference-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop accepting work and wait for the running jobs to finish."""
+        if not self._running:
+            return
+        self._running = False
+        for _ in self._threads:
+            # Sentinels sort after every real job
+            self._queue.put((float("inf"), next(self._counter), None))
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def submit(self, payload: Dict, priority: int = 5, kind: str = "video") -> Dict:
+        """
+        Queue a job and return its status record immediately.
+
+        Raises:
+            QueueFullError: If max_pending jobs are already waiting
+        """
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job["status"] == JOB_QUEUED)
+            if pending >= self.max_pending:
+                raise QueueFullError(f"Job queue is full ({pending} pending jobs)")
+
+            job_id = str(uuid.uuid4())
+            job = {
+                "job_id": job_id,
+                "kind": kind,
+                "status": JOB_QUEUED,
+                "priority": priority,
+                "created_at": datetime.now().isoformat(),
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+                "result": None,
+                "payload": payload,
+                "_done": threading.Event(),
+            }
+            self._jobs[job_id] = job
+            self._queue.put((priority, next(self._counter), job_id))
+        return self.status(job_id)
+
+    def record_completed(self, payload: Dict, result: Dict, priority: int = 5, kind: str = "video") -> Dict:
+        """Register a job that is already finished (e.g. served from a cache) and return its status."""
+        now = datetime.now().isoformat()
+        job_id = str(uuid.uuid4())
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": JOB_COMPLETED,
+            "priority": priority,
+            "created_at": now,
+            "started_at": now,
+            "finished_at": now,
+            "error": None,
+            "result": result,
+            "payload": payload,
+            "_done": threading.Event(),
+            "run_seconds": 0.0,
+        }
+        job["_done"].set()
+        with self._lock:
+            self._jobs[job_id] = job
+            self._remember_finished(job_id)
+        return self.status(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return the internal job record, or None if the job is unknown or expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Return the public status of a job (without its payload and result)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            info = {k: v for k, v in job.items() if k not in ("payload", "result", "_done")}
+            if job["status"] == JOB_QUEUED:
+                info["queue_position"] = self._queue_position(job)
+            return info
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Block until the job has finished (or the timeout expires) and return its record."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job["_done"].wait(timeout)
+        return job
+
+    def stats(self) -> Dict:
+        """Return queue depth and worker utilisation counters."""
+        with self._lock:
+            counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_COMPLETED: 0, JOB_FAILED: 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "jobs": counts,
+        }
+
+    def _queue_position(self, job: Dict) -> int:
+        # Caller holds the lock
+        return sum(
+            1 for other in self._jobs.values()
+            if other["status"] == JOB_QUEUED
+            and (other["priority"], other["created_at"]) < (job["priority"], job["created_at"])
+        )
+
+    def _worker_loop(self):
+        while True:
+            _, _, job_id = self._queue.get()
+            if job_id is None:
+                break
+            job = self.get(job_id)
+            if job is None:
+                continue
+
+            with self._lock:
+                job["status"] = JOB_RUNNING
+                job["started_at"] = datetime.now().isoformat()
+            start_time = time.time()
+            result, status, error = self._execute(job["payload"])
+
+            with self._lock:
+                job["status"] = status
+                job["result"] = result
+                job["error"] = error
+                job["finished_at"] = datetime.now().isoformat()
+                job["run_seconds"] = time.time() - start_time
+                self._remember_finished(job_id)
+            job["_done"].set()
+
+    def _execute(self, payload: Dict):
+        """Run the handler on a payload; returns (result, status, error)."""
+        try:
+            if self._executor is not None:
+                result = self._executor.submit(self.handler, **payload).result()
+            else:
+                result = self.handler(**payload)
+            return result, JOB_COMPLETED, None
+        except Exception as e:
+            traceback.print_exc()
+            return None, JOB_FAILED, str(e)
+
+    def _remember_finished(self, job_id: str):
+        # Caller holds the lock
+        self._finished.append(job_id)
+        # Forget the oldest finished jobs so memory stays bounded
+        while len(self._finished) > self.max_finished:
+            self._jobs.pop(self._finished.pop(0), None)
+
+
+class SharedDoneEvent:
+    """Stand-in for a job's done Event when the job lives in shared state (polls its status)."""
+
+    def __init__(self, manager: "SharedJobManager", job_id: str):
+        self.manager = manager
+        self.job_id = job_id
+
+    def is_set(self) -> bool:
+        job = self.manager.state.get_job(self.job_id)
+        return job is None or job["status"] in (JOB_COMPLETED, JOB_FAILED)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.is_set():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.manager.poll_seconds)
+        return True
+
+
+class SharedJobManager(JobManager):
+    """
+    JobManager whose queue and job records live in shared state (see shared_state),
+    so any worker process can accept a job, report its status or serve its result.
+
+    Worker threads claim the next queued job from the shared queue whenever
+    they are free, so jobs go to whichever process has spare capacity.
+    Jobs left running by a worker that stopped sending heartbeats are
+    failed by fail_orphaned_jobs().
+
+    Args:
+        handler: Function called with the job payload as keyword arguments
+        state: Shared state backend
+        worker_id: This process's worker id (recorded on the jobs it claims)
+        poll_seconds: Idle wait between checks of the shared queue
+        (other arguments as for JobManager)
+    """
+
+    def __init__(self, handler: Callable, state, worker_id: str, workers: int = 2, mode: str = "thread",
+                 max_pending: int = 100, max_finished: int = 500, poll_seconds: float = 0.5):
+        super().__init__(handler, workers=workers, mode=mode, max_pending=max_pending, max_finished=max_finished)
+        self.state = state
+        self.worker_id = worker_id
+        self.poll_seconds = poll_seconds
+        self.running_jobs = 0
+        self._wakeup = threading.Event()
+
+    def stop(self):
+        """Stop claiming jobs and wait for the running ones to finish."""
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def submit(self, payload: Dict, priority: int = 5, kind: str = "video") -> Dict:
+        pending = self.state.job_counts().get(JOB_QUEUED, 0)
+        if pending >= self.max_pending:
+            raise QueueFullError(f"Job queue is full ({pending} pending jobs)")
+        job_id = str(uuid.uuid4())
+        self.state.put_job({
+            "job_id": job_id,
+            "kind": kind,
+            "status": JOB_QUEUED,
+            "priority": priority,
+            "created_at": datetime.now().isoformat(),
+            "payload": payload,
+        })
+        # Wake a local worker thread if one is idle
+        self._wakeup.set()
+        return self.status(job_id)
+
+    def record_completed(self, payload: Dict, result: Dict, priority: int = 5, kind: str = "video") -> Dict:
+        now = datetime.now().isoformat()
+        job_id = str(uuid.uuid4())
+        self.state.put_job({
+            "job_id": job_id,
+            "kind": kind,
+            "status": JOB_COMPLETED,
+            "priority": priority,
+            "created_at": now,
+            "started_at": now,
+            "finished_at": now,
+            "run_seconds": 0.0,
+            "payload": payload,
+            "result": result,
+        })
+        return self.status(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return a snapshot of the job record (re-fetch it to see later changes)."""
+        job = self.state.get_job(job_id)
+        if job is not None:
+            job["_done"] = SharedDoneEvent(self, job_id)
+        return job
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        job = self.state.get_job(job_id)
+        if job is None:
+            return None
+        info = {k: v for k, v in job.items() if k not in ("payload", "result")}
+        if job["status"] == JOB_QUEUED:
+            info["queue_position"] = self.state.queue_position(job_id)
+        return info
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        if self.state.get_job(job_id) is None:
+            return None
+        SharedDoneEvent(self, job_id).wait(timeout)
+        return self.get(job_id)
+
+    def stats(self) -> Dict:
+        counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_COMPLETED: 0, JOB_FAILED: 0}
+        counts.update(self.state.job_counts())
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "jobs": counts,
+            "worker_id": self.worker_id,
+            "running_here": self.running_jobs,
+        }
+
+    def fail_orphaned_jobs(self, worker_ids: List[str]) -> int:
+        """Fail the running jobs of workers that are gone (their results will never arrive)."""
+        return self.state.fail_jobs_of(worker_ids, {
+            "status": JOB_FAILED,
+            "error": "Worker stopped while running the job",
+            "finished_at": datetime.now().isoformat(),
+        })
+
+    def _worker_loop(self):
+        while self._running:
+            self._wakeup.clear()
+            job = self.state.claim_job(self.worker_id, {
+                "status": JOB_RUNNING,
+                "started_at": datetime.now().isoformat(),
+            })
+            if job is None:
+                self._wakeup.wait(self.poll_seconds)
+                continue
+
+            with self._lock:
+                self.running_jobs += 1
+            start_time = time.time()
+            result, status, error = self._execute(job["payload"])
+            self.state.update_job(job["job_id"], {
+                "status": status,
+                "result": result,
+                "error": error,
+                "finished_at": datetime.now().isoformat(),
+                "run_seconds": time.time() - start_time,
+            })
+            with self._lock:
+                self.running_jobs -= 1
+            self.state.prune_jobs(self.max_finished)
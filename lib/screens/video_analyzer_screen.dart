@@ -344,7 +344,7 @@ class _VideoAnalyzerScreenState extends State<VideoAnalyzerScreen> with SingleTi
     try {
       var request = http.MultipartRequest(
         'POST',
-        Uri.parse('https://orange-fiesta-rvgxwgwr6pq2wxq9-8000.app.github.dev/process-video/'),
+        Uri.parse('https://orange-fiesta-rvgxwgwr6pq2wxq9-8000.app.github.dev/process-video/?wait=true'),
       );
       request.files.add(await http.MultipartFile.fromPath('video', job.file.path));
       var response = await request.send();
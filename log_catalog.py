@@ -0,0 +1,363 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from detection_log import iter_log_frames, read_log_metadata
+from postprocess import THREAT_LEVEL_ORDER, THREAT_LEVELS, THREAT_RANK
+
+# Columns of a run's detection table, one .npy file each so they can be memory-mapped
+COLUMN_DTYPES = {
+    "frame_id": np.int32,
+    "t": np.float32,
+    "class_id": np.int16,
+    "conf": np.float32,
+    "x1": np.float32,
+    "y1": np.float32,
+    "x2": np.float32,
+    "y2": np.float32,
+    "track_id": np.int32,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    columns_dir TEXT NOT NULL,
+    json_log TEXT,
+    analysed_at REAL NOT NULL,
+    frames INTEGER NOT NULL,
+    detections INTEGER NOT NULL,
+    t_min REAL,
+    t_max REAL,
+    highest_threat TEXT NOT NULL,
+    class_names TEXT NOT NULL,
+    class_counts TEXT NOT NULL,
+    threat_summary TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_analysed_at ON runs (analysed_at);
+"""
+
+
+def run_id_from_log(path: str) -> str:
+    """Run id of a JSON log (the uuid of detection_log_<uuid>.json)."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem[len("detection_log_"):] if stem.startswith("detection_log_") else stem
+
+
+class ColumnarLogWriter:
+    """
+    Collects a run's detections as columns and saves them as one .npy file per column.
+
+    Frames are buffered as small per-frame arrays and concatenated once on
+    close(), so a run costs one allocation per column rather than per box.
+
+    Args:
+        directory: Destination directory of the run's columns
+        class_names: Class table (class id -> lower-case name); unseen names are appended
+        threat_levels: Lower-case class name -> threat level
+    """
+
+    def __init__(self, directory: str, class_names: Optional[List[str]] = None,
+                 threat_levels: Optional[Dict[str, str]] = None):
+        self.directory = directory
+        self.class_names = list(class_names or [])
+        self.threat_levels = threat_levels or {}
+        self.frames_written = 0
+        self._class_ids = {name: i for i, name in enumerate(self.class_names)}
+        self._chunks: Dict[str, List[np.ndarray]] = {name: [] for name in COLUMN_DTYPES}
+
+    def write_frame(self, frame_data: Dict):
+        """Append the detections of one detection log frame record."""
+        self.frames_written += 1
+        detections = frame_data.get("detections", [])
+        if not detections:
+            return
+        count = len(detections)
+        boxes = np.array([d["bounding_box"] for d in detections], dtype=np.float32).reshape(count, 4)
+        columns = {
+            "frame_id": np.full(count, frame_data["frame_id"]),
+            "t": np.full(count, frame_data.get("timestamp", 0.0)),
+            "class_id": [self._class_id(d.get("class", d.get("object_class", "unknown"))) for d in detections],
+            "conf": [d["confidence"] for d in detections],
+            "x1": boxes[:, 0],
+            "y1": boxes[:, 1],
+            "x2": boxes[:, 2],
+            "y2": boxes[:, 3],
+            "track_id": [(d.get("trajectory") or {}).get("track_id", -1) for d in detections],
+        }
+        for name, values in columns.items():
+            self._chunks[name].append(np.asarray(values, dtype=COLUMN_DTYPES[name]))
+
+    def close(self) -> Dict:
+        """Write the column files and return the run summary for the catalog."""
+        os.makedirs(self.directory, exist_ok=True)
+        columns = {}
+        for name, dtype in COLUMN_DTYPES.items():
+            chunks = self._chunks[name]
+            columns[name] = np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+            np.save(os.path.join(self.directory, f"{name}.npy"), columns[name])
+        self._chunks = {name: [] for name in COLUMN_DTYPES}
+
+        counts = np.bincount(columns["class_id"], minlength=len(self.class_names))
+        class_counts = {self.class_names[i]: int(c) for i, c in enumerate(counts) if c}
+        ranks = [THREAT_RANK[self.threat_levels[name]] for name in class_counts
+                 if self.threat_levels.get(name) in THREAT_RANK]
+        return {
+            "frames": self.frames_written,
+            "detections": int(len(columns["frame_id"])),
+            "t_min": float(columns["t"].min()) if len(columns["t"]) else None,
+            "t_max": float(columns["t"].max()) if len(columns["t"]) else None,
+            "highest_threat": THREAT_LEVEL_ORDER[max(ranks, default=0)],
+            "class_names": self.class_names,
+            "class_counts": class_counts,
+        }
+
+    def _class_id(self, name: str) -> int:
+        name = name.lower()
+        class_id = self._class_ids.get(name)
+        if class_id is None:
+            class_id = self._class_ids[name] = len(self.class_names)
+            self.class_names.append(name)
+        return class_id
+
+
+def load_columns(directory: str) -> Dict[str, np.ndarray]:
+    """Memory-map a run's column files (nothing is read until a column is used)."""
+    return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in COLUMN_DTYPES}
+
+
+class LogCatalog:
+    """
+    Index of detection runs stored in the columnar format.
+
+    One SQLite row per run holds its time range, per-class counts and threat
+    summary, so queries only open the column files of runs that can match.
+    Connections are opened per process, so inference worker processes can
+    register runs in the same catalog.
+
+    Args:
+        root: Directory holding catalog.db and one column directory per run
+        threat_levels: Lower-case class name -> threat level
+    """
+
+    def __init__(self, root: str, threat_levels: Optional[Dict[str, str]] = None):
+        self.root = root
+        self.path = os.path.join(root, "catalog.db")
+        self.threat_levels = threat_levels or {}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def writer(self, run_id: str, class_names: Optional[List[str]] = None) -> ColumnarLogWriter:
+        """Start the columnar log of a new run."""
+        return ColumnarLogWriter(self.columns_dir(run_id), class_names, self.threat_levels)
+
+    def columns_dir(self, run_id: str) -> str:
+        return os.path.join(self.root, run_id)
+
+    def register(self, run_id: str, summary: Dict, metadata: Optional[Dict] = None,
+                 json_log: Optional[str] = None, analysed_at: Optional[float] = None):
+        """Add (or replace) a run in the catalog once its columns are written."""
+        metadata = metadata or {}
+        row = (
+            run_id, self.columns_dir(run_id), json_log,
+            analysed_at if analysed_at is not None else time.time(),
+            summary["frames"], summary["detections"], summary["t_min"], summary["t_max"],
+            metadata.get("threat_summary", {}).get("highest_threat_level") or summary["highest_threat"],
+            json.dumps(summary["class_names"]), json.dumps(summary["class_counts"]),
+            json.dumps(metadata.get("threat_summary", {})),
+        )
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+    def runs(self, since: Optional[float] = None, until: Optional[float] = None,
+             limit: Optional[int] = None) -> List[Dict]:
+        """Catalog entries analysed within [since, until], newest first."""
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("analysed_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("analysed_at <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT * FROM runs {where} ORDER BY analysed_at DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute(sql, params)
+            names = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+
+        runs = []
+        for row in rows:
+            run = dict(zip(names, row))
+            for key in ("class_names", "class_counts", "threat_summary"):
+                run[key] = json.loads(run[key])
+            runs.append(run)
+        return runs
+
+    def query(self, object_class: Optional[str] = None, threat_level: Optional[str] = None,
+              min_confidence: Optional[float] = None, since: Optional[float] = None,
+              until: Optional[float] = None, run_id: Optional[str] = None,
+              limit: int = 1000) -> Tuple[List[Dict], int]:
+        """
+        Detections matching the filters across all catalogued runs, newest run first.
+
+        Args:
+            object_class: Only this class (case-insensitive)
+            threat_level: Only classes with this threat level
+            min_confidence: Only detections at or above this confidence
+            since: Only runs analysed at or after this Unix timestamp
+            until: Only runs analysed at or before this Unix timestamp
+            run_id: Only this run
+            limit: Maximum number of detections returned
+
+        Returns:
+            Tuple of (detections, total number of matching detections)
+        """
+        object_class = object_class.lower() if object_class else None
+        matches, total = [], 0
+        for run in self.runs(since=since, until=until):
+            if run_id is not None and run["run_id"] != run_id:
+                continue
+            # Skip runs whose summary rules them out before touching their columns
+            wanted = [i for i, name in enumerate(run["class_names"])
+                      if run["class_counts"].get(name)
+                      and (object_class is None or name == object_class)
+                      and (threat_level is None or self.threat_levels.get(name) == threat_level)]
+            if not wanted:
+                continue
+            try:
+                columns = load_columns(run["columns_dir"])
+            except FileNotFoundError:
+                continue
+
+            mask = np.isin(columns["class_id"], wanted)
+            if min_confidence is not None:
+                mask &= columns["conf"] >= min_confidence
+            rows = np.flatnonzero(mask)
+            total += len(rows)
+            rows = rows[:max(0, limit - len(matches))]
+            if len(rows):
+                matches.extend(self._records(run, columns, rows))
+        return matches, total
+
+    def remove(self, run_id: str):
+        """Drop a run from the catalog and delete its column files."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+        shutil.rmtree(self.columns_dir(run_id), ignore_errors=True)
+
+    def convert_json_log(self, path: str) -> Dict:
+        """Convert a JSON detection log into the columnar format and catalog it."""
+        run_id = run_id_from_log(path)
+        metadata = read_log_metadata(path)
+        writer = self.writer(run_id)
+        for frame in iter_log_frames(path):
+            writer.write_frame(frame)
+        summary = writer.close()
+        self.register(run_id, summary, metadata, json_log=path, analysed_at=analysis_time(path, metadata))
+        return summary
+
+    def convert_directory(self, log_dir: str, overwrite: bool = False) -> Iterator[Tuple[str, Dict]]:
+        """Convert every JSON log in log_dir that is not catalogued yet."""
+        known = {run["run_id"] for run in self.runs()}
+        for path in sorted(glob.glob(os.path.join(log_dir, "detection_log_*.json"))):
+            if overwrite or run_id_from_log(path) not in known:
+                try:
+                    yield path, self.convert_json_log(path)
+                except (ValueError, KeyError) as e:
+                    yield path, {"error": str(e)}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _records(self, run: Dict, columns: Dict[str, np.ndarray], rows: np.ndarray) -> List[Dict]:
+        names = np.array(run["class_names"], dtype=object)
+        class_ids = columns["class_id"][rows]
+        boxes = np.stack([columns[k][rows] for k in ("x1", "y1", "x2", "y2")], axis=1)
+        return [
+            {
+                "run_id": run["run_id"],
+                "analysed_at": run["analysed_at"],
+                "frame_id": frame_id,
+                "timestamp": t,
+                "class": name,
+                "confidence": conf,
+                "bounding_box": box,
+                "threat_level": self.threat_levels.get(name, "Unknown"),
+                "track_id": track_id if track_id >= 0 else None,
+            }
+            for frame_id, t, name, conf, box, track_id in zip(
+                columns["frame_id"][rows].tolist(), columns["t"][rows].tolist(), names[class_ids].tolist(),
+                columns["conf"][rows].tolist(), boxes.tolist(), columns["track_id"][rows].tolist()
+            )
+        ]
+
+    def _connection(self) -> sqlite3.Connection:
+        # Caller holds the lock. A forked worker must not reuse its parent's connection.
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(self.root, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._pid = os.getpid()
+        return self._conn
+
+
+def analysis_time(path: str, metadata: Dict) -> float:
+    """Unix time a JSON log was analysed (its analysis_timestamp, else the file's mtime)."""
+    stamp = metadata.get("analysis_timestamp")
+    if stamp:
+        try:
+            return datetime.fromisoformat(stamp).timestamp()
+        except ValueError:
+            pass
+    return os.path.getmtime(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert and query AeroSentinel detection logs")
+    parser.add_argument("command", choices=["convert", "query"])
+    parser.add_argument("--log-dir", default="detection_logs")
+    parser.add_argument("--catalog-dir", default=os.path.join("detection_logs", "columnar"))
+    parser.add_argument("--overwrite", action="store_true", help="Re-convert logs that are already catalogued")
+    parser.add_argument("--threat-levels", help="JSON file mapping class names to threat levels "
+                                                  "(default: the table the API uses)")
+    parser.add_argument("--class", dest="object_class")
+    parser.add_argument("--threat-level")
+    parser.add_argument("--min-confidence", type=float)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    threat_levels = THREAT_LEVELS
+    if args.threat_levels:
+        with open(args.threat_levels, "r") as f:
+            threat_levels = {name.lower(): level for name, level in json.load(f).items()}
+    catalog = LogCatalog(args.catalog_dir, threat_levels)
+    if args.command == "convert":
+        for path, summary in catalog.convert_directory(args.log_dir, overwrite=args.overwrite):
+            print(f"{path}: {json.dumps(summary)}")
+    else:
+        detections, total = catalog.query(object_class=args.object_class, threat_level=args.threat_level,
+                                          min_confidence=args.min_confidence, limit=args.limit)
+        print(json.dumps({"total": total, "detections": detections}, indent=2))
@@ -1,46 +1,499 @@
-import os
-import shutil
-import random
-
-# Paths to existing datasets
-datasets = ["drone_dataset"]
-
-# New dataset structure
-base_path = "./datasets/airborne_threat_dataset"
-os.makedirs(base_path, exist_ok=True)
-
-for sub in ["train", "val", "test"]:
-    os.makedirs(os.path.join(base_path, "images", sub), exist_ok=True)
-    os.makedirs(os.path.join(base_path, "labels", sub), exist_ok=True)
-
-# Function to distribute files randomly
-def split_data(dataset_path):
-    image_dir = os.path.join(dataset_path, "images")
-    label_dir = os.path.join(dataset_path, "labels")
-
-    images = sorted(os.listdir(image_dir))
-    random.shuffle(images)
-
-    split_ratios = [0.7, 0.2, 0.1]  # Train 70%, Val 20%, Test 10%
-    num_train = int(len(images) * split_ratios[0])
-    num_val = int(len(images) * split_ratios[1])
-
-    for idx, image_file in enumerate(images):
-        image_path = os.path.join(image_dir, image_file)
-        label_path = os.path.join(label_dir, image_file.replace(".jpg", ".txt"))
-
-        if idx < num_train:
-            split = "train"
-        elif idx < num_train + num_val:
-            split = "val"
-        else:
-            split = "test"
-
-        shutil.move(image_path, os.path.join(base_path, "images", split, image_file))
-        shutil.move(label_path, os.path.join(base_path, "labels", split, image_file.replace(".jpg", ".txt")))
-
-# Process all datasets
-for dataset in datasets:
-    split_data(f"./datasets/{dataset}")
-
-print("Datasets merged successfully.")
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import yaml
+
+# Sources merged when none are given, and where the merged dataset goes
+DEFAULT_SOURCES = ["datasets/final"]
+DEFAULT_OUTPUT = "datasets/airborne_threat_dataset"
+
+# Unified class table, in the order of THREAT_LEVELS in postprocess.py
+UNIFIED_NAMES = [
+    "bird", "drone", "missile", "hot air balloon", "paraglider", "airplane", "car",
+    "fighter jet", "helicopter", "landing deck", "person", "ship",
+]
+
+# Source class names that mean a unified class under another name
+CLASS_ALIASES = {
+    "aeroplane": "airplane",
+    "plane": "airplane",
+    "jet": "fighter jet",
+    "uav": "drone",
+    "balloon": "hot air balloon",
+    "boat": "ship",
+}
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+# Output split directories (the layout of datasets/final) and the default split ratios
+SPLITS = ("train", "valid", "test")
+DEFAULT_RATIOS = (0.7, 0.2, 0.1)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Largest dHash Hamming distance at which two images count as the same picture
+PERCEPTUAL_MAX_DISTANCE = 4
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def content_hash(path: str) -> str:
+    """SHA-256 of a file, read in 1 MB blocks."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def perceptual_hash(path: str) -> Optional[int]:
+    """64-bit difference hash (dHash) of an image, or None if it cannot be decoded."""
+    image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+    small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def label_path_for(image_path: str) -> str:
+    """YOLO label of an image: the last "images" directory becomes "labels", the extension .txt."""
+    parts = image_path.split(os.sep)
+    index = len(parts) - 1 - parts[::-1].index("images")
+    parts[index] = "labels"
+    return os.path.splitext(os.sep.join(parts))[0] + ".txt"
+
+
+def load_names(path: str) -> List[str]:
+    """Class names of a data.yaml (list or id -> name mapping) or a comma-separated list."""
+    if not os.path.exists(path):
+        return [name.strip() for name in path.split(",") if name.strip()]
+    with open(path, "r") as f:
+        names = yaml.safe_load(f)["names"]
+    if isinstance(names, dict):
+        return [names[i] for i in sorted(names)]
+    return list(names)
+
+
+def class_remap(source_names: List[str], unified_names: List[str]) -> Dict[int, Optional[int]]:
+    """Source class id -> unified class id (None for classes the unified table does not know)."""
+    unified = {name.lower(): i for i, name in enumerate(unified_names)}
+    remap = {}
+    for source_id, name in enumerate(source_names):
+        name = name.strip().lower()
+        remap[source_id] = unified.get(name, unified.get(CLASS_ALIASES.get(name, ""), None))
+    return remap
+
+
+def remap_label(path: str, remap: Dict[int, Optional[int]]) -> Tuple[str, List[int], int]:
+    """
+    Rewrite a YOLO label file's class ids (boxes and polygons alike).
+
+    Returns:
+        Tuple of the new label text, the unified class ids present and the
+        number of objects dropped because their class is not in the unified table
+    """
+    if not os.path.exists(path):
+        return "", [], 0
+    lines, classes, dropped = [], set(), 0
+    with open(path, "r") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 5:
+                continue
+            try:
+                class_id = remap.get(int(float(fields[0])))
+            except ValueError:
+                continue
+            if class_id is None:
+                dropped += 1
+                continue
+            classes.add(class_id)
+            lines.append(" ".join([str(class_id)] + fields[1:]))
+    return "".join(line + "\n" for line in lines), sorted(classes), dropped
+
+
+class SourceDataset:
+    """
+    One YOLO-format dataset to merge.
+
+    Images are found under any directory called "images" (train/images,
+    images/train or a flat images/), labels beside them under "labels".
+    Class names come from the dataset's data.yaml unless given explicitly.
+    """
+
+    def __init__(self, root: str, tag: str, names: Optional[List[str]] = None):
+        self.root = root.rstrip(os.sep)
+        self.tag = tag
+        if names is None:
+            data_yaml = os.path.join(root, "data.yaml")
+            if not os.path.exists(data_yaml):
+                raise ValueError(f"{root} has no data.yaml; pass its class names with --source {root}=name1,name2")
+            names = load_names(data_yaml)
+        self.names = names
+
+    def images(self) -> List[str]:
+        found = []
+        for directory, _, files in os.walk(self.root):
+            if "images" not in os.path.relpath(directory, self.root).split(os.sep):
+                continue
+            found.extend(os.path.join(directory, name) for name in files
+                         if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+        return sorted(found)
+
+
+def file_signature(path: str) -> Optional[List[int]]:
+    """(size, mtime_ns) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def stratified_splits(entries: Dict[str, Dict], ratios: Tuple[float, ...], seed: int) -> int:
+    """
+    Assign a split to every unique entry that has none yet, keeping the
+    per-class split ratios as close to the targets as possible.
+
+    Entries that already have a split keep it, so a rebuild never moves an
+    image between train and test. New images are placed rarest class first,
+    each into the split furthest below its target for that class.
+
+    Returns:
+        Number of newly assigned entries
+    """
+    counts = {split: {} for split in SPLITS}
+    totals: Dict[int, int] = {}
+    pending = []
+    for key, entry in entries.items():
+        if entry.get("duplicate_of"):
+            continue
+        classes = entry["classes"] or [-1]
+        for class_id in classes:
+            totals[class_id] = totals.get(class_id, 0) + 1
+        if entry.get("split") in SPLITS:
+            for class_id in classes:
+                counts[entry["split"]][class_id] = counts[entry["split"]].get(class_id, 0) + 1
+        else:
+            pending.append(key)
+
+    rng = random.Random(seed)
+    rng.shuffle(pending)
+    # Rarest class first, so scarce classes are spread before common ones fill the splits
+    pending.sort(key=lambda key: min(totals[c] for c in (entries[key]["classes"] or [-1])))
+    for key in pending:
+        classes = entries[key]["classes"] or [-1]
+        rarest = min(classes, key=lambda c: totals[c])
+        deficits = [ratio * totals[rarest] - counts[split].get(rarest, 0) for split, ratio in zip(SPLITS, ratios)]
+        split = SPLITS[int(np.argmax(deficits))]
+        entries[key]["split"] = split
+        for class_id in classes:
+            counts[split][class_id] = counts[split].get(class_id, 0) + 1
+    return len(pending)
+
+
+def find_duplicates(entries: Dict[str, Dict], perceptual: bool) -> int:
+    """
+    Mark repeated images with duplicate_of (the first key in sorted order is kept).
+
+    Exact copies are found by SHA-256; with perceptual, near-identical images
+    (re-encodes, resizes) by dHash distance, using four 16-bit bands so only
+    images sharing a band are compared.
+
+    Returns:
+        Number of duplicates
+    """
+    by_sha: Dict[str, str] = {}
+    bands: List[Dict[int, List[str]]] = [{} for _ in range(4)]
+    duplicates = 0
+    for key in sorted(entries):
+        entry = entries[key]
+        entry.pop("duplicate_of", None)
+        original = by_sha.get(entry["sha256"])
+        if original is None and perceptual and entry.get("dhash") is not None:
+            dhash = int(entry["dhash"], 16)
+            for band, index in enumerate(bands):
+                for candidate in index.get((dhash >> (16 * band)) & 0xFFFF, []):
+                    if bin(dhash ^ int(entries[candidate]["dhash"], 16)).count("1") <= PERCEPTUAL_MAX_DISTANCE:
+                        original = candidate
+                        break
+                if original is not None:
+                    break
+        if original is not None:
+            entry["duplicate_of"] = original
+            duplicates += 1
+            continue
+        by_sha[entry["sha256"]] = key
+        if perceptual and entry.get("dhash") is not None:
+            dhash = int(entry["dhash"], 16)
+            for band, index in enumerate(bands):
+                index.setdefault((dhash >> (16 * band)) & 0xFFFF, []).append(key)
+    return duplicates
+
+
+class DatasetBuilder:
+    """
+    Merges YOLO datasets into one with a unified class table.
+
+    Files are scanned and hashed on a thread pool, repeated images dropped,
+    the rest split per class and hardlinked (copied across filesystems) into
+    output/{train,valid,test}/{images,labels}. A manifest of every source
+    file's signature, hashes, classes and split makes rebuilds incremental:
+    unchanged files are neither re-hashed nor re-linked, and outputs whose
+    source disappeared are removed.
+
+    Args:
+        sources: Datasets to merge
+        output: Directory of the merged dataset
+        names: Unified class table
+        ratios: Train/valid/test ratios for newly added images
+        perceptual: Also drop near-identical images (dHash), not only exact copies
+        workers: Threads for hashing and linking
+        seed: Seed of the split assignment
+        link: Hardlink instead of copy where possible
+    """
+
+    def __init__(self, sources: List[SourceDataset], output: str, names: List[str] = UNIFIED_NAMES,
+                 ratios: Tuple[float, ...] = DEFAULT_RATIOS, perceptual: bool = False, workers: int = 8,
+                 seed: int = 0, link: bool = True):
+        if len(ratios) != len(SPLITS) or abs(sum(ratios) - 1.0) > 1e-6:
+            raise ValueError(f"Split ratios must be {len(SPLITS)} numbers summing to 1")
+        self.sources = sources
+        self.output = output
+        self.names = names
+        self.ratios = tuple(ratios)
+        self.perceptual = perceptual
+        self.workers = max(1, workers)
+        self.seed = seed
+        self.link = link
+        self.manifest_path = os.path.join(output, MANIFEST_NAME)
+
+    def load_manifest(self) -> Dict:
+        if not os.path.exists(self.manifest_path):
+            return {"entries": {}}
+        with open(self.manifest_path, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {"entries": {}}
+        return manifest
+
+    def build(self, resplit: bool = False) -> Dict:
+        """
+        Bring the output up to date with the sources.
+
+        Args:
+            resplit: Reassign every image's split instead of keeping earlier assignments
+
+        Returns:
+            Build report (file counts per step and per-split class counts)
+        """
+        started = time.perf_counter()
+        previous = self.load_manifest()
+        old_entries = previous["entries"]
+        # Labels must be rewritten when the unified or a source's class table changes
+        relabel = {
+            source.tag for source in self.sources
+            if previous.get("names") != self.names
+            or previous.get("sources", {}).get(source.tag, {}).get("names") != source.names
+        }
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # Walk the sources in parallel, then scan their files on the same pool
+            found = list(pool.map(lambda source: (source, source.images()), self.sources))
+            jobs = [(source, image) for source, images in found for image in images]
+            scanned = list(pool.map(lambda job: self._scan(job[0], job[1], old_entries, job[0].tag in relabel), jobs))
+
+        entries = {key: entry for key, entry, _ in scanned}
+        report = {
+            "sources": {source.tag: len(images) for source, images in found},
+            "scanned": len(entries),
+            "rehashed": sum(1 for _, _, rehashed in scanned if rehashed),
+            "objects_dropped": sum(entry.pop("_dropped", 0) for entry in entries.values()),
+        }
+
+        if resplit:
+            for entry in entries.values():
+                entry.pop("split", None)
+        report["duplicates"] = find_duplicates(entries, self.perceptual)
+        report["newly_split"] = stratified_splits(entries, self.ratios, self.seed)
+
+        for split in SPLITS:
+            os.makedirs(os.path.join(self.output, split, "images"), exist_ok=True)
+            os.makedirs(os.path.join(self.output, split, "labels"), exist_ok=True)
+
+        # Remove outputs that no longer correspond to a kept image in the same place
+        wanted = {self._outputs(key, entry) for key, entry in entries.items() if not entry.get("duplicate_of")}
+        removed = 0
+        for key, entry in old_entries.items():
+            if entry.get("duplicate_of") or entry.get("split") not in SPLITS:
+                continue
+            outputs = self._outputs(key, entry)
+            if outputs not in wanted:
+                for path in outputs:
+                    if os.path.exists(path):
+                        os.remove(path)
+                removed += 1
+        report["removed"] = removed
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(lambda item: self._materialise(item[0], item[1], old_entries.get(item[0])),
+                                    [(k, e) for k, e in entries.items() if not e.get("duplicate_of")]))
+        report["linked"] = results.count("linked")
+        report["copied"] = results.count("copied")
+        report["unchanged"] = results.count("unchanged")
+
+        for entry in entries.values():
+            entry.pop("_label", None)
+        self._write_data_yaml()
+        self._write_manifest(entries)
+        report["splits"] = self._split_counts(entries)
+        report["seconds"] = time.perf_counter() - started
+        return report
+
+    def _scan(self, source: SourceDataset, image_path: str, old_entries: Dict,
+              relabel: bool) -> Tuple[str, Dict, bool]:
+        """Manifest entry of one source image, reusing the previous hashes if the files are unchanged."""
+        key = f"{source.tag}/{os.path.relpath(image_path, source.root)}"
+        label_path = label_path_for(image_path)
+        signature = [file_signature(image_path), file_signature(label_path)]
+        old = old_entries.get(key)
+        if old is not None and old.get("signature") == signature and not relabel \
+                and (not self.perceptual or old.get("dhash") is not None):
+            return key, dict(old), False
+
+        label, classes, dropped = remap_label(label_path, class_remap(source.names, self.names))
+        entry = {
+            "signature": signature,
+            "sha256": content_hash(image_path),
+            "classes": classes,
+            "source": image_path,
+            "label": label_path,
+            "_label": label,
+            "_dropped": dropped,
+        }
+        if self.perceptual:
+            dhash = perceptual_hash(image_path)
+            entry["dhash"] = f"{dhash:016x}" if dhash is not None else None
+        if old is not None and old.get("split") in SPLITS:
+            entry["split"] = old["split"]
+        return key, entry, True
+
+    def _outputs(self, key: str, entry: Dict) -> Tuple[str, str]:
+        """Output image and label paths of an entry."""
+        tag, _, relative = key.partition("/")
+        stem, extension = os.path.splitext(relative.replace(os.sep, "_"))
+        # The source tag and path keep names unique across sources and splits
+        name = f"{tag}_{stem}"
+        return (os.path.join(self.output, entry["split"], "images", name + extension.lower()),
+                os.path.join(self.output, entry["split"], "labels", name + ".txt"))
+
+    def _materialise(self, key: str, entry: Dict, old: Optional[Dict]) -> str:
+        """Link or copy an image and write its remapped label, unless the output is already current."""
+        image_out, label_out = self._outputs(key, entry)
+        current = (old is not None and old.get("split") == entry["split"] and old.get("sha256") == entry["sha256"]
+                   and "_label" not in entry and os.path.exists(image_out) and os.path.exists(label_out))
+        if current:
+            return "unchanged"
+
+        label = entry.get("_label")
+        if label is None:
+            label, _, _ = remap_label(entry["label"], class_remap(self._source_names(key), self.names))
+        with open(label_out + ".tmp", "w") as f:
+            f.write(label)
+        os.replace(label_out + ".tmp", label_out)
+
+        if os.path.exists(image_out):
+            os.remove(image_out)
+        if self.link:
+            try:
+                os.link(entry["source"], image_out)
+                return "linked"
+            except OSError:
+                pass
+        shutil.copy2(entry["source"], image_out)
+        return "copied"
+
+    def _source_names(self, key: str) -> List[str]:
+        tag = key.partition("/")[0]
+        return next(source.names for source in self.sources if source.tag == tag)
+
+    def _split_counts(self, entries: Dict[str, Dict]) -> Dict:
+        counts = {split: {"images": 0, "classes": {}} for split in SPLITS}
+        for entry in entries.values():
+            if entry.get("duplicate_of"):
+                continue
+            split = counts[entry["split"]]
+            split["images"] += 1
+            for class_id in entry["classes"]:
+                name = self.names[class_id]
+                split["classes"][name] = split["classes"].get(name, 0) + 1
+        return counts
+
+    def _write_data_yaml(self):
+        data = {"train": "train/images", "val": "valid/images", "test": "test/images",
+                "nc": len(self.names), "names": self.names}
+        with open(os.path.join(self.output, "data.yaml"), "w") as f:
+            yaml.safe_dump(data, f, sort_keys=False)
+
+    def _write_manifest(self, entries: Dict[str, Dict]):
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "names": self.names,
+            "ratios": list(self.ratios),
+            "seed": self.seed,
+            "perceptual": self.perceptual,
+            "sources": {source.tag: {"root": source.root, "names": source.names} for source in self.sources},
+            "entries": entries,
+        }
+        # Replace atomically so an interrupted build leaves the previous manifest intact
+        with open(self.manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f, separators=(",", ":"))
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+
+def parse_sources(specs: List[str]) -> List[SourceDataset]:
+    """Build sources from "path" or "path=name1,name2" specs; tags are the directory names, made unique."""
+    sources, tags = [], set()
+    for spec in specs:
+        root, _, names = spec.partition("=")
+        tag = base = os.path.basename(root.rstrip(os.sep)) or "source"
+        suffix = 2
+        while tag in tags:
+            tag, suffix = f"{base}{suffix}", suffix + 1
+        tags.add(tag)
+        sources.append(SourceDataset(root, tag, load_names(names) if names else None))
+    return sources
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge YOLO datasets into one deduplicated, stratified dataset")
+    parser.add_argument("--source", action="append",
+                        help="Dataset to merge, optionally with its class names: path or path=name1,name2 "
+                             f"(repeatable, default: {', '.join(DEFAULT_SOURCES)})")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--names", help="Unified class names: a data.yaml or a comma-separated list "
+                                        "(default: the classes of THREAT_LEVELS)")
+    parser.add_argument("--ratios", type=float, nargs=3, default=DEFAULT_RATIOS, metavar=("TRAIN", "VALID", "TEST"))
+    parser.add_argument("--perceptual", action="store_true", help="Also drop near-identical images (dHash)")
+    parser.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) * 4))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--copy", action="store_true", help="Copy files instead of hardlinking them")
+    parser.add_argument("--resplit", action="store_true", help="Reassign all splits instead of keeping earlier ones")
+    args = parser.parse_args()
+
+    builder = DatasetBuilder(
+        parse_sources(args.source or DEFAULT_SOURCES), args.output,
+        names=load_names(args.names) if args.names else UNIFIED_NAMES, ratios=tuple(args.ratios),
+        perceptual=args.perceptual, workers=args.workers, seed=args.seed, link=not args.copy
+    )
+    print(json.dumps(builder.build(resplit=args.resplit), indent=2))
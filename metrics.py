@@ -0,0 +1,126 @@
+import glob
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# With several API worker processes, PROMETHEUS_MULTIPROC_DIR (set before this module is imported)
+# makes every worker write its samples to files there, and /metrics aggregates all of them
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# Latency buckets from sub-millisecond JSON encoding up to multi-second batches
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_LATENCY = Histogram(
+    "aerosentinel_stage_latency_seconds",
+    "Latency of each hot-path stage",
+    ["path", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+FRAMES = Counter("aerosentinel_frames_total", "Frames run through the detector", ["path"])
+DETECTIONS = Counter("aerosentinel_detections_total", "Detections produced", ["path", "object_class"])
+DROPPED_FRAMES = Counter("aerosentinel_dropped_frames_total", "Frames dropped before inference", ["path", "reason"])
+# Gauge modes only apply across worker processes: connections add up, the stream registry is
+# shared (every worker reports the same counts) and queues are per worker (one series per pid)
+ACTIVE_WEBSOCKETS = Gauge("aerosentinel_active_websockets", "Open /ws/video-stream connections",
+                          multiprocess_mode="livesum")
+TILES = Counter("aerosentinel_tiles_total", "Tiles planned by tiled inference", ["path", "outcome"])
+CAMERA_STREAMS = Gauge("aerosentinel_camera_streams", "Registered server-side camera streams", ["state"],
+                       multiprocess_mode="livemax")
+QUEUE_DEPTH = Gauge("aerosentinel_queue_depth", "Items waiting in an internal queue", ["queue"],
+                    multiprocess_mode="liveall")
+
+# Gauges read from live state, written on refresh_gauges() when samples go through files
+_gauge_readers: List[Tuple[Gauge, Callable[[], float]]] = []
+
+# Stages ultralytics reports per image in Results.speed (milliseconds)
+MODEL_STAGES = {"preprocess": "model_preprocess", "inference": "model_inference", "postprocess": "model_postprocess"}
+
+# Inference path labels
+PATH_WEBSOCKET = "websocket"
+PATH_FRAME = "process_frame"
+PATH_VIDEO = "process_video"
+PATH_CAMERA = "camera"
+
+
+@contextmanager
+def time_stage(path: str, stage: str):
+    """Record how long the wrapped block takes as one stage of a path."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(path, stage).observe(time.perf_counter() - start)
+
+
+def observe_stage(path: str, stage: str, seconds: float):
+    """Record a stage duration measured elsewhere."""
+    STAGE_LATENCY.labels(path, stage).observe(seconds)
+
+
+def observe_result(path: str, result):
+    """Record the model's own preprocess/inference/postprocess timings and the frame's detections."""
+    FRAMES.labels(path).inc()
+    speed = getattr(result, "speed", None) or {}
+    for key, stage in MODEL_STAGES.items():
+        if speed.get(key) is not None:
+            STAGE_LATENCY.labels(path, stage).observe(speed[key] / 1000.0)
+
+
+def observe_tiling(path: str, report):
+    """Record the tiles a tiled frame ran and skipped, and the cost of merging them."""
+    TILES.labels(path, "run").inc(report["tiles"])
+    TILES.labels(path, "skipped").inc(report["tiles_skipped"])
+    STAGE_LATENCY.labels(path, "tile_merge").observe(report["merge_ms"] / 1000.0)
+
+
+def count_detections(path: str, class_names):
+    """Increment the per-class detection counters for one frame."""
+    for class_name in class_names:
+        DETECTIONS.labels(path, class_name).inc()
+
+
+def gauge_from(gauge: Gauge, read: Callable[[], float]):
+    """
+    Report a gauge read from live state.
+
+    A single process reads it at scrape time. Across worker processes a
+    callback cannot run in the worker that answers the scrape, so each worker
+    writes its own reading whenever refresh_gauges() runs.
+    """
+    if MULTIPROC_DIR:
+        _gauge_readers.append((gauge, read))
+    else:
+        gauge.set_function(read)
+
+
+def refresh_gauges():
+    """Write the current reading of every gauge_from() gauge of this process."""
+    for gauge, read in _gauge_readers:
+        gauge.set(read())
+
+
+def reset_multiprocess_dir(path: str):
+    """Create the shared metrics directory and drop the files of a previous run (before workers start)."""
+    os.makedirs(path, exist_ok=True)
+    for name in glob.glob(os.path.join(path, "*.db")):
+        os.remove(name)
+
+
+def worker_exited():
+    """Drop this worker's live gauges from the shared metrics (on shutdown)."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render_metrics():
+    """Return the Prometheus text exposition (of every worker process, if there are several) and its content type."""
+    if MULTIPROC_DIR:
+        refresh_gauges()
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
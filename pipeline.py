@@ -0,0 +1,328 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Marks the end of the frame stream in a stage queue
+_DONE = object()
+
+# How often blocked stages check whether the pipeline was stopped
+POLL_SECONDS = 0.1
+
+
+class PipelineClosed(Exception):
+    """Raised inside a stage when the pipeline is shut down early."""
+
+
+class _Failure:
+    """Carries a stage's exception down the queues to the consumer."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class FramePool:
+    """
+    Fixed set of reusable frame buffers shared by the decoder and the consumer.
+
+    The decoder reads each frame straight into a free buffer (cv2 reads into a
+    matching array in place) and the consumer hands it back once the frame is
+    written, so a long video allocates `size` frames in total instead of one
+    per frame. When every buffer is in flight the decoder waits, which bounds
+    the pipeline's memory.
+
+    Args:
+        size: Number of buffers (cover both queues plus the frames being worked on)
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self.allocated = 0
+        self.acquired = 0
+        self.wait_seconds = 0.0
+        self._free = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def acquire(self, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """
+        Take a free buffer of the given shape, allocating one while under size.
+
+        Raises:
+            PipelineClosed: If the pool is closed while waiting
+        """
+        with self._lock:
+            self.acquired += 1
+            if self._free.empty() and self.allocated < self.size:
+                self.allocated += 1
+                return np.empty(shape, dtype=dtype)
+        started = time.perf_counter()
+        while True:
+            try:
+                buffer = self._free.get(timeout=POLL_SECONDS)
+                break
+            except queue.Empty:
+                if self._closed.is_set():
+                    raise PipelineClosed()
+        self.wait_seconds += time.perf_counter() - started
+        if buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            # The stream changed resolution; replace the buffer
+            buffer = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def release(self, buffer: np.ndarray):
+        """Return a buffer once nothing refers to its frame any more."""
+        self._free.put(buffer)
+
+    def close(self):
+        """Wake and fail any acquire() that is waiting."""
+        self._closed.set()
+
+    def stats(self) -> Dict:
+        return {"buffers": self.allocated, "max_buffers": self.size, "frames": self.acquired,
+                "acquire_wait_seconds": self.wait_seconds}
+
+
+class _StageStats:
+    def __init__(self):
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.input_wait_seconds = 0.0
+        self.output_wait_seconds = 0.0
+
+    def report(self) -> Dict:
+        return {
+            "frames": self.items,
+            "busy_seconds": self.busy_seconds,
+            # Throughput the stage would reach on its own
+            "fps": self.items / self.busy_seconds if self.busy_seconds > 0 else 0.0,
+            "input_wait_seconds": self.input_wait_seconds,
+            "output_wait_seconds": self.output_wait_seconds,
+        }
+
+
+class _QueueStats:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.samples = 0
+        self.total = 0
+        self.peak = 0
+
+    def observe(self, depth: int):
+        self.samples += 1
+        self.total += depth
+        self.peak = max(self.peak, depth)
+
+    def report(self) -> Dict:
+        return {"capacity": self.capacity, "mean_occupancy": self.total / self.samples if self.samples else 0.0,
+                "max_occupancy": self.peak}
+
+
+class VideoPipeline:
+    """
+    Decode -> inference -> post-process/encode pipeline over one video.
+
+    Decoding and inference each run on their own thread, connected to the
+    consumer by bounded queues, so frame N+1 is decoded and frame N inferred
+    while frame N-1 is annotated, encoded and logged. Iterating the pipeline
+    is the consumer stage: it yields (frame_id, frame, result) in order, and
+    the consumer calls release(frame) once the frame is written.
+
+    Errors in the decoder or inference stage are re-raised in the consumer;
+    leaving the loop early (break or exception) stops both threads.
+
+    Args:
+        frames: Iterator of (frame_id, frame) reading into pool buffers (decoder stage)
+        infer: Function mapping a list of frames to one result per frame
+        pool: FramePool the frames are read into
+        queue_size: Capacity of each queue between stages
+        batch_size: Most frames per infer call; only frames already decoded are
+            batched, the inference stage never waits for company
+        threaded: False runs all stages inline on the calling thread (for comparison)
+    """
+
+    STAGES = ("decode", "inference", "postprocess")
+
+    def __init__(self, frames: Iterator[Tuple[int, np.ndarray]], infer: Callable[[List[np.ndarray]], List],
+                 pool: Optional[FramePool] = None, queue_size: int = 4, batch_size: int = 1, threaded: bool = True):
+        self.frames = frames
+        self.infer = infer
+        self.pool = pool
+        self.queue_size = max(1, queue_size)
+        self.batch_size = max(1, batch_size)
+        self.threaded = threaded
+        self.wall_seconds = 0.0
+        self._stages = {stage: _StageStats() for stage in self.STAGES}
+        self._queues = {"decoded": _QueueStats(self.queue_size), "inferred": _QueueStats(self.queue_size)}
+        self._stop = threading.Event()
+
+    def release(self, frame: np.ndarray):
+        """Hand a yielded frame's buffer back to the pool."""
+        if self.pool is not None:
+            self.pool.release(frame)
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray, object]]:
+        started = time.perf_counter()
+        try:
+            if self.threaded:
+                yield from self._run_threaded()
+            else:
+                yield from self._run_inline()
+        finally:
+            self.wall_seconds = time.perf_counter() - started
+
+    def stats(self) -> Dict:
+        """Per-stage throughput, queue occupancy and buffer pool usage of the run."""
+        stages = {stage: stats.report() for stage, stats in self._stages.items()}
+        return {
+            "mode": "threaded" if self.threaded else "inline",
+            "queue_size": self.queue_size,
+            "batch_size": self.batch_size,
+            "wall_seconds": self.wall_seconds,
+            "fps": self._stages["postprocess"].items / self.wall_seconds if self.wall_seconds > 0 else 0.0,
+            # The stage that was busy longest bounds the pipeline's throughput
+            "bottleneck": max(stages, key=lambda stage: stages[stage]["busy_seconds"]),
+            "stages": stages,
+            "queues": {name: stats.report() for name, stats in self._queues.items()},
+            "buffer_pool": self.pool.stats() if self.pool is not None else None,
+        }
+
+    def _next_frame(self):
+        stats = self._stages["decode"]
+        pool_wait = self.pool.wait_seconds if self.pool is not None else 0.0
+        started = time.perf_counter()
+        item = next(self.frames, _DONE)
+        elapsed = time.perf_counter() - started
+        waited = (self.pool.wait_seconds - pool_wait) if self.pool is not None else 0.0
+        stats.busy_seconds += elapsed - waited
+        stats.output_wait_seconds += waited
+        if item is not _DONE:
+            stats.items += 1
+        return item
+
+    def _infer(self, batch: List[Tuple[int, np.ndarray]]) -> List[Tuple[int, np.ndarray, object]]:
+        stats = self._stages["inference"]
+        started = time.perf_counter()
+        results = self.infer([frame for _, frame in batch])
+        stats.busy_seconds += time.perf_counter() - started
+        stats.items += len(batch)
+        return [(frame_id, frame, result) for (frame_id, frame), result in zip(batch, results)]
+
+    def _run_inline(self):
+        consumer = self._stages["postprocess"]
+        while True:
+            item = self._next_frame()
+            if item is _DONE:
+                return
+            for output in self._infer([item]):
+                started = time.perf_counter()
+                yield output
+                consumer.busy_seconds += time.perf_counter() - started
+                consumer.items += 1
+
+    def _put(self, target: queue.Queue, name: Optional[str], item, stage: str):
+        started = time.perf_counter()
+        while True:
+            try:
+                target.put(item, timeout=POLL_SECONDS)
+                break
+            except queue.Full:
+                if self._stop.is_set():
+                    raise PipelineClosed()
+        self._stages[stage].output_wait_seconds += time.perf_counter() - started
+        if name is not None:
+            self._queues[name].observe(target.qsize())
+
+    def _get(self, source: queue.Queue, stage: str):
+        started = time.perf_counter()
+        while True:
+            try:
+                item = source.get(timeout=POLL_SECONDS)
+                break
+            except queue.Empty:
+                if self._stop.is_set():
+                    raise PipelineClosed()
+        self._stages[stage].input_wait_seconds += time.perf_counter() - started
+        return item
+
+    def _decode_loop(self, decoded: queue.Queue):
+        try:
+            while True:
+                item = self._next_frame()
+                if item is _DONE:
+                    break
+                self._put(decoded, "decoded", item, "decode")
+            self._put(decoded, None, _DONE, "decode")
+        except PipelineClosed:
+            pass
+        except BaseException as e:
+            try:
+                self._put(decoded, None, _Failure(e), "decode")
+            except PipelineClosed:
+                pass
+        finally:
+            close = getattr(self.frames, "close", None)
+            if close is not None:
+                close()
+
+    def _inference_loop(self, decoded: queue.Queue, inferred: queue.Queue):
+        try:
+            while True:
+                item = self._get(decoded, "inference")
+                end = None
+                batch = []
+                while True:
+                    if item is _DONE or isinstance(item, _Failure):
+                        end = item
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = decoded.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    try:
+                        outputs = self._infer(batch)
+                    except BaseException as e:
+                        self._put(inferred, None, _Failure(e), "inference")
+                        return
+                    for output in outputs:
+                        self._put(inferred, "inferred", output, "inference")
+                if end is not None:
+                    self._put(inferred, None, end, "inference")
+                    return
+        except PipelineClosed:
+            pass
+
+    def _run_threaded(self):
+        decoded = queue.Queue(maxsize=self.queue_size)
+        inferred = queue.Queue(maxsize=self.queue_size)
+        threads = [
+            threading.Thread(target=self._decode_loop, args=(decoded,), name="pipeline-decode", daemon=True),
+            threading.Thread(target=self._inference_loop, args=(decoded, inferred), name="pipeline-inference",
+                             daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        consumer = self._stages["postprocess"]
+        try:
+            while True:
+                item = self._get(inferred, "postprocess")
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                started = time.perf_counter()
+                yield item
+                consumer.busy_seconds += time.perf_counter() - started
+                consumer.items += 1
+        finally:
+            self._stop.set()
+            if self.pool is not None:
+                self.pool.close()
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,128 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Threat levels ordered by severity; the rank is the index
+THREAT_LEVEL_ORDER = ["None", "Low", "High", "Critical"]
+THREAT_RANK = {level: rank for rank, level in enumerate(THREAT_LEVEL_ORDER)}
+
+# Class name to threat level mapping (shared by the API and the log_catalog CLI)
+THREAT_LEVELS = {
+    "bird": "Low",
+    "drone": "High",
+    "missile": "Critical",
+    'hot air balloon': "High", 'paraglider': "High", 'airplane': "Critical", 'car': "High", 'fighter jet': "Critical", 'helicopter': "Critical", 'landing deck': "Critical", 'person': "High", 'ship': "High"
+}
+
+
+def to_numpy(values) -> np.ndarray:
+    """Convert a (possibly GPU) tensor to a NumPy array in one transfer."""
+    if hasattr(values, "cpu"):
+        values = values.cpu().numpy()
+    return np.asarray(values)
+
+
+class DetectionPostprocessor:
+    """
+    Vectorised post-processing of YOLO results for one model's class table.
+
+    Boxes, confidences and classes are pulled out of a result with a single
+    tensor-to-NumPy conversion per frame. Class names and threat levels come
+    from lookup arrays indexed by class id, so nothing is converted or looked
+    up per box in Python.
+
+    Args:
+        names: Model class table (class id -> name)
+        threat_levels: Lower-case class name -> threat level
+    """
+
+    def __init__(self, names: Dict[int, str], threat_levels: Dict[str, str]):
+        size = max(names) + 1 if names else 0
+        self.class_names = np.array([names.get(i, str(i)) for i in range(size)], dtype=object)
+        self.class_names_lower = np.array([name.lower() for name in self.class_names], dtype=object)
+        self.threat_levels = np.array(
+            [threat_levels.get(name, "Unknown") for name in self.class_names_lower], dtype=object
+        )
+        # Unknown classes never raise the highest threat level
+        self.threat_ranks = np.array([THREAT_RANK.get(level, 0) for level in self.threat_levels], dtype=np.int64)
+
+    def extract(self, result) -> Dict[str, np.ndarray]:
+        """
+        Columnar detections of one result.
+
+        Returns:
+            Dict with xyxy (N, 4), conf (N,), cls (N,), threat_rank (N,)
+        """
+        boxes = getattr(result, "boxes", None)
+        if boxes is None or len(boxes) == 0:
+            data = np.empty((0, 6), dtype=np.float32)
+        else:
+            # x1, y1, x2, y2, [track_id,] conf, cls in one array
+            data = to_numpy(boxes.data)
+        cls = data[:, -1].astype(np.int64)
+        return {
+            "xyxy": data[:, :4].astype(np.float32),
+            "conf": data[:, -2].astype(np.float32),
+            "cls": cls,
+            "threat_rank": self.threat_ranks[cls],
+        }
+
+    def normalised_boxes(self, detections: Dict[str, np.ndarray], width: int, height: int) -> np.ndarray:
+        """Boxes scaled to [0, 1] by frame size."""
+        return detections["xyxy"] / np.array([width, height, width, height], dtype=np.float32)
+
+    def centres(self, boxes: np.ndarray) -> np.ndarray:
+        """(N, 2) box centres."""
+        return (boxes[:, :2] + boxes[:, 2:]) / 2.0
+
+    def records(self, detections: Dict[str, np.ndarray], boxes: Optional[np.ndarray] = None,
+                class_key: str = "object_class", lower_case: bool = False) -> List[Dict]:
+        """
+        Row-oriented detection dicts for JSON responses and logs.
+
+        Each column is converted to Python once (tolist) and then zipped.
+        """
+        cls = detections["cls"]
+        names = (self.class_names_lower if lower_case else self.class_names)[cls].tolist()
+        boxes = detections["xyxy"] if boxes is None else boxes
+        return [
+            {class_key: name, "confidence": conf, "bounding_box": box, "threat_level": level}
+            for name, conf, box, level in zip(
+                names, detections["conf"].tolist(), boxes.tolist(), self.threat_levels[cls].tolist()
+            )
+        ]
+
+    def columnar(self, detections: Dict[str, np.ndarray], boxes: Optional[np.ndarray] = None) -> Dict:
+        """Compact column-oriented output: one list per field instead of one dict per box."""
+        cls = detections["cls"]
+        boxes = detections["xyxy"] if boxes is None else boxes
+        return {
+            "object_class": self.class_names[cls].tolist(),
+            "confidence": np.round(detections["conf"], 4).tolist(),
+            "bounding_box": np.round(boxes, 4).tolist(),
+            "threat_level": self.threat_levels[cls].tolist(),
+        }
+
+    def class_counts(self, detections: Dict[str, np.ndarray]) -> Dict[str, int]:
+        """Per-class (lower-case name) detection counts of one frame."""
+        counts = np.bincount(detections["cls"], minlength=len(self.class_names))
+        present = np.nonzero(counts)[0]
+        return dict(zip(self.class_names_lower[present].tolist(), counts[present].tolist()))
+
+    def highest_threat(self, detections: Dict[str, np.ndarray]) -> str:
+        """Most severe threat level among the detections ("None" if there are none)."""
+        if len(detections["threat_rank"]) == 0:
+            return "None"
+        return THREAT_LEVEL_ORDER[int(detections["threat_rank"].max())]
+
+
+_postprocessors: Dict[tuple, DetectionPostprocessor] = {}
+
+
+def get_postprocessor(names: Dict[int, str], threat_levels: Dict[str, str]) -> DetectionPostprocessor:
+    """Return the (cached) postprocessor for a model's class table and threat table."""
+    key = (tuple(sorted(names.items())), tuple(sorted(threat_levels.items())))
+    postprocessor = _postprocessors.get(key)
+    if postprocessor is None:
+        postprocessor = _postprocessors[key] = DetectionPostprocessor(names, threat_levels)
+    return postprocessor
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    video_sha256 TEXT NOT NULL,
+    paths TEXT NOT NULL,
+    result TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access);
+"""
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+_weights_hashes: Dict[tuple, str] = {}
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file, read in 1 MB blocks."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def weights_sha256(path: str) -> str:
+    """SHA-256 of a weights file, remembered until the file changes."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+    digest = _weights_hashes.get(key)
+    if digest is None:
+        digest = _weights_hashes[key] = file_sha256(path)
+    return digest
+
+
+def cache_key(video_sha256: str, weights_hash: str, **settings) -> str:
+    """Key of one analysis: the video, the model and every setting that changes the output."""
+    material = json.dumps({"video": video_sha256, "weights": weights_hash, **settings}, sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def path_size(path: Optional[str]) -> int:
+    """Size of a file, or of everything under a directory (0 if it does not exist)."""
+    if not path or not os.path.exists(path):
+        return 0
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def remove_path(path: Optional[str]):
+    if not path or not os.path.exists(path):
+        return
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        os.remove(path)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of finished video analyses.
+
+    Each entry owns the files of one run: the uploaded video, the annotated
+    video, the JSON detection log and its columnar copy. When the files of
+    all entries exceed max_bytes, the least recently used entries are deleted
+    together with their files. Connections are opened per process, so
+    inference worker processes can store results in the same cache.
+
+    Args:
+        path: SQLite index of the cache
+        max_bytes: Total size of the cached files before eviction kicks in
+        on_evict: Called with each evicted entry (e.g. to drop it from the log catalog)
+    """
+
+    def __init__(self, path: str, max_bytes: int, on_evict: Optional[Callable[[Dict], None]] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """
+        Return the cached entry for key and mark it as recently used.
+
+        Entries whose files have disappeared are dropped and count as a miss.
+        """
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT key, video_sha256, paths, result, size_bytes, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            entry = self._entry(row) if row else None
+            if entry is not None and not all(os.path.exists(p) for p in entry["paths"].values() if p):
+                with conn:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            with conn:
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return entry
+
+    def store(self, key: str, video_sha256: str, paths: Dict[str, Optional[str]], result: Dict):
+        """
+        Add a finished analysis and evict old entries if the cache is over budget.
+
+        Args:
+            key: cache_key() of the analysis
+            video_sha256: Content hash of the source video
+            paths: Files owned by the entry (video, processed_video, log, columns)
+            result: JSON-serialisable job result, without the detection log
+        """
+        now = time.time()
+        size = sum(path_size(p) for p in paths.values())
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, video_sha256, json.dumps(paths), json.dumps(result), size, now, now)
+                )
+        self.evict()
+
+    def evict(self, max_bytes: Optional[int] = None) -> List[Dict]:
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        evicted = []
+        with self._lock:
+            conn = self._connection()
+            total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM entries").fetchone()[0]
+            if total <= max_bytes:
+                return evicted
+            rows = conn.execute(
+                "SELECT key, video_sha256, paths, result, size_bytes, created_at FROM entries ORDER BY last_access"
+            ).fetchall()
+            with conn:
+                for row in rows:
+                    if total <= max_bytes:
+                        break
+                    entry = self._entry(row)
+                    conn.execute("DELETE FROM entries WHERE key = ?", (entry["key"],))
+                    total -= entry["size_bytes"]
+                    evicted.append(entry)
+
+        for entry in evicted:
+            for path in entry["paths"].values():
+                remove_path(path)
+            if self.on_evict:
+                self.on_evict(entry)
+        return evicted
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @staticmethod
+    def _entry(row) -> Dict:
+        key, video_sha256, paths, result, size_bytes, created_at = row
+        return {
+            "key": key,
+            "video_sha256": video_sha256,
+            "paths": json.loads(paths),
+            "result": json.loads(result),
+            "size_bytes": size_bytes,
+            "created_at": created_at,
+        }
+
+    def _connection(self) -> sqlite3.Connection:
+        # Caller holds the lock. A forked worker must not reuse its parent's connection.
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._pid = os.getpid()
+        return self._conn
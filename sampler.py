@@ -0,0 +1,185 @@
+from typing import Dict, Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+DEFAULT_FPS = 30.0
+
+
+def probe_video(video_path: str) -> Tuple[float, int]:
+    """Return the container's frame rate (falling back to 30 fps) and frame count."""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    finally:
+        cap.release()
+    if not fps or fps != fps or fps > 1000:
+        fps = DEFAULT_FPS
+    return fps, frame_count
+
+
+class AdaptiveFrameSampler:
+    """
+    Decides which video frames are worth running through the detector.
+
+    Candidate frames (every min_stride-th frame) are downscaled to grayscale
+    and compared with the last candidate. Static stretches are only sampled
+    every max_stride frames; motion or a recent detection switches to dense
+    sampling (every min_stride frames) for hold_frames frames.
+
+    Args:
+        min_stride: Frame step used while the scene is active
+        max_stride: Longest gap between inferred frames on a static scene
+        motion_threshold: Fraction of changed pixels that counts as activity
+        pixel_threshold: Gray-level difference for a pixel to count as changed
+        downscale_width: Width of the motion-analysis thumbnail
+        hold_frames: Frames of dense sampling after activity or a detection
+    """
+
+    def __init__(self, min_stride: int = 2, max_stride: int = 12, motion_threshold: float = 0.01,
+                 pixel_threshold: int = 20, downscale_width: int = 160, hold_frames: int = 30):
+        self.min_stride = max(1, min_stride)
+        self.max_stride = max(self.min_stride, max_stride)
+        self.motion_threshold = motion_threshold
+        self.pixel_threshold = pixel_threshold
+        self.downscale_width = downscale_width
+        self.hold_frames = hold_frames
+
+        self._previous: Optional[np.ndarray] = None
+        self._last_inferred = -self.max_stride
+        self._active_until = -1
+        self.frames_seen = 0
+        self.frames_decoded = 0
+        self.frames_inferred = 0
+        self.motion_triggers = 0
+        self.detection_triggers = 0
+
+    def is_candidate(self, frame_idx: int) -> bool:
+        """Whether a frame needs decoding at all (non-candidates are only grabbed)."""
+        return frame_idx % self.min_stride == 0
+
+    def motion_score(self, frame: np.ndarray) -> float:
+        """Fraction of thumbnail pixels that changed since the previous candidate frame."""
+        height, width = frame.shape[:2]
+        scale = self.downscale_width / float(width)
+        thumb = cv2.resize(frame, (self.downscale_width, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        thumb = cv2.GaussianBlur(cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        previous, self._previous = self._previous, thumb
+        if previous is None:
+            return 1.0
+        changed = cv2.absdiff(thumb, previous) > self.pixel_threshold
+        return float(np.count_nonzero(changed)) / changed.size
+
+    def should_infer(self, frame_idx: int, frame: np.ndarray) -> bool:
+        """Decide whether a decoded candidate frame goes through the detector."""
+        self.frames_decoded += 1
+        score = self.motion_score(frame)
+        if score >= self.motion_threshold:
+            self.motion_triggers += 1
+            self._active_until = max(self._active_until, frame_idx + self.hold_frames)
+
+        infer = frame_idx <= self._active_until or frame_idx - self._last_inferred >= self.max_stride
+        if infer:
+            self._last_inferred = frame_idx
+            self.frames_inferred += 1
+        return infer
+
+    def report_detections(self, frame_idx: int, count: int):
+        """Keep sampling densely while the detector is finding objects."""
+        if count > 0:
+            self.detection_triggers += 1
+            self._active_until = max(self._active_until, frame_idx + self.hold_frames)
+
+    def stats(self) -> Dict:
+        return {
+            "frames_seen": self.frames_seen,
+            "frames_decoded": self.frames_decoded,
+            "frames_inferred": self.frames_inferred,
+            "frames_skipped": self.frames_seen - self.frames_inferred,
+            "motion_triggers": self.motion_triggers,
+            "detection_triggers": self.detection_triggers,
+            "min_stride": self.min_stride,
+            "max_stride": self.max_stride,
+        }
+
+
+def frame_shape(cap: cv2.VideoCapture) -> Tuple[int, int, int]:
+    """Shape of the BGR frames an open capture decodes."""
+    return int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3
+
+
+def iter_sampled_frames(video_path: str, sampler: AdaptiveFrameSampler, start_frame: int = 0,
+                        end_frame: Optional[int] = None, pool=None) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yield (frame_index, frame) for the frames the sampler selects.
+
+    Frames that are not candidates are skipped with grab() so they are never decoded.
+    start_frame/end_frame restrict sampling to one segment (end exclusive);
+    frame indices stay global to the video. With a pipeline.FramePool, frames
+    are decoded into its buffers and the consumer releases the yielded ones.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+    shape = frame_shape(cap)
+    try:
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        frame_idx = start_frame
+        while end_frame is None or frame_idx < end_frame:
+            if not sampler.is_candidate(frame_idx):
+                if not cap.grab():
+                    break
+                sampler.frames_seen += 1
+                frame_idx += 1
+                continue
+            buffer = pool.acquire(shape) if pool is not None else None
+            ok, frame = cap.read(buffer)
+            if not ok:
+                if buffer is not None:
+                    pool.release(buffer)
+                break
+            sampler.frames_seen += 1
+            if sampler.should_infer(frame_idx, frame):
+                yield frame_idx, frame
+            elif buffer is not None:
+                pool.release(frame)
+            frame_idx += 1
+    finally:
+        cap.release()
+
+
+def iter_strided_frames(video_path: str, stride: int, start_frame: int = 0,
+                        end_frame: Optional[int] = None, pool=None) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yield (frame_index, frame) for every stride-th frame of the video (or of one segment).
+
+    Indices are global, so a segment starting mid-video keeps the same
+    stride phase as a single pass over the whole file. With a
+    pipeline.FramePool, frames are decoded into its buffers.
+    """
+    stride = max(1, stride)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+    shape = frame_shape(cap)
+    try:
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        frame_idx = start_frame
+        while end_frame is None or frame_idx < end_frame:
+            if frame_idx % stride:
+                if not cap.grab():
+                    break
+            else:
+                buffer = pool.acquire(shape) if pool is not None else None
+                ok, frame = cap.read(buffer)
+                if not ok:
+                    if buffer is not None:
+                        pool.release(buffer)
+                    break
+                yield frame_idx, frame
+            frame_idx += 1
+    finally:
+        cap.release()
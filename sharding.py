@@ -0,0 +1,100 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+
+from annotate import AnnotatedVideoWriter
+from postprocess import THREAT_RANK
+
+
+def plan_segments(total_frames: int, fps: float, shards: int, min_segment_seconds: float = 30.0,
+                  align: int = 1) -> List[Tuple[int, int]]:
+    """
+    Split a video into contiguous [start, end) frame ranges of roughly equal length.
+
+    Fewer segments are planned when they would be shorter than
+    min_segment_seconds, so short clips are not paid for with pool overhead.
+    Boundaries are multiples of align (the sampling stride) so every segment
+    starts on a frame that a single pass would also have inferred.
+    """
+    if total_frames <= 0:
+        return [(0, total_frames)]
+    align = max(1, align)
+    min_frames = max(align, int(min_segment_seconds * fps))
+    shards = max(1, min(shards, total_frames // min_frames))
+    bounds = [0]
+    for i in range(1, shards):
+        boundary = (total_frames * i // shards) // align * align
+        if boundary > bounds[-1]:
+            bounds.append(boundary)
+    bounds.append(total_frames)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def init_shard_worker(threads: int):
+    """Limit each shard process to its share of the cores (runs before torch is imported)."""
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    cv2.setNumThreads(threads)
+
+
+def create_shard_pool(workers: int, threads_per_worker: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Process pool for video segments.
+
+    Workers are spawned rather than forked, so none of them inherits the
+    parent's torch/OpenMP thread state; each loads its own model on first use.
+    """
+    workers = max(1, workers)
+    if threads_per_worker is None:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_shard_worker, initargs=(threads_per_worker,))
+
+
+def iter_segment_records(path: str, track_id_offset: int = 0) -> Iterator[Dict]:
+    """Read a segment's frame records, shifting its track ids into the global id space."""
+    with open(path, "r") as f:
+        for line in f:
+            frame = json.loads(line)
+            if track_id_offset:
+                for detection in frame["detections"]:
+                    trajectory = detection.get("trajectory")
+                    if trajectory and trajectory.get("track_id") is not None:
+                        trajectory["track_id"] += track_id_offset
+            yield frame
+
+
+def merge_threat_summary(total: Dict, part: Dict):
+    """Add a segment's per-class counts and highest threat level into the running summary."""
+    for key, value in part.items():
+        if key == "highest_threat_level":
+            if THREAT_RANK.get(value, 0) > THREAT_RANK.get(total.get(key, "None"), 0):
+                total[key] = value
+        else:
+            total[key] = total.get(key, 0) + value
+
+
+def concat_videos(paths: List[str], writer: AnnotatedVideoWriter) -> Optional[str]:
+    """
+    Append segment videos to the final annotated video in order.
+
+    Returns:
+        The writer's path, or None if no segment produced any frames
+    """
+    for path in paths:
+        if not path or not os.path.exists(path):
+            continue
+        cap = cv2.VideoCapture(path)
+        try:
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                writer.write(frame)
+        finally:
+            cap.release()
+    return writer.close()
@@ -0,0 +1,517 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# State shared by the worker processes of a multi-worker deployment: worker heartbeats, the
+# video job queue and camera stream registrations. Backends are chosen by URL:
+#   sqlite:///path/to/state.db   embedded SQLite in WAL mode (one host)
+#   redis://host:6379/0          Redis or any server speaking its protocol (needs the redis package)
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL,
+    info TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    worker_id TEXT,
+    created_at TEXT,
+    started_at TEXT,
+    finished_at TEXT,
+    run_seconds REAL,
+    error TEXT,
+    payload TEXT NOT NULL,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority, seq);
+CREATE TABLE IF NOT EXISTS streams (
+    stream_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    worker_id TEXT,
+    config TEXT NOT NULL,
+    status TEXT
+);
+"""
+
+# Job fields stored as JSON
+JSON_JOB_FIELDS = ("payload", "result")
+JOB_FIELDS = ("job_id", "kind", "status", "priority", "worker_id", "created_at", "started_at", "finished_at",
+              "run_seconds", "error", "payload", "result")
+
+
+def default_worker_id() -> str:
+    """Id of this process among the workers (host and pid)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def open_state(url: str):
+    """
+    Open the shared state backend named by a URL (see the module comment).
+
+    Raises:
+        ValueError: For an unknown scheme
+    """
+    if url.startswith("sqlite:///"):
+        return SqliteState(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisState(url)
+    raise ValueError(f"Unknown shared state URL: {url} (use sqlite:///path or redis://host:port/db)")
+
+
+class SqliteState:
+    """
+    Shared state in one SQLite database file (WAL mode, safe across processes).
+
+    Every read-modify-write runs in a BEGIN IMMEDIATE transaction, so only
+    one process at a time can, for example, claim the next queued job.
+
+    Args:
+        path: Database file, created if missing
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    def describe(self) -> Dict:
+        return {"backend": "sqlite", "path": self.path}
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    # Workers
+
+    def heartbeat(self, worker_id: str, info: Dict):
+        """Record that a worker is alive, with its current load."""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO workers (worker_id, updated_at, info) VALUES (?, ?, ?) "
+                "ON CONFLICT (worker_id) DO UPDATE SET updated_at = excluded.updated_at, info = excluded.info",
+                (worker_id, time.time(), json.dumps(info))
+            )
+
+    def workers(self, ttl_seconds: Optional[float] = None) -> List[Dict]:
+        """Registered workers (only those seen within ttl_seconds if given)."""
+        sql, params = "SELECT worker_id, updated_at, info FROM workers", []
+        if ttl_seconds is not None:
+            sql += " WHERE updated_at >= ?"
+            params.append(time.time() - ttl_seconds)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{**json.loads(info), "worker_id": worker_id, "updated_at": updated_at}
+                for worker_id, updated_at, info in rows]
+
+    def remove_worker(self, worker_id: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    # Jobs
+
+    def put_job(self, job: Dict):
+        """Store a new job (queued or already finished)."""
+        values = self._job_values({field: job.get(field) for field in JOB_FIELDS})
+        with self._transaction() as conn:
+            conn.execute(
+                f"INSERT INTO jobs (seq, {', '.join(JOB_FIELDS)}) "
+                f"VALUES ((SELECT COALESCE(MAX(seq), 0) + 1 FROM jobs), {', '.join('?' * len(JOB_FIELDS))})",
+                [values[field] for field in JOB_FIELDS]
+            )
+
+    def claim_job(self, worker_id: str, fields: Dict) -> Optional[Dict]:
+        """Atomically take the next queued job (lowest priority, then oldest), setting fields on it."""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE status = 'queued' ORDER BY priority, seq LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._update(conn, row[0], {**fields, "worker_id": worker_id})
+        return self.get_job(row[0])
+
+    def update_job(self, job_id: str, fields: Dict):
+        with self._transaction() as conn:
+            self._update(conn, job_id, fields)
+
+    def fail_jobs_of(self, worker_ids: List[str], fields: Dict) -> int:
+        """Mark the running jobs of departed workers as finished with fields; returns how many."""
+        if not worker_ids:
+            return 0
+        values = self._job_values(fields)
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        with self._transaction() as conn:
+            return conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE status = 'running' "
+                f"AND worker_id IN ({', '.join('?' * len(worker_ids))})",
+                [values[field] for field in fields] + list(worker_ids)
+            ).rowcount
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE job_id = ?",
+                                     (job_id,)).fetchone()
+        return self._job_record(row) if row is not None else None
+
+    def queue_position(self, job_id: str) -> int:
+        """Number of queued jobs that run before this one."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs AS other, jobs AS job WHERE job.job_id = ? AND other.status = 'queued' "
+                "AND (other.priority < job.priority OR (other.priority = job.priority AND other.seq < job.seq))",
+                (job_id,)
+            ).fetchone()[0]
+
+    def job_counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def prune_jobs(self, max_finished: int):
+        """Forget the oldest finished jobs beyond max_finished."""
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND job_id NOT IN ("
+                "SELECT job_id FROM jobs WHERE status IN ('completed', 'failed') ORDER BY seq DESC LIMIT ?)",
+                (max_finished,)
+            )
+
+    def _update(self, conn: sqlite3.Connection, job_id: str, fields: Dict):
+        values = self._job_values(fields)
+        conn.execute(f"UPDATE jobs SET {', '.join(f'{field} = ?' for field in fields)} WHERE job_id = ?",
+                     [values[field] for field in fields] + [job_id])
+
+    @staticmethod
+    def _job_values(fields: Dict) -> Dict:
+        values = dict(fields)
+        for field in JSON_JOB_FIELDS:
+            if values.get(field) is not None:
+                values[field] = json.dumps(values[field])
+        return values
+
+    @staticmethod
+    def _job_record(row) -> Dict:
+        job = dict(zip(JOB_FIELDS, row))
+        for field in JSON_JOB_FIELDS:
+            if job[field] is not None:
+                job[field] = json.loads(job[field])
+        return job
+
+    # Streams
+
+    def put_stream(self, stream_id: str, config: Dict, worker_id: Optional[str], max_streams: int) -> bool:
+        """
+        Register a stream unless its id is taken; False if it is.
+
+        Raises:
+            OverflowError: If max_streams streams are already registered
+        """
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM streams WHERE stream_id = ?", (stream_id,)).fetchone():
+                return False
+            if conn.execute("SELECT COUNT(*) FROM streams").fetchone()[0] >= max_streams:
+                raise OverflowError(f"At most {max_streams} streams can be registered")
+            conn.execute("INSERT INTO streams (stream_id, created_at, worker_id, config) VALUES (?, ?, ?, ?)",
+                         (stream_id, time.time(), worker_id, json.dumps(config)))
+        return True
+
+    def streams(self) -> List[Dict]:
+        """Every registered stream: stream_id, worker_id, config and last reported status."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stream_id, worker_id, config, status FROM streams ORDER BY created_at"
+            ).fetchall()
+        return [{"stream_id": stream_id, "worker_id": worker_id, "config": json.loads(config),
+                 "status": json.loads(status) if status else None}
+                for stream_id, worker_id, config, status in rows]
+
+    def assign_stream(self, stream_id: str, worker_id: str, previous: Optional[str]) -> bool:
+        """Move a stream to worker_id if it is still owned by previous (so only one reassignment wins)."""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE streams SET worker_id = ?, status = NULL WHERE stream_id = ? AND worker_id IS ?",
+                (worker_id, stream_id, previous)
+            ).rowcount > 0
+
+    def report_streams(self, worker_id: str, statuses: Dict[str, Dict]):
+        """Store the health of the streams a worker runs."""
+        with self._transaction() as conn:
+            conn.executemany("UPDATE streams SET status = ? WHERE stream_id = ? AND worker_id = ?",
+                             [(json.dumps(status), stream_id, worker_id) for stream_id, status in statuses.items()])
+
+    def delete_stream(self, stream_id: str) -> Optional[Dict]:
+        """Unregister a stream; returns its last record, or None if unknown."""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT worker_id, config, status FROM streams WHERE stream_id = ?",
+                               (stream_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM streams WHERE stream_id = ?", (stream_id,))
+        worker_id, config, status = row
+        return {"stream_id": stream_id, "worker_id": worker_id, "config": json.loads(config),
+                "status": json.loads(status) if status else None}
+
+
+class RedisState:
+    """
+    Shared state in Redis (or a local Redis-compatible server), for workers on several hosts.
+
+    Jobs are JSON values with a sorted set as the queue (ZPOPMIN claims the
+    next job atomically); workers and streams are hashes of JSON values.
+
+    Args:
+        url: redis:// URL
+        prefix: Key prefix, so several deployments can share a server
+    """
+
+    def __init__(self, url: str, prefix: str = "aerosentinel"):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("The redis package is required for a redis:// shared state")
+        self.url = url
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._watch_error = redis.WatchError
+
+    def describe(self) -> Dict:
+        return {"backend": "redis", "url": self.url}
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    # Workers
+
+    def heartbeat(self, worker_id: str, info: Dict):
+        self._redis.hset(self._key("workers"), worker_id, json.dumps({**info, "updated_at": time.time()}))
+
+    def workers(self, ttl_seconds: Optional[float] = None) -> List[Dict]:
+        now = time.time()
+        workers = [{**json.loads(info), "worker_id": worker_id}
+                   for worker_id, info in self._redis.hgetall(self._key("workers")).items()]
+        return [w for w in workers if ttl_seconds is None or now - w["updated_at"] <= ttl_seconds]
+
+    def remove_worker(self, worker_id: str):
+        self._redis.hdel(self._key("workers"), worker_id)
+
+    # Jobs
+
+    def put_job(self, job: Dict):
+        seq = self._redis.incr(self._key("jobs", "seq"))
+        job = {**job, "seq": seq}
+        pipe = self._redis.pipeline()
+        pipe.set(self._key("job", job["job_id"]), json.dumps(job))
+        pipe.zadd(self._key("jobs"), {job["job_id"]: seq})
+        if job["status"] == "queued":
+            pipe.zadd(self._key("jobs", "queued"), {job["job_id"]: self._queue_score(job)})
+        pipe.execute()
+
+    def claim_job(self, worker_id: str, fields: Dict) -> Optional[Dict]:
+        popped = self._redis.zpopmin(self._key("jobs", "queued"))
+        if not popped:
+            return None
+        job_id = popped[0][0]
+        self.update_job(job_id, {**fields, "worker_id": worker_id})
+        return self.get_job(job_id)
+
+    def update_job(self, job_id: str, fields: Dict):
+        # Only the job's owner writes it once it is claimed, so read-modify-write is safe
+        job = self._get(job_id)
+        if job is not None:
+            job.update(fields)
+            self._redis.set(self._key("job", job_id), json.dumps(job))
+
+    def fail_jobs_of(self, worker_ids: List[str], fields: Dict) -> int:
+        failed = 0
+        for job in self._all_jobs():
+            if job["status"] == "running" and job.get("worker_id") in worker_ids:
+                self.update_job(job["job_id"], fields)
+                failed += 1
+        return failed
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        job = self._get(job_id)
+        if job is not None:
+            job.pop("seq", None)
+        return job
+
+    def queue_position(self, job_id: str) -> int:
+        rank = self._redis.zrank(self._key("jobs", "queued"), job_id)
+        return rank if rank is not None else 0
+
+    def job_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for job in self._all_jobs():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return counts
+
+    def prune_jobs(self, max_finished: int):
+        finished = [job for job in self._all_jobs() if job["status"] in ("completed", "failed")]
+        stale = [job["job_id"] for job in finished[:max(0, len(finished) - max_finished)]]
+        if stale:
+            pipe = self._redis.pipeline()
+            pipe.delete(*[self._key("job", job_id) for job_id in stale])
+            pipe.zrem(self._key("jobs"), *stale)
+            pipe.execute()
+
+    def _get(self, job_id: str) -> Optional[Dict]:
+        value = self._redis.get(self._key("job", job_id))
+        return json.loads(value) if value is not None else None
+
+    def _all_jobs(self) -> List[Dict]:
+        """Jobs oldest first."""
+        job_ids = self._redis.zrange(self._key("jobs"), 0, -1)
+        if not job_ids:
+            return []
+        values = self._redis.mget([self._key("job", job_id) for job_id in job_ids])
+        return [json.loads(value) for value in values if value is not None]
+
+    @staticmethod
+    def _queue_score(job: Dict) -> float:
+        # Priority first, then submission order
+        return job["priority"] * 1e12 + job["seq"]
+
+    # Streams
+
+    def put_stream(self, stream_id: str, config: Dict, worker_id: Optional[str], max_streams: int) -> bool:
+        key = self._key("streams")
+        if self._redis.hlen(key) >= max_streams:
+            raise OverflowError(f"At most {max_streams} streams can be registered")
+        record = {"stream_id": stream_id, "created_at": time.time(), "worker_id": worker_id, "config": config,
+                  "status": None}
+        return bool(self._redis.hsetnx(key, stream_id, json.dumps(record)))
+
+    def streams(self) -> List[Dict]:
+        records = [json.loads(value) for value in self._redis.hgetall(self._key("streams")).values()]
+        records.sort(key=lambda record: record["created_at"])
+        for record in records:
+            record.pop("created_at", None)
+        return records
+
+    def assign_stream(self, stream_id: str, worker_id: str, previous: Optional[str]) -> bool:
+        key = self._key("streams")
+        with self._redis.pipeline() as pipe:
+            # Optimistic transaction: fails if another worker reassigned the stream meanwhile
+            try:
+                pipe.watch(key)
+                value = pipe.hget(key, stream_id)
+                if value is None:
+                    return False
+                record = json.loads(value)
+                if record["worker_id"] != previous:
+                    return False
+                record.update(worker_id=worker_id, status=None)
+                pipe.multi()
+                pipe.hset(key, stream_id, json.dumps(record))
+                pipe.execute()
+                return True
+            except self._watch_error:
+                return False
+
+    def report_streams(self, worker_id: str, statuses: Dict[str, Dict]):
+        key = self._key("streams")
+        for stream_id, status in statuses.items():
+            value = self._redis.hget(key, stream_id)
+            if value is None:
+                continue
+            record = json.loads(value)
+            if record["worker_id"] == worker_id:
+                record["status"] = status
+                self._redis.hset(key, stream_id, json.dumps(record))
+
+    def delete_stream(self, stream_id: str) -> Optional[Dict]:
+        key = self._key("streams")
+        value = self._redis.hget(key, stream_id)
+        if value is None or not self._redis.hdel(key, stream_id):
+            return None
+        record = json.loads(value)
+        record.pop("created_at", None)
+        return record
+
+
+class WorkerMembership:
+    """
+    Keeps this process registered as a live worker and runs periodic cluster chores.
+
+    Every interval_seconds the heartbeat thread publishes load_fn()'s load
+    report, then calls each registered task (e.g. stream rebalancing).
+    Workers silent for longer than ttl_seconds count as gone.
+
+    Args:
+        state: Shared state backend
+        load_fn: Returns this worker's load report (a JSON-serialisable dict)
+        worker_id: This worker's id (default host:pid)
+        interval_seconds: Heartbeat period
+        ttl_seconds: Silence after which a worker is considered dead
+    """
+
+    def __init__(self, state, load_fn: Callable[[], Dict], worker_id: Optional[str] = None,
+                 interval_seconds: float = 2.0, ttl_seconds: float = 10.0):
+        self.state = state
+        self.load_fn = load_fn
+        self.worker_id = worker_id or default_worker_id()
+        self.interval_seconds = interval_seconds
+        self.ttl_seconds = max(ttl_seconds, 2 * interval_seconds)
+        self._tasks: List[Callable[[], None]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_task(self, task: Callable[[], None]):
+        self._tasks.append(task)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.beat()
+        self._thread = threading.Thread(target=self._run, name="worker-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.state.remove_worker(self.worker_id)
+
+    def beat(self):
+        self.state.heartbeat(self.worker_id, {"pid": os.getpid(), **self.load_fn()})
+
+    def live_workers(self) -> List[Dict]:
+        return self.state.workers(self.ttl_seconds)
+
+    def departed_workers(self) -> List[str]:
+        """Registered workers that stopped sending heartbeats."""
+        live = {w["worker_id"] for w in self.live_workers()}
+        return [w["worker_id"] for w in self.state.workers() if w["worker_id"] not in live]
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.beat()
+                for task in self._tasks:
+                    task()
+            except Exception:
+                traceback.print_exc()
@@ -0,0 +1,166 @@
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# Binary /ws/video-stream protocol. A client opts in with a text hello before its first frame:
+#   {"type": "hello", "protocol": "aerosentinel-binary", "version": 1, "width": 1920, "height": 1080,
+#    "encodings": ["jpeg", "raw"], "resize": "client"}
+# and gets a welcome with the negotiated frame size/encoding and the class table. Frames are then
+# FRAME_HEADER + encoded image, results RESULT_HEADER + DETECTION_DTYPE records; errors stay text JSON.
+PROTOCOL_NAME = "aerosentinel-binary"
+PROTOCOL_VERSION = 1
+SUPPORTED_VERSIONS = (1,)
+
+MSG_FRAME = 1
+MSG_DETECTIONS = 2
+
+# type u8, version u8, flags u16, seq u32
+FRAME_HEADER = struct.Struct("<BBHI")
+# type u8, version u8, count u16, seq u32, frame width u16, frame height u16, latency ms u16, dropped frames u16
+RESULT_HEADER = struct.Struct("<BBHIHHHH")
+# One detection: 15 bytes, box in pixels of the frame the server decoded, track_id -1 when untracked
+DETECTION_DTYPE = np.dtype([
+    ("class_id", "u1"),
+    ("confidence", "<f2"),
+    ("box", "<u2", (4,)),
+    ("track_id", "<i4"),
+])
+
+# Encodings a client may send, in server preference order (raw = BGR24 at the negotiated size)
+ENCODINGS = ("jpeg", "webp", "png", "raw")
+
+# Decode flags for server-side downscaling (JPEG decodes these in the DCT domain)
+REDUCED_DECODE = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                  4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+U16_MAX = 65535
+
+
+class ProtocolError(ValueError):
+    """Raised for a hello or frame message that does not follow the protocol."""
+
+
+def fit_frame_size(width: int, height: int, max_side: Optional[int]) -> Tuple[int, int]:
+    """Largest size with the frame's aspect ratio whose long side is at most max_side."""
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    scale = max_side / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class BinaryStreamSession:
+    """
+    State of one binary-protocol connection: the negotiated frame format and
+    the class table that records refer to by id.
+
+    Args:
+        hello: The client's hello message
+        names: Model class table (class id -> name)
+        threat_levels: Lower-case class name -> threat level
+        max_side: Long side the model infers at; frames are negotiated down to it
+            (None keeps the native size, e.g. for tiled inference)
+    """
+
+    def __init__(self, hello: Dict, names: Dict[int, str], threat_levels: Dict[str, str],
+                 max_side: Optional[int] = 640):
+        version = hello.get("version")
+        if hello.get("protocol") != PROTOCOL_NAME or version not in SUPPORTED_VERSIONS:
+            raise ProtocolError(f"Unsupported protocol {hello.get('protocol')!r} version {version!r}")
+        offered = hello.get("encodings") or ["jpeg"]
+        encoding = next((e for e in ENCODINGS if e in offered), None)
+        if encoding is None:
+            raise ProtocolError(f"No supported encoding in {offered!r} (one of {', '.join(ENCODINGS)})")
+        try:
+            width, height = int(hello["width"]), int(hello["height"])
+        except (KeyError, TypeError, ValueError):
+            raise ProtocolError("hello must give the native frame width and height")
+        if not (0 < width <= U16_MAX and 0 < height <= U16_MAX):
+            raise ProtocolError(f"Invalid frame size {width}x{height}")
+        resize = hello.get("resize", "client")
+        if resize not in ("client", "server"):
+            raise ProtocolError(f"Unknown resize mode: {resize}")
+        # Raw frames are never decoded, so only the client can shrink them
+        if encoding == "raw":
+            resize = "client"
+
+        self.version = version
+        self.encoding = encoding
+        self.resize = resize
+        self.reduction = 1
+        if resize == "server":
+            factor = max(width, height) / max_side if max_side else 1.0
+            self.reduction = max((r for r in REDUCED_DECODE if r <= factor), default=1)
+            self.frame_width, self.frame_height = -(-width // self.reduction), -(-height // self.reduction)
+        else:
+            self.frame_width, self.frame_height = fit_frame_size(width, height, max_side)
+
+        size = max(names) + 1 if names else 0
+        class_names = [names.get(i, str(i)) for i in range(size)]
+        self.class_ids = {name: i for i, name in enumerate(class_names)}
+        self.classes = [
+            {"id": i, "name": name, "threat_level": threat_levels.get(name.lower(), "Unknown")}
+            for i, name in enumerate(class_names)
+        ]
+        self.frames = 0
+
+    def welcome(self) -> Dict:
+        """The server's handshake reply."""
+        return {
+            "type": "welcome",
+            "protocol": PROTOCOL_NAME,
+            "version": self.version,
+            "encoding": self.encoding,
+            "frame_width": self.frame_width,
+            "frame_height": self.frame_height,
+            "resize": self.resize,
+            "decode_reduction": self.reduction,
+            "classes": self.classes,
+            "frame_header": {"format": FRAME_HEADER.format, "size": FRAME_HEADER.size},
+            "result_header": {"format": RESULT_HEADER.format, "size": RESULT_HEADER.size},
+            "record": {"fields": ["class_id:u8", "confidence:f16", "x1:u16", "y1:u16", "x2:u16", "y2:u16",
+                                  "track_id:i32"],
+                       "size": DETECTION_DTYPE.itemsize},
+        }
+
+    def decode(self, message: bytes) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Parse a frame message.
+
+        Returns:
+            Tuple of the frame's sequence number and the BGR image (None if the image is invalid)
+
+        Raises:
+            ProtocolError: If the header is missing or malformed
+        """
+        if len(message) < FRAME_HEADER.size:
+            raise ProtocolError("Frame message shorter than its header")
+        msg_type, version, _, seq = FRAME_HEADER.unpack_from(message)
+        if msg_type != MSG_FRAME or version != self.version:
+            raise ProtocolError(f"Unexpected message type {msg_type} / version {version}")
+        payload = np.frombuffer(message, dtype=np.uint8, offset=FRAME_HEADER.size)
+        self.frames += 1
+        if self.encoding == "raw":
+            if payload.size != self.frame_width * self.frame_height * 3:
+                return seq, None
+            return seq, payload.reshape(self.frame_height, self.frame_width, 3)
+        return seq, cv2.imdecode(payload, REDUCED_DECODE[self.reduction])
+
+    def pack(self, seq: int, detections: List[Dict], frame_shape: Sequence[int], latency_ms: float = 0.0,
+             dropped: int = 0) -> bytes:
+        """
+        Encode a frame's detection records (pixel boxes, with track_id) as a result message.
+
+        Unknown class names are sent as class id 255.
+        """
+        records = np.zeros(len(detections), dtype=DETECTION_DTYPE)
+        if detections:
+            records["class_id"] = [self.class_ids.get(d["object_class"], 255) for d in detections]
+            records["confidence"] = [d["confidence"] for d in detections]
+            records["box"] = np.clip(np.rint([d["bounding_box"] for d in detections]), 0, U16_MAX)
+            records["track_id"] = [-1 if d.get("track_id") is None else d["track_id"] for d in detections]
+        header = RESULT_HEADER.pack(MSG_DETECTIONS, self.version, len(detections), seq & 0xFFFFFFFF,
+                                    min(frame_shape[1], U16_MAX), min(frame_shape[0], U16_MAX),
+                                    min(int(latency_ms), U16_MAX), min(dropped, U16_MAX))
+        return header + records.tobytes()
@@ -0,0 +1,508 @@
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+# Source states reported by the streams endpoints
+STREAM_CONNECTING = "connecting"
+STREAM_RUNNING = "running"
+STREAM_STALLED = "stalled"
+STREAM_RECONNECTING = "reconnecting"
+STREAM_FINISHED = "finished"
+STREAM_STOPPED = "stopped"
+
+STREAM_STATES = (STREAM_CONNECTING, STREAM_RUNNING, STREAM_STALLED, STREAM_RECONNECTING, STREAM_FINISHED,
+                 STREAM_STOPPED)
+
+# URL schemes OpenCV's FFmpeg backend reads as network streams
+NETWORK_SCHEMES = {"rtsp": "rtsp", "rtsps": "rtsp", "rtmp": "rtmp", "http": "http", "https": "http"}
+
+
+class StreamLimitError(Exception):
+    """Raised when the manager already runs the maximum number of sources."""
+
+
+def classify_source(url: str) -> str:
+    """
+    Kind of a source URL: "rtsp", "rtmp", "http", "device" (device:N or a bare
+    camera index) or "file".
+
+    Raises:
+        ValueError: For an unknown scheme or a file that does not exist
+    """
+    scheme, sep, _ = url.partition("://")
+    if sep:
+        kind = NETWORK_SCHEMES.get(scheme.lower())
+        if kind is None:
+            raise ValueError(f"Unsupported stream scheme: {scheme}")
+        return kind
+    if url.startswith("device:") or url.isdigit():
+        if not url.rpartition(":")[2].isdigit():
+            raise ValueError(f"Invalid device: {url}")
+        return "device"
+    if not os.path.isfile(url):
+        raise ValueError(f"No such file: {url}")
+    return "file"
+
+
+class StreamSource:
+    """
+    One camera (or stand-in file) decoded on its own thread.
+
+    The thread reads frames continuously so live sources never fall behind,
+    and submits at most max_fps frames per second for inference, one at a
+    time: frames that come due while the previous one is still being
+    inferred are dropped rather than queued. Finished results are handed to
+    on_result on the source's thread. A lost source is reopened with
+    exponential backoff; files replay at their own frame rate, like a live
+    camera, and start over at the end when loop is set.
+
+    Args:
+        source_id: Id used by the API and in alerts
+        url: RTSP/RTMP/HTTP URL, local file path or device:N
+        submit: Queues a frame for inference and returns a Future of its result
+        on_result: Called with (source, frame, result, timestamp) for each inferred frame
+        max_fps: Most frames per second sent for inference (None or 0 = as fast as inference allows)
+        loop: Restart files at the end instead of finishing
+        name: Display name
+        reconnect_min_seconds: First reconnect delay (doubled per failed attempt)
+        reconnect_max_seconds: Longest reconnect delay
+        stall_seconds: A running source without a frame for this long is reported as stalled
+        read_timeout_ms: Open/read timeout for network sources
+    """
+
+    def __init__(self, source_id: str, url: str, submit: Callable[[np.ndarray], Future],
+                 on_result: Callable, max_fps: Optional[float] = 5.0, loop: bool = False,
+                 name: Optional[str] = None, reconnect_min_seconds: float = 1.0,
+                 reconnect_max_seconds: float = 30.0, stall_seconds: float = 10.0,
+                 read_timeout_ms: int = 10000):
+        self.source_id = source_id
+        self.url = url
+        self.kind = classify_source(url)
+        self.submit = submit
+        self.on_result = on_result
+        self.max_fps = max_fps if max_fps and max_fps > 0 else None
+        self.loop = loop and self.kind == "file"
+        self.name = name or source_id
+        self.reconnect_min_seconds = reconnect_min_seconds
+        self.reconnect_max_seconds = max(reconnect_min_seconds, reconnect_max_seconds)
+        self.stall_seconds = stall_seconds
+        self.read_timeout_ms = read_timeout_ms
+
+        self.state = STREAM_CONNECTING
+        self.created_at = time.time()
+        self.connected_at: Optional[float] = None
+        self.last_frame_at: Optional[float] = None
+        self.last_result_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.frame_size: Optional[List[int]] = None
+        self.frames_read = 0
+        self.frames_inferred = 0
+        self.frames_dropped_busy = 0
+        self.frames_dropped_queue_full = 0
+        self.inference_errors = 0
+        self.detections = 0
+        self.reconnects = 0
+        self.loops = 0
+
+        self._inferred_at = deque(maxlen=50)
+        self._pending = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"stream-{self.source_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the decode thread (a network read in progress may take up to read_timeout_ms)."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def status(self) -> Dict:
+        """Configuration and health of the source."""
+        state = self.state
+        now = time.time()
+        if state == STREAM_RUNNING and self.last_frame_at is not None and now - self.last_frame_at > self.stall_seconds:
+            state = STREAM_STALLED
+        recent = list(self._inferred_at)
+        return {
+            "stream_id": self.source_id,
+            "name": self.name,
+            "url": self.url,
+            "kind": self.kind,
+            "max_fps": self.max_fps,
+            "loop": self.loop,
+            "state": state,
+            "healthy": state == STREAM_RUNNING,
+            "created_at": self.created_at,
+            "connected_at": self.connected_at,
+            "last_frame_at": self.last_frame_at,
+            "last_result_at": self.last_result_at,
+            "last_error": self.last_error,
+            "frame_size": self.frame_size,
+            "inference_fps": (len(recent) - 1) / (recent[-1] - recent[0]) if len(recent) > 1 and recent[-1] > recent[0]
+                             else 0.0,
+            "frames_read": self.frames_read,
+            "frames_inferred": self.frames_inferred,
+            "frames_dropped": self.frames_dropped_busy + self.frames_dropped_queue_full,
+            "frames_dropped_busy": self.frames_dropped_busy,
+            "frames_dropped_queue_full": self.frames_dropped_queue_full,
+            "inference_errors": self.inference_errors,
+            "detections": self.detections,
+            "reconnects": self.reconnects,
+            "loops": self.loops,
+        }
+
+    def _open(self) -> Optional[cv2.VideoCapture]:
+        if self.kind == "device":
+            cap = cv2.VideoCapture(int(self.url.rpartition(":")[2]))
+        elif self.kind == "file":
+            cap = cv2.VideoCapture(self.url)
+        else:
+            params = []
+            if hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+                params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, self.read_timeout_ms,
+                          cv2.CAP_PROP_READ_TIMEOUT_MSEC, self.read_timeout_ms]
+            cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG, params)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        return cap
+
+    def _run(self):
+        delay = self.reconnect_min_seconds
+        try:
+            while not self._stop.is_set():
+                self.state = STREAM_RECONNECTING if self.connected_at is not None else STREAM_CONNECTING
+                cap = self._open()
+                if cap is None:
+                    self.last_error = f"Could not open {self.kind} source"
+                else:
+                    delay = self.reconnect_min_seconds
+                    self.connected_at = time.time()
+                    self.state = STREAM_RUNNING
+                    try:
+                        finished = self._read(cap)
+                    finally:
+                        cap.release()
+                    if finished:
+                        self.state = STREAM_FINISHED
+                        return
+                    if self._stop.is_set():
+                        break
+                    self.last_error = "Stream ended or timed out"
+                self.reconnects += 1
+                self.state = STREAM_RECONNECTING
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.reconnect_max_seconds)
+            self.state = STREAM_STOPPED
+        except Exception as e:
+            traceback.print_exc()
+            self.last_error = str(e)
+            self.state = STREAM_STOPPED
+        finally:
+            self._collect(wait=True)
+
+    def _read(self, cap: cv2.VideoCapture) -> bool:
+        """Read until the source ends or the manager stops it; True when a (non-looping) file is done."""
+        interval = 1.0 / self.max_fps if self.max_fps else 0.0
+        source_fps = cap.get(cv2.CAP_PROP_FPS) if self.kind == "file" else 0.0
+        source_fps = source_fps if 0 < source_fps < 1000 else 25.0
+        replay_started = time.monotonic()
+        position = 0
+        next_due = 0.0
+        while not self._stop.is_set():
+            self._collect()
+            if self.kind == "file":
+                wait = replay_started + position / source_fps - time.monotonic()
+                if wait > 0 and self._stop.wait(wait):
+                    break
+            if not cap.grab():
+                if self.kind != "file":
+                    return False
+                if not self.loop or position == 0:
+                    return True
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                replay_started = time.monotonic()
+                position = 0
+                self.loops += 1
+                continue
+            position += 1
+            self.frames_read += 1
+            self.last_frame_at = time.time()
+
+            now = time.monotonic()
+            if now < next_due:
+                continue
+            if self._pending is not None:
+                self.frames_dropped_busy += 1
+                continue
+            ok, frame = cap.retrieve()
+            if not ok:
+                continue
+            next_due = now + interval
+            self.frame_size = [frame.shape[1], frame.shape[0]]
+            try:
+                self._pending = (self.submit(frame), frame, self.last_frame_at)
+            except queue.Full:
+                self.frames_dropped_queue_full += 1
+        return False
+
+    def _collect(self, wait: bool = False):
+        """Hand a finished inference to on_result (waiting for it when the source shuts down)."""
+        if self._pending is None:
+            return
+        future, frame, timestamp = self._pending
+        if not future.done():
+            if not wait:
+                return
+            try:
+                future.result(timeout=5.0)
+            except Exception:
+                pass
+        self._pending = None
+        try:
+            result = future.result(timeout=0)
+            self.on_result(self, frame, result, timestamp)
+        except Exception as e:
+            traceback.print_exc()
+            self.inference_errors += 1
+            self.last_error = str(e)
+            return
+        self.frames_inferred += 1
+        self.last_result_at = time.time()
+        self._inferred_at.append(time.monotonic())
+
+
+class StreamManager:
+    """
+    Registry of server-driven camera sources, each decoded on its own thread.
+
+    Args:
+        submit: Queues a frame for inference and returns a Future of its result
+            (e.g. the shared frame batcher's submit)
+        on_result: Called with (source, frame, result, timestamp) for each inferred frame
+        max_streams: Maximum number of registered sources
+        source_options: Defaults passed to every StreamSource (reconnect and stall timings)
+    """
+
+    def __init__(self, submit: Callable[[np.ndarray], Future], on_result: Callable, max_streams: int = 64,
+                 **source_options):
+        self.submit = submit
+        self.on_result = on_result
+        self.max_streams = max_streams
+        self.source_options = source_options
+        self._sources: Dict[str, StreamSource] = {}
+        self._lock = threading.Lock()
+
+    def add(self, url: str, stream_id: Optional[str] = None, max_fps: Optional[float] = 5.0, loop: bool = False,
+            name: Optional[str] = None) -> Dict:
+        """
+        Register a source and start decoding it.
+
+        Raises:
+            ValueError: For an invalid URL or a stream_id already in use
+            StreamLimitError: If max_streams sources are registered
+        """
+        stream_id = stream_id or uuid.uuid4().hex[:12]
+        source = StreamSource(stream_id, url, self.submit, self.on_result, max_fps=max_fps, loop=loop, name=name,
+                              **self.source_options)
+        with self._lock:
+            if stream_id in self._sources:
+                raise ValueError(f"Stream {stream_id} already exists")
+            if len(self._sources) >= self.max_streams:
+                raise StreamLimitError(f"At most {self.max_streams} streams can be registered")
+            self._sources[stream_id] = source
+        source.start()
+        return source.status()
+
+    def remove(self, stream_id: str) -> Optional[Dict]:
+        """Stop and unregister a source; returns its final status, or None if unknown."""
+        with self._lock:
+            source = self._sources.pop(stream_id, None)
+        if source is None:
+            return None
+        source.stop(timeout=5.0)
+        return source.status()
+
+    def get(self, stream_id: str) -> Optional[Dict]:
+        with self._lock:
+            source = self._sources.get(stream_id)
+        return source.status() if source is not None else None
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            sources = list(self._sources.values())
+        return [source.status() for source in sources]
+
+    def stop_all(self):
+        """Stop every source (on shutdown)."""
+        with self._lock:
+            sources = list(self._sources.values())
+            self._sources.clear()
+        for source in sources:
+            source.stop(timeout=0)
+        for source in sources:
+            source.stop(timeout=5.0)
+
+    def stats(self) -> Dict:
+        """Number of sources per state."""
+        counts = {state: 0 for state in STREAM_STATES}
+        for status in self.list():
+            counts[status["state"]] += 1
+        return {"streams": sum(counts.values()), "max_streams": self.max_streams, "states": counts}
+
+
+class SharedStreamManager(StreamManager):
+    """
+    StreamManager for multi-worker deployments: registrations live in shared
+    state (see shared_state) and each stream is decoded by exactly one worker.
+
+    A new stream goes to the live worker running the fewest streams (ties go
+    to the one with fewer running jobs). rebalance(), run on every worker
+    heartbeat, starts the streams assigned to this worker, stops those
+    removed or moved elsewhere, takes over streams whose worker is gone and
+    publishes the health of the local ones, so every worker can report on
+    every stream.
+
+    Args:
+        submit: Queues a frame for inference and returns a Future of its result
+        on_result: Called with (source, frame, result, timestamp) for each inferred frame
+        state: Shared state backend
+        membership: This worker's shared_state.WorkerMembership
+        max_streams: Maximum number of streams across all workers
+        source_options: Defaults passed to every StreamSource
+    """
+
+    def __init__(self, submit: Callable[[np.ndarray], Future], on_result: Callable, state, membership,
+                 max_streams: int = 64, **source_options):
+        super().__init__(submit, on_result, max_streams=max_streams, **source_options)
+        self.state = state
+        self.membership = membership
+        self._errors: Dict[str, str] = {}
+        self._stopped = False
+
+    def add(self, url: str, stream_id: Optional[str] = None, max_fps: Optional[float] = 5.0, loop: bool = False,
+            name: Optional[str] = None) -> Dict:
+        classify_source(url)
+        stream_id = stream_id or uuid.uuid4().hex[:12]
+        config = {"url": url, "max_fps": max_fps, "loop": loop, "name": name}
+        worker_id = self._least_loaded(self.membership.live_workers(), self.state.streams())
+        try:
+            created = self.state.put_stream(stream_id, config, worker_id, self.max_streams)
+        except OverflowError as e:
+            raise StreamLimitError(str(e))
+        if not created:
+            raise ValueError(f"Stream {stream_id} already exists")
+        if worker_id == self.membership.worker_id:
+            self._start_local(stream_id, config)
+        return self.get(stream_id)
+
+    def remove(self, stream_id: str) -> Optional[Dict]:
+        record = self.state.delete_stream(stream_id)
+        if record is None:
+            return None
+        status = super().remove(stream_id)
+        return status or self._describe(record)
+
+    def get(self, stream_id: str) -> Optional[Dict]:
+        return next((s for s in self.list() if s["stream_id"] == stream_id), None)
+
+    def list(self) -> List[Dict]:
+        return [self._describe(record) for record in self.state.streams()]
+
+    def stop_all(self):
+        """Stop the streams decoded here (on shutdown); they stay registered and move to other workers."""
+        self._stopped = True
+        super().stop_all()
+
+    def running_here(self) -> int:
+        """Number of streams decoded by this worker."""
+        with self._lock:
+            return len(self._sources)
+
+    def stats(self) -> Dict:
+        return {**super().stats(), "worker_id": self.membership.worker_id, "running_here": self.running_here()}
+
+    def rebalance(self):
+        """Reconcile the local sources with the shared registrations (see the class docstring)."""
+        if self._stopped:
+            return
+        me = self.membership.worker_id
+        live = self.membership.live_workers()
+        live_ids = {worker["worker_id"] for worker in live}
+        records = self.state.streams()
+        mine = {}
+        for record in records:
+            owner = record["worker_id"]
+            if owner not in live_ids:
+                target = self._least_loaded(live, records)
+                if target is not None and self.state.assign_stream(record["stream_id"], target, owner):
+                    record["worker_id"] = owner = target
+            if owner == me:
+                mine[record["stream_id"]] = record["config"]
+
+        with self._lock:
+            local = dict(self._sources)
+        for stream_id in local.keys() - mine.keys():
+            super().remove(stream_id)
+        for stream_id in mine.keys() - local.keys():
+            self._start_local(stream_id, mine[stream_id])
+
+        with self._lock:
+            statuses = {stream_id: source.status() for stream_id, source in self._sources.items()}
+        for stream_id in self._errors.keys() - mine.keys():
+            del self._errors[stream_id]
+        for stream_id, error in self._errors.items():
+            statuses[stream_id] = {"state": STREAM_STOPPED, "healthy": False, "last_error": error}
+        self.state.report_streams(me, statuses)
+
+    def _start_local(self, stream_id: str, config: Dict):
+        with self._lock:
+            if stream_id in self._sources:
+                return
+            try:
+                source = StreamSource(stream_id, config["url"], self.submit, self.on_result,
+                                      max_fps=config["max_fps"], loop=config["loop"], name=config["name"],
+                                      **self.source_options)
+            except ValueError as e:
+                # e.g. a file that only exists on the registering worker's host
+                self._errors[stream_id] = str(e)
+                return
+            self._errors.pop(stream_id, None)
+            self._sources[stream_id] = source
+        source.start()
+
+    def _describe(self, record: Dict) -> Dict:
+        with self._lock:
+            source = self._sources.get(record["stream_id"])
+        if source is not None and record["worker_id"] == self.membership.worker_id:
+            status = source.status()
+        else:
+            config = record["config"]
+            status = {"stream_id": record["stream_id"], "name": config["name"] or record["stream_id"],
+                      "url": config["url"], "max_fps": config["max_fps"], "loop": config["loop"],
+                      "state": STREAM_CONNECTING, "healthy": False, **(record["status"] or {})}
+        status["worker_id"] = record["worker_id"]
+        return status
+
+    @staticmethod
+    def _least_loaded(workers: List[Dict], records: List[Dict]) -> Optional[str]:
+        if not workers:
+            return None
+        streams = {worker["worker_id"]: 0 for worker in workers}
+        for record in records:
+            if record["worker_id"] in streams:
+                streams[record["worker_id"]] += 1
+        best = min(workers, key=lambda w: (streams[w["worker_id"]], w.get("jobs_running", 0), w["worker_id"]))
+        return best["worker_id"]
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import numpy as np
+
+# The modules under test live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Boxes:
+    """Stand-in for ultralytics Boxes: rows of x1, y1, x2, y2, [track_id,] conf, cls."""
+
+    def __init__(self, data):
+        self.data = np.array(data, dtype=np.float32).reshape(-1, np.shape(data)[1] if len(data) else 6)
+
+    def __len__(self):
+        return len(self.data)
+
+
+class Result:
+    """Stand-in for one ultralytics Results object."""
+
+    def __init__(self, data, speed=None):
+        self.boxes = Boxes(data)
+        self.speed = speed or {"preprocess": 0.5, "inference": 1.0, "postprocess": 0.5}
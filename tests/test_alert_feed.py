@@ -0,0 +1,148 @@
+import asyncio
+import types
+
+import pytest
+
+import alert_feed
+from alert_feed import AlertFeed, AlertSubscription, LevelRateLimiter, parse_filter, parse_rate_limits
+from alert_store import AlertStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Stands in for the feed's monotonic clock; advance it by setting clock.now."""
+    clock = types.SimpleNamespace(now=100.0)
+    monkeypatch.setattr(alert_feed, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def alert(**overrides):
+    return {"object_class": "drone", "threat_level": "High", "confidence": 0.8,
+            "bounding_box": [10, 10, 50, 50], **overrides}
+
+
+def collect(messages, count, between=None):
+    """Run an async message stream until count messages arrived, calling between(message) after each."""
+    async def run():
+        received = []
+        async for message in messages:
+            received.append(message)
+            if len(received) == count:
+                return received
+            if between is not None:
+                between(message)
+
+    return asyncio.run(asyncio.wait_for(run(), 5.0))
+
+
+def test_parse_rate_limits_and_filters():
+    assert parse_rate_limits("Low:1, High:10,Critical:0") == {"Low": 1.0, "High": 10.0, "Critical": 0.0}
+    assert parse_rate_limits("") == {}
+    with pytest.raises(ValueError):
+        parse_rate_limits("Low")
+    assert parse_filter("Drone, BIRD,") == {"drone", "bird"}
+    assert parse_filter(None) is None
+
+
+def test_rate_limiter_bursts_then_refills(clock):
+    limiter = LevelRateLimiter({"Low": 2.0, "Critical": 0.0})
+    assert [limiter.allow("Low") for _ in range(3)] == [True, True, False]
+    clock.now += 0.25
+    assert limiter.allow("Low") is False
+    clock.now += 0.25
+    assert limiter.allow("Low") is True
+    assert limiter.allow("Low") is False
+    # The bucket never holds more than one burst
+    clock.now += 60
+    assert [limiter.allow("Low") for _ in range(3)] == [True, True, False]
+    # Unlimited and unknown levels always pass
+    assert all(limiter.allow("Critical") for _ in range(100))
+    assert limiter.allow("High")
+
+
+def test_slow_rate_still_allows_one_alert(clock):
+    limiter = LevelRateLimiter({"Low": 0.1})
+    assert limiter.allow("Low") is True
+    clock.now += 5
+    assert limiter.allow("Low") is False
+    clock.now += 5
+    assert limiter.allow("Low") is True
+
+
+def test_subscription_filters():
+    subscription = AlertSubscription(AlertStore(), threat_levels={"critical", "high"}, object_classes={"drone"},
+                                     stream_ids={"cam1"})
+    assert subscription.matches(alert(stream_id="cam1"))
+    assert not subscription.matches(alert(stream_id="cam1", threat_level="Low"))
+    assert not subscription.matches(alert(stream_id="cam1", object_class="bird"))
+    assert not subscription.matches(alert(stream_id="cam2"))
+    assert not subscription.matches(alert())
+    assert AlertSubscription(AlertStore()).matches(alert(threat_level="Low"))
+
+
+def test_subscription_starts_at_the_next_alert():
+    store = AlertStore()
+    store.add(alert(object_class="old"))
+    subscription = AlertSubscription(store)
+    store.add(alert(object_class="new"))
+
+    [message] = collect(subscription.messages(poll_seconds=0.01), 1)
+    assert message["alert"]["object_class"] == "new"
+
+
+def test_feed_skips_filtered_alerts():
+    store = AlertStore()
+    feed = AlertFeed(store, poll_seconds=0.01)
+    subscription = feed.subscribe(threat_levels={"critical"}, revision=0)
+    store.add_many([alert(), alert(threat_level="Critical", object_class="missile"), alert(threat_level="Low")])
+
+    [message] = collect(feed.messages(subscription), 1)
+    assert message["alert"]["object_class"] == "missile"
+    assert subscription.revision == 3
+    assert feed.stats()["subscribers"] == 1 and feed.stats()["delivered"] == 1
+
+
+def test_repeated_sighting_is_pushed_as_update():
+    store = AlertStore(dedupe_seconds=60.0)
+    feed = AlertFeed(store, poll_seconds=0.01)
+    subscription = feed.subscribe()
+    store.add_many([alert(track_id=1)], stream_id="cam1")
+
+    # Written while the subscription waits: the store's listener wakes it
+    messages = collect(feed.messages(subscription), 2,
+                       between=lambda _: store.add_many([alert(track_id=1, confidence=0.95)], stream_id="cam1"))
+    assert [m["event"] for m in messages] == ["new", "update"]
+    assert messages[0]["alert"]["id"] == messages[1]["alert"]["id"]
+    assert messages[1]["alert"]["occurrences"] == 2
+    assert messages[1]["revision"] > messages[0]["revision"]
+
+
+def test_throttled_alerts_are_reported_as_suppressed(clock):
+    store = AlertStore()
+    subscription = AlertSubscription(store, rate_limits={"Low": 0.1}, revision=0)
+    store.add_many([alert(threat_level="Low", bounding_box=[i * 100, 0, i * 100 + 40, 40]) for i in range(3)]
+                   + [alert(threat_level="Critical")])
+
+    def advance(_):
+        clock.now += 2
+
+    messages = collect(subscription.messages(poll_seconds=0.01), 3, between=advance)
+    assert [m["type"] for m in messages] == ["alert", "alert", "suppressed"]
+    assert messages[1]["alert"]["threat_level"] == "Critical"
+    assert messages[2]["counts"] == {"Low": 2}
+    assert subscription.suppressed == {"Low": 2} and subscription.delivered == 2
+
+
+def test_idle_subscription_sends_heartbeat(clock):
+    subscription = AlertSubscription(AlertStore())
+
+    async def first_message():
+        messages = subscription.messages(poll_seconds=0.01, heartbeat_seconds=15.0)
+        pending = asyncio.ensure_future(messages.__anext__())
+        # Let the stream start waiting, then pass the heartbeat interval
+        await asyncio.sleep(0.05)
+        clock.now += 20
+        return await pending
+
+    message = asyncio.run(asyncio.wait_for(first_message(), 5.0))
+    assert message == {"type": "heartbeat", "revision": 0}
@@ -0,0 +1,217 @@
+import json
+import sqlite3
+import types
+
+import pytest
+
+import alert_store
+from alert_store import AlertStore, box_iou
+from tracker import IouTracker, attach_tracks
+
+
+def alert(**overrides):
+    return {"object_class": "drone", "threat_level": "High", "confidence": 0.8,
+            "bounding_box": [10, 10, 50, 50], **overrides}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Stands in for the store's wall clock; advance it by setting clock.now."""
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(alert_store, "time", types.SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def test_box_iou():
+    assert box_iou([0, 0, 10, 10], [0, 0, 10, 10]) == 1.0
+    assert box_iou([0, 0, 10, 10], [5, 0, 15, 10]) == pytest.approx(1 / 3)
+    assert box_iou([0, 0, 10, 10], [20, 20, 30, 30]) == 0.0
+
+
+def test_overlapping_untracked_sighting_updates_alert(clock):
+    store = AlertStore(dedupe_seconds=10.0, dedupe_iou=0.3)
+    first = store.add(alert(confidence=0.6))
+    clock.now += 2
+    assert store.add(alert(bounding_box=[14, 10, 54, 50], confidence=0.9)) == first
+    clock.now += 2
+    # Too little overlap to be the same object
+    assert store.add(alert(bounding_box=[40, 10, 80, 50])) != first
+
+    alerts, _ = store.query()
+    assert store.count() == 2
+    updated = alerts[0]
+    assert updated["occurrences"] == 2
+    assert updated["bounding_box"] == [14, 10, 54, 50]
+    assert (updated["first_seen"], updated["last_seen"]) == (1000.0, 1002.0)
+    assert updated["max_confidence"] == 0.9
+    # The row keeps its original insertion time
+    assert updated["created_at"] == 1000.0
+
+
+def test_track_id_match_wins_over_box_overlap(clock):
+    store = AlertStore(dedupe_seconds=10.0)
+    tracked = store.add(alert(track_id=5, bounding_box=[300, 300, 340, 340]))
+    store.add(alert(track_id=6))
+    # Same track, moved far from its last box
+    assert store.add(alert(track_id=5, bounding_box=[600, 300, 640, 340])) == tracked
+    assert store.count() == 2
+
+
+def test_dedupe_window_expires(clock):
+    store = AlertStore(dedupe_seconds=10.0)
+    first = store.add(alert(track_id=1))
+    clock.now += 9
+    assert store.add(alert(track_id=1)) == first
+    # The window runs from the last sighting, not the first
+    clock.now += 9
+    assert store.add(alert(track_id=1)) == first
+    clock.now += 11
+    assert store.add(alert(track_id=1)) != first
+    assert store.count() == 2
+
+
+def test_dedupe_is_scoped_by_stream_and_class(clock):
+    store = AlertStore(dedupe_seconds=10.0)
+    ids = [
+        store.add_many([alert(track_id=1)], stream_id="cam1")[0],
+        store.add_many([alert(track_id=1)], stream_id="cam2")[0],
+        store.add_many([alert(track_id=1, object_class="bird", threat_level="Low")], stream_id="cam1")[0],
+        store.add_many([alert(track_id=1)], stream_id="cam1")[0],
+    ]
+    assert len(set(ids[:3])) == 3
+    assert ids[3] == ids[0]
+    stored = {a["id"]: a for a in store.query()[0]}
+    assert stored[ids[0]]["stream_id"] == "cam1" and stored[ids[1]]["stream_id"] == "cam2"
+
+
+def test_dedupe_disabled_stores_every_sighting():
+    store = AlertStore(dedupe_seconds=0.0)
+    store.add_many([alert(track_id=1), alert(track_id=1)], stream_id="cam")
+    assert store.count() == 2
+
+
+def test_every_insert_and_update_takes_the_next_revision():
+    store = AlertStore(dedupe_seconds=60.0)
+    store.add_many([alert(track_id=1), alert(track_id=2, bounding_box=[200, 200, 240, 240])], stream_id="cam")
+    store.add(alert(track_id=1, stream_id="cam", confidence=0.9))
+
+    changes, next_revision = store.changes(0)
+    assert [c["revision"] for c in changes] == [2, 3]
+    assert [c["track_id"] for c in changes] == [2, 1]
+    assert changes[1]["occurrences"] == 2
+    assert next_revision == store.revision() == 3
+
+
+def test_revision_survives_clear():
+    store = AlertStore()
+    store.add_many([alert(), alert()])
+    cursor = store.revision()
+    store.clear()
+    assert store.revision() == cursor == 2
+
+    store.add(alert(object_class="bird"))
+    changes, next_revision = store.changes(cursor)
+    # A subscriber from before the clear still sees the new alert
+    assert [c["object_class"] for c in changes] == ["bird"]
+    assert next_revision == 3
+
+
+def test_revision_survives_eviction():
+    store = AlertStore(max_alerts=2, evict_every=1)
+    for _ in range(5):
+        store.add(alert())
+    assert store.count() == 2
+    assert store.revision() == 5
+    assert [c["revision"] for c in store.changes(0)[0]] == [4, 5]
+
+
+def test_revision_persists_across_reopen(tmp_path):
+    path = str(tmp_path / "alerts.db")
+    store = AlertStore(path)
+    store.add_many([alert(), alert()])
+    store.clear()
+    store.close()
+
+    reopened = AlertStore(path)
+    assert reopened.revision() == 2
+    reopened.add(alert())
+    assert reopened.changes(2)[0][0]["revision"] == 3
+
+
+def test_counter_starts_from_existing_revisions(tmp_path):
+    # A database written before the counter table existed
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE alerts (id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL,
+                             threat_level TEXT NOT NULL, object_class TEXT, payload TEXT NOT NULL,
+                             revision INTEGER NOT NULL DEFAULT 0, updated_at REAL);
+    """)
+    conn.execute("INSERT INTO alerts (created_at, threat_level, object_class, payload, revision) "
+                 "VALUES (0, 'High', 'drone', ?, 41)", (json.dumps(alert()),))
+    conn.commit()
+    conn.close()
+
+    store = AlertStore(path, retention_seconds=None)
+    assert store.revision() == 41
+    store.add(alert())
+    assert store.revision() == 42
+
+
+def test_repeated_frames_update_one_alert_per_track():
+    store = AlertStore(dedupe_seconds=60.0)
+    tracker = IouTracker()
+    revisions = []
+    for frame in range(10):
+        box = [100 + 2 * frame, 100, 140 + 2 * frame, 130]
+        detections = [alert(bounding_box=box, confidence=0.5 + frame / 100)]
+        store.add_many(attach_tracks(tracker, detections, [box], [1], frame / 10.0), stream_id="cam1")
+        revisions.append(store.revision())
+
+    alerts, _ = store.query()
+    assert len(alerts) == 1
+    assert alerts[0]["occurrences"] == 10
+    assert alerts[0]["bounding_box"] == [118, 100, 158, 130]
+    assert alerts[0]["max_confidence"] == 0.59
+    assert alerts[0]["last_seen"] >= alerts[0]["first_seen"]
+    # Every sighting is an update subscribers can follow
+    assert revisions == list(range(1, 11))
+
+
+def test_first_sighting_only_passes_new_tracks():
+    tracker = IouTracker()
+    passed = []
+    for frame in range(3):
+        detections = [alert()]
+        passed.append(len(attach_tracks(tracker, detections, [[10, 10, 50, 50]], [1], frame / 10.0,
+                                        first_sighting_only=True)))
+        assert detections[0]["track_id"] == 1
+    assert passed == [1, 0, 0]
+
+
+def test_polling_by_cursor_returns_updated_alerts(clock):
+    store = AlertStore(dedupe_seconds=60.0)
+    store.add_many([alert(track_id=1), alert(track_id=2, bounding_box=[200, 200, 240, 240])], stream_id="cam")
+    first_page, cursor = store.query()
+    assert [a["track_id"] for a in first_page] == [1, 2] and cursor == 2
+
+    clock.now += 1
+    store.add_many([alert(track_id=1, confidence=0.9)], stream_id="cam")
+    updated, cursor = store.query(cursor=cursor)
+    assert [(a["track_id"], a["occurrences"], a["revision"]) for a in updated] == [(1, 2, 3)]
+    assert updated[0]["last_seen"] == 1001.0
+
+    assert store.query(cursor=cursor) == ([], 3)
+
+
+def test_polling_pages_through_revisions():
+    store = AlertStore()
+    store.add_many([alert(bounding_box=[i * 100, 0, i * 100 + 40, 40]) for i in range(5)])
+    page, cursor = store.query(cursor=0, limit=2)
+    assert [a["revision"] for a in page] == [1, 2] and cursor == 2
+    page, cursor = store.query(cursor=cursor, limit=2)
+    assert [a["revision"] for a in page] == [3, 4] and cursor == 4
+    page, cursor = store.query(cursor=cursor, limit=2)
+    assert [a["revision"] for a in page] == [5] and cursor == 5
+    # Filters still apply, and the cursor still moves past what they skipped
+    assert store.query(cursor=0, threat_level="Low") == ([], 5)
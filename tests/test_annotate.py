@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+import pytest
+
+from annotate import AnnotatedVideoWriter
+
+
+def frame(value):
+    return np.full((48, 64, 3), value, dtype=np.uint8)
+
+
+def read_means(path):
+    cap = cv2.VideoCapture(path)
+    means = []
+    while True:
+        ok, image = cap.read()
+        if not ok:
+            break
+        means.append(int(round(image.mean())))
+    cap.release()
+    return means
+
+
+@pytest.fixture
+def writer_path(tmp_path):
+    path = str(tmp_path / "out.avi")
+    probe = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+    if not probe.isOpened():
+        pytest.skip("OpenCV build has no MJPG encoder")
+    probe.release()
+    return path
+
+
+def test_skipped_slots_repeat_previous_frame(writer_path):
+    writer = AnnotatedVideoWriter(writer_path, 15.0, "mjpg", frame_step=2)
+    for frame_id, value in [(0, 40), (2, 80), (10, 160)]:
+        writer.write(frame(value), frame_id=frame_id)
+    writer.pad(14)
+    writer.close()
+
+    assert writer.frames_written == 7
+    assert writer.frames_repeated == 4
+    means = read_means(writer_path)
+    assert len(means) == 7
+    # Slots 2-4 hold frame 2 until frame 10 arrives at slot 5; slot 6 is padding
+    assert [abs(m - e) <= 3 for m, e in zip(means, [40, 80, 80, 80, 80, 160, 160])] == [True] * 7
+
+
+def test_segment_slots_count_from_start_frame(writer_path):
+    writer = AnnotatedVideoWriter(writer_path, 15.0, "mjpg", frame_step=2, start_frame=100)
+    writer.write(frame(50), frame_id=104)
+    writer.pad(109)
+
+    # The first frame also fills the slots before it; 9 frames make 5 slots
+    assert writer.frames_written == 5
+    assert writer.frames_repeated == 4
+
+
+def test_buffer_reuse_does_not_change_repeated_frame(writer_path):
+    writer = AnnotatedVideoWriter(writer_path, 15.0, "mjpg", frame_step=1)
+    buffer = frame(30)
+    writer.write(buffer, frame_id=0)
+    buffer[:] = 200
+    writer.write(buffer, frame_id=3)
+    writer.close()
+
+    means = read_means(writer_path)
+    assert [abs(m - e) <= 3 for m, e in zip(means, [30, 30, 30, 200])] == [True] * 4
+
+
+def test_without_frame_ids_every_write_is_one_frame(writer_path):
+    writer = AnnotatedVideoWriter(writer_path, 15.0, "mjpg")
+    for value in (10, 20, 30):
+        writer.write(frame(value))
+    writer.pad(100)
+
+    assert writer.frames_written == 3
+    assert writer.frames_repeated == 0
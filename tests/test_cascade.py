@@ -0,0 +1,184 @@
+import numpy as np
+import pytest
+
+from cascade import CascadeDetector, CascadeStats, crop_regions, match_detections
+from conftest import Result
+
+NAMES = {0: "bird", 1: "drone", 2: "missile"}
+THREAT_LEVELS = {"bird": "Low", "drone": "High", "missile": "Critical"}
+
+
+class BlobModel:
+    """
+    Stub detector: each non-zero pixel value is one object of class value - 1, boxed by
+    the pixels it covers in the image it is given, at a per-class confidence.
+    """
+
+    def __init__(self, names, confidences=None):
+        self.names = names
+        self.confidences = confidences or {}
+        self.calls = []
+
+    def predict(self, source=None, conf=0.25, verbose=False, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        self.calls.append([image.shape[:2] for image in images])
+        return [Result(self.detect(image, conf)) for image in images]
+
+    def detect(self, image, conf):
+        rows = []
+        for value in np.unique(image[..., 0]):
+            if value == 0:
+                continue
+            confidence = self.confidences.get(int(value) - 1, 0.9)
+            if confidence < conf:
+                continue
+            ys, xs = np.nonzero(image[..., 0] == value)
+            rows.append([xs.min(), ys.min(), xs.max() + 1, ys.max() + 1, confidence, int(value) - 1])
+        return rows
+
+
+def scene(*objects, width=1280, height=720):
+    """A black frame with (class_id, x1, y1, x2, y2) blobs."""
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    for class_id, x1, y1, x2, y2 in objects:
+        image[y1:y2, x1:x2] = class_id + 1
+    return image
+
+
+def cascade(screener_confidences, mode="frame", audit_rate=0.0, screener_names=NAMES):
+    screener = BlobModel(screener_names, screener_confidences)
+    heavy = BlobModel(NAMES, {0: 0.95, 1: 0.95, 2: 0.95})
+    detector = CascadeDetector(screener, heavy, THREAT_LEVELS, mode=mode, audit_rate=audit_rate, seed=0)
+    return detector, screener, heavy
+
+
+def test_confident_low_threat_frame_skips_heavy_model():
+    detector, screener, heavy = cascade({0: 0.9})
+    [result] = detector.predict(scene((0, 100, 100, 120, 110)), conf=0.25)
+
+    assert heavy.calls == []
+    np.testing.assert_allclose(result.boxes.data, [[100, 100, 120, 110, 0.9, 0]])
+    assert result.cascade["escalated"] == 0
+    assert detector.stats.totals["heavy_images"] == 0
+
+
+def test_empty_frame_skips_heavy_model():
+    detector, _, heavy = cascade({})
+    [result] = detector.predict(scene(), conf=0.25)
+
+    assert heavy.calls == [] and len(result.boxes) == 0
+
+
+@pytest.mark.parametrize("confidences,objects,reason", [
+    ({0: 0.5}, [(0, 100, 100, 120, 110)], "escalated_uncertain"),
+    ({1: 0.95}, [(1, 100, 100, 140, 130)], "escalated_threat"),
+    ({2: 0.99}, [(2, 100, 100, 140, 130)], "escalated_threat"),
+])
+def test_uncertain_or_high_threat_frame_escalates(confidences, objects, reason):
+    detector, _, heavy = cascade(confidences)
+    [result] = detector.predict(scene(*objects), conf=0.25)
+
+    assert heavy.calls == [[(720, 1280)]]
+    assert result.cascade["escalated"] == 1 and result.cascade[reason] == 1
+    # The answer is the main model's
+    assert result.boxes.data[:, 4].tolist() == [pytest.approx(0.95)]
+    assert result.speed["inference"] == 2.0
+
+
+def test_class_unknown_to_heavy_model_escalates():
+    detector, _, heavy = cascade({3: 0.99}, screener_names={**NAMES, 3: "balloon"})
+    [result] = detector.predict(scene((3, 100, 100, 140, 130)), conf=0.25)
+
+    assert result.cascade["escalated_unknown_class"] == 1
+    assert len(heavy.calls) == 1
+
+
+def test_crop_mode_shifts_detections_back_to_frame_coordinates():
+    detector, _, heavy = cascade({0: 0.9, 1: 0.95}, mode="crop")
+    frame = scene((0, 100, 100, 120, 110), (1, 900, 500, 940, 530))
+    [result] = detector.predict(frame, conf=0.25)
+
+    # Only a crop around the drone went to the main model
+    [[crop_shape]] = heavy.calls
+    assert crop_shape[0] < 720 and crop_shape[1] < 1280
+    data = result.boxes.data
+    by_class = {int(row[5]): row for row in data}
+    assert by_class[1][:4].tolist() == [900, 500, 940, 530]
+    assert by_class[1][4] == pytest.approx(0.95)
+    # The trusted bird stays the screener's detection
+    assert by_class[0][:4].tolist() == [100, 100, 120, 110]
+    assert by_class[0][4] == pytest.approx(0.9)
+    assert result.cascade["heavy_images"] == 1
+
+
+def test_crop_mode_falls_back_to_whole_frame_past_max_crops():
+    detector, _, heavy = cascade({1: 0.95, 2: 0.95}, mode="crop")
+    detector.max_crops = 1
+    frame = scene((1, 100, 100, 120, 110), (2, 900, 500, 940, 530))
+    [result] = detector.predict(frame, conf=0.25)
+
+    assert heavy.calls == [[(720, 1280)]]
+    assert len(result.boxes) == 2
+
+
+def test_whole_frame_escalations_are_not_audited():
+    detector, _, heavy = cascade({1: 0.95}, audit_rate=1.0)
+    detector.predict(scene((1, 100, 100, 140, 130)), conf=0.25)
+
+    # One call for the escalation and none for an audit that could only agree with itself
+    assert len(heavy.calls) == 1
+    assert detector.stats.summary()["accuracy"] == {"screened": None, "crop": None}
+
+
+def test_audit_reports_screened_misses_separately_from_crops():
+    # The screener sees the missile too faintly to report it, and is unsure of the drone
+    detector, _, heavy = cascade({0: 0.9, 1: 0.5, 2: 0.1}, mode="crop", audit_rate=1.0)
+    screened = scene((0, 100, 100, 120, 110), (2, 600, 300, 640, 330))
+    cropped = scene((1, 900, 500, 940, 530))
+    detector.predict([screened, cropped], conf=0.25)
+
+    # Crop batch, then one audit batch with both whole frames
+    assert heavy.calls[1] == [(720, 1280), (720, 1280)]
+    accuracy = detector.stats.summary()["accuracy"]
+    assert accuracy["screened"]["audited_images"] == 1
+    assert accuracy["screened"]["recall"] == 0.5
+    assert accuracy["screened"]["precision"] == 1.0
+    assert accuracy["screened"]["missed_high_threat"] == 1
+    assert accuracy["crop"] == {"audited_images": 1, "precision": 1.0, "recall": 1.0, "f1": 1.0,
+                                "missed_high_threat": 0}
+
+
+def test_stats_merge_segment_totals():
+    detector, _, _ = cascade({0: 0.9}, audit_rate=1.0)
+    detector.predict(scene((0, 100, 100, 120, 110)), conf=0.25)
+    stats = CascadeStats(detector.describe())
+    stats.merge(detector.stats.totals)
+    stats.merge(detector.stats.totals)
+    summary = stats.summary()
+
+    assert summary["images"] == 2 and summary["mode"] == "frame"
+    assert summary["accuracy"]["screened"]["audited_images"] == 2
+    assert summary["escalation_rate"] == 0.0
+
+
+def test_match_detections_is_class_aware():
+    reference = np.array([[0, 0, 10, 10, 0.9, 0], [20, 20, 30, 30, 0.9, 1]], dtype=np.float32)
+    found = np.array([[0, 0, 10, 11, 0.8, 0], [20, 20, 30, 30, 0.8, 0]], dtype=np.float32)
+
+    assert match_detections(found, reference).tolist() == [True, False]
+
+
+def test_crop_regions_pad_clip_and_join():
+    boxes = np.array([[10, 10, 30, 30], [40, 10, 60, 30], [570, 530, 590, 550]], dtype=np.float32)
+    regions = crop_regions(boxes, 600, 560, padding=0.5, min_size=64)
+
+    assert len(regions) == 2
+    assert regions[0].tolist()[:2] == [0, 0]
+    assert regions[1].tolist()[2:] == [600, 560]
+
+
+def test_rejects_bad_settings():
+    with pytest.raises(ValueError):
+        CascadeDetector(None, None, THREAT_LEVELS, mode="tiles")
+    with pytest.raises(ValueError):
+        CascadeDetector(None, None, THREAT_LEVELS, screen_conf=0.8, accept_conf=0.5)
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+from chunked_upload import ChunkedUploadManager, UploadError
+
+DATA = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return ChunkedUploadManager(str(tmp_path), max_bytes=len(DATA) + 100)
+
+
+def upload_in_chunks(manager, upload_id, data, size):
+    offset = 0
+    for start in range(0, len(data), size):
+        offset = manager.append(upload_id, data[start:start + size], offset)
+    return offset
+
+
+def test_chunks_in_order_commit_with_checksum(manager):
+    upload = manager.init("clip.mp4", total_size=len(DATA), sha256=hashlib.sha256(DATA).hexdigest())
+    assert upload["offset"] == 0
+    assert upload_in_chunks(manager, upload["upload_id"], DATA, 1000) == len(DATA)
+    assert manager.status(upload["upload_id"])["complete"]
+    result = manager.commit(upload["upload_id"])
+    assert result["sha256"] == hashlib.sha256(DATA).hexdigest()
+    with open(result["path"], "rb") as f:
+        assert f.read() == DATA
+    # A committed session is gone
+    with pytest.raises(UploadError) as error:
+        manager.status(upload["upload_id"])
+    assert error.value.status_code == 404
+
+
+def test_out_of_order_chunk_is_rejected_with_resume_offset(manager):
+    upload_id = manager.init("clip.mp4")["upload_id"]
+    manager.append(upload_id, DATA[:100], 0)
+    with pytest.raises(UploadError) as error:
+        manager.append(upload_id, DATA[200:300], 200)
+    assert error.value.status_code == 409
+    assert error.value.offset == 100
+    assert manager.status(upload_id)["offset"] == 100
+
+
+def test_duplicate_chunk_is_rejected_and_not_written_twice(manager):
+    upload_id = manager.init("clip.mp4")["upload_id"]
+    manager.append(upload_id, DATA[:100], 0)
+    with pytest.raises(UploadError) as error:
+        manager.append(upload_id, DATA[:100], 0)
+    assert error.value.status_code == 409
+    manager.append(upload_id, DATA[100:], 100)
+    result = manager.commit(upload_id, sha256=hashlib.sha256(DATA).hexdigest())
+    assert os.path.getsize(result["path"]) == len(DATA)
+
+
+def test_size_limits(manager):
+    with pytest.raises(UploadError) as error:
+        manager.init("big.mp4", total_size=manager.max_bytes + 1)
+    assert error.value.status_code == 413
+
+    upload_id = manager.init("clip.mp4", total_size=10)["upload_id"]
+    with pytest.raises(UploadError) as error:
+        manager.append(upload_id, DATA[:11], 0)
+    assert error.value.status_code == 413
+    assert manager.status(upload_id)["offset"] == 0
+
+
+def test_commit_checks_size_checksum_and_emptiness(manager):
+    upload_id = manager.init("clip.mp4")["upload_id"]
+    with pytest.raises(UploadError) as error:
+        manager.commit(upload_id)
+    assert error.value.status_code == 400
+
+    upload_id = manager.init("clip.mp4", total_size=len(DATA))["upload_id"]
+    manager.append(upload_id, DATA[:10], 0)
+    with pytest.raises(UploadError) as error:
+        manager.commit(upload_id)
+    assert error.value.status_code == 409
+
+    upload_id = manager.init("clip.mp4")["upload_id"]
+    manager.append(upload_id, DATA, 0)
+    with pytest.raises(UploadError) as error:
+        manager.commit(upload_id, sha256="0" * 64)
+    assert error.value.status_code == 422
+
+
+def test_invalid_sha256_and_unknown_upload(manager):
+    with pytest.raises(UploadError) as error:
+        manager.init("clip.mp4", sha256="xyz")
+    assert error.value.status_code == 400
+    with pytest.raises(UploadError) as error:
+        manager.get("../../etc/passwd")
+    assert error.value.status_code == 404
+
+
+def test_filename_cannot_escape_upload_dir(manager, tmp_path):
+    upload_id = manager.init("../../evil.mp4")["upload_id"]
+    manager.append(upload_id, DATA[:10], 0)
+    path = manager.commit(upload_id)["path"]
+    assert os.path.dirname(os.path.abspath(path)) == str(tmp_path)
+
+
+def test_session_resumes_after_restart(tmp_path):
+    first = ChunkedUploadManager(str(tmp_path), max_bytes=len(DATA))
+    upload_id = first.init("clip.mp4", total_size=len(DATA))["upload_id"]
+    first.append(upload_id, DATA[:500], 0)
+
+    second = ChunkedUploadManager(str(tmp_path), max_bytes=len(DATA))
+    assert second.status(upload_id)["offset"] == 500
+    second.append(upload_id, DATA[500:], 500)
+    # The checksum is rebuilt from the partial file
+    assert second.commit(upload_id)["sha256"] == hashlib.sha256(DATA).hexdigest()
+
+
+def test_abort_and_expire(tmp_path):
+    manager = ChunkedUploadManager(str(tmp_path), max_bytes=len(DATA), session_ttl_seconds=60)
+    upload = manager.init("clip.mp4")
+    manager.append(upload["upload_id"], DATA[:10], 0)
+    path = manager.get(upload["upload_id"]).path
+    manager.abort(upload["upload_id"])
+    assert not os.path.exists(path)
+
+    stale = manager.init("old.mp4")["upload_id"]
+    manager.get(stale).updated_at = time.time() - 120
+    manager.expire()
+    with pytest.raises(UploadError):
+        manager.status(stale)
+
+
+def test_workers_sharing_a_session_follow_the_file_on_disk(tmp_path):
+    # Two worker processes' managers over the same upload directory
+    worker_a = ChunkedUploadManager(str(tmp_path), max_bytes=len(DATA))
+    worker_b = ChunkedUploadManager(str(tmp_path), max_bytes=len(DATA))
+    data = DATA[:300]
+    upload_id = worker_a.init("clip.mp4", total_size=len(data), sha256=hashlib.sha256(data).hexdigest())["upload_id"]
+    worker_a.append(upload_id, data[:100], 0)
+    worker_b.append(upload_id, data[100:200], 100)
+
+    # A's cached session is behind; it must resume from what is on disk, not its own count
+    with pytest.raises(UploadError) as error:
+        worker_a.append(upload_id, data[100:200], 100)
+    assert error.value.status_code == 409 and error.value.offset == 200
+    assert worker_a.status(upload_id)["offset"] == 200
+
+    worker_a.append(upload_id, data[200:], 200)
+    result = worker_b.commit(upload_id)
+    assert result["sha256"] == hashlib.sha256(data).hexdigest()
+    assert os.path.getsize(result["path"]) == len(data)
+
+    # The session is gone for the other worker too
+    with pytest.raises(UploadError) as error:
+        worker_a.append(upload_id, b"x", 300)
+    assert error.value.status_code == 404
+
+
+def test_session_aborted_by_another_worker_is_gone(tmp_path):
+    worker_a = ChunkedUploadManager(str(tmp_path), max_bytes=len(DATA))
+    worker_b = ChunkedUploadManager(str(tmp_path), max_bytes=len(DATA))
+    upload_id = worker_a.init("clip.mp4")["upload_id"]
+    worker_a.append(upload_id, DATA[:100], 0)
+    worker_b.abort(upload_id)
+
+    with pytest.raises(UploadError) as error:
+        worker_a.commit(upload_id)
+    assert error.value.status_code == 404
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from conftest import Result
+from postprocess import THREAT_RANK, DetectionPostprocessor, get_postprocessor, to_numpy
+
+NAMES = {0: "Bird", 1: "drone", 2: "missile", 3: "mystery"}
+THREAT_LEVELS = {"bird": "Low", "drone": "High", "missile": "Critical"}
+
+
+class FakeTensor:
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+@pytest.fixture
+def postprocessor():
+    return DetectionPostprocessor(NAMES, THREAT_LEVELS)
+
+
+def test_to_numpy_moves_tensors():
+    assert to_numpy(FakeTensor(np.arange(3))).tolist() == [0, 1, 2]
+    assert to_numpy([1, 2]).tolist() == [1, 2]
+
+
+def test_extract_columns(postprocessor):
+    columns = postprocessor.extract(Result([[0, 0, 10, 10, 0.9, 0], [5, 5, 20, 20, 0.7, 2]]))
+    assert columns["xyxy"].shape == (2, 4)
+    assert columns["conf"].tolist() == pytest.approx([0.9, 0.7])
+    assert columns["cls"].tolist() == [0, 2]
+    assert columns["threat_rank"].tolist() == [THREAT_RANK["Low"], THREAT_RANK["Critical"]]
+
+
+def test_extract_tracked_result_skips_track_id_column(postprocessor):
+    columns = postprocessor.extract(Result([[0, 0, 10, 10, 7, 0.8, 1]]))
+    assert columns["conf"].tolist() == pytest.approx([0.8])
+    assert columns["cls"].tolist() == [1]
+
+
+@pytest.mark.parametrize("result", [Result([]), object()])
+def test_extract_empty(postprocessor, result):
+    columns = postprocessor.extract(result)
+    assert columns["xyxy"].shape == (0, 4)
+    assert postprocessor.highest_threat(columns) == "None"
+    assert postprocessor.records(columns) == []
+    assert postprocessor.class_counts(columns) == {}
+
+
+def test_records_and_unknown_class(postprocessor):
+    columns = postprocessor.extract(Result([[0, 0, 10, 20, 0.5, 0], [0, 0, 1, 1, 0.6, 3]]))
+    records = postprocessor.records(columns, lower_case=True, class_key="class")
+    assert records[0] == {"class": "bird", "confidence": pytest.approx(0.5), "bounding_box": [0, 0, 10, 20],
+                          "threat_level": "Low"}
+    assert records[1]["threat_level"] == "Unknown"
+    # Unknown classes never raise the highest threat level
+    assert postprocessor.highest_threat(columns) == "Low"
+
+
+def test_normalised_boxes_and_centres(postprocessor):
+    columns = postprocessor.extract(Result([[10, 20, 30, 40, 0.9, 1]]))
+    boxes = postprocessor.normalised_boxes(columns, width=100, height=200)
+    np.testing.assert_allclose(boxes, [[0.1, 0.1, 0.3, 0.2]], rtol=1e-6)
+    np.testing.assert_allclose(postprocessor.centres(boxes), [[0.2, 0.15]], rtol=1e-6)
+
+
+def test_columnar_and_counts(postprocessor):
+    columns = postprocessor.extract(Result([[0, 0, 1, 1, 0.12346, 1], [0, 0, 1, 1, 0.9, 1], [0, 0, 1, 1, 0.9, 2]]))
+    output = postprocessor.columnar(columns)
+    assert output["object_class"] == ["drone", "drone", "missile"]
+    assert output["confidence"][0] == pytest.approx(0.1235)
+    assert output["threat_level"] == ["High", "High", "Critical"]
+    assert postprocessor.class_counts(columns) == {"drone": 2, "missile": 1}
+    assert postprocessor.highest_threat(columns) == "Critical"
+
+
+def test_get_postprocessor_is_cached_per_class_table():
+    assert get_postprocessor(NAMES, THREAT_LEVELS) is get_postprocessor(dict(NAMES), THREAT_LEVELS)
+    assert get_postprocessor({0: "bird"}, THREAT_LEVELS) is not get_postprocessor(NAMES, THREAT_LEVELS)
+
+
+def test_get_postprocessor_is_cached_per_threat_table():
+    stricter = {**THREAT_LEVELS, "bird": "High"}
+    default = get_postprocessor(NAMES, THREAT_LEVELS)
+    custom = get_postprocessor(NAMES, stricter)
+
+    assert custom is not default
+    assert custom is get_postprocessor(NAMES, dict(stricter))
+    assert custom.threat_ranks[0] == THREAT_RANK["High"]
+    assert default.threat_ranks[0] == THREAT_RANK["Low"]
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from sharding import iter_segment_records, merge_threat_summary, plan_segments
+
+
+def assert_contiguous(segments, total_frames):
+    assert segments[0][0] == 0
+    assert segments[-1][1] == total_frames
+    for (_, end), (start, _) in zip(segments, segments[1:]):
+        assert end == start
+
+
+def test_even_split():
+    segments = plan_segments(9000, fps=30.0, shards=4, min_segment_seconds=30.0)
+    assert segments == [(0, 2250), (2250, 4500), (4500, 6750), (6750, 9000)]
+
+
+def test_short_video_gets_fewer_segments():
+    # 90 s at 30 fps leaves room for three 30 s segments only
+    segments = plan_segments(2700, fps=30.0, shards=8, min_segment_seconds=30.0)
+    assert len(segments) == 3
+    assert_contiguous(segments, 2700)
+    assert plan_segments(100, fps=30.0, shards=8) == [(0, 100)]
+
+
+@pytest.mark.parametrize("total_frames, align", [(10007, 3), (9999, 5), (12345, 7), (5000, 10)])
+def test_boundaries_align_to_the_stride(total_frames, align):
+    segments = plan_segments(total_frames, fps=25.0, shards=6, min_segment_seconds=10.0, align=align)
+    assert_contiguous(segments, total_frames)
+    for start, _ in segments:
+        assert start % align == 0
+    # Every frame a single pass would infer (0, align, 2*align, ...) lands in exactly one segment
+    inferred = [frame for start, end in segments for frame in range(start, end) if frame % align == 0]
+    assert inferred == list(range(0, total_frames, align))
+
+
+def test_alignment_never_creates_empty_segments():
+    segments = plan_segments(100, fps=1.0, shards=10, min_segment_seconds=1.0, align=40)
+    assert all(end > start for start, end in segments)
+    assert_contiguous(segments, 100)
+
+
+def test_empty_video():
+    assert plan_segments(0, fps=30.0, shards=4) == [(0, 0)]
+
+
+def test_iter_segment_records_shifts_track_ids(tmp_path):
+    path = tmp_path / "segment.jsonl"
+    frames = [
+        {"frame_id": 0, "detections": [{"trajectory": {"track_id": 1}}, {"trajectory": {"track_id": None}}, {}]},
+        {"frame_id": 3, "detections": [{"trajectory": {"track_id": 2}}]},
+    ]
+    path.write_text("".join(json.dumps(frame) + "\n" for frame in frames))
+    shifted = list(iter_segment_records(str(path), track_id_offset=10))
+    assert shifted[0]["detections"][0]["trajectory"]["track_id"] == 11
+    assert shifted[0]["detections"][1]["trajectory"]["track_id"] is None
+    assert shifted[1]["detections"][0]["trajectory"]["track_id"] == 12
+    assert list(iter_segment_records(str(path)))[1]["detections"][0]["trajectory"]["track_id"] == 2
+
+
+def test_merge_threat_summary_keeps_highest_level():
+    total = {"bird": 2, "highest_threat_level": "High"}
+    merge_threat_summary(total, {"bird": 1, "missile": 1, "highest_threat_level": "Critical"})
+    merge_threat_summary(total, {"bird": 4, "highest_threat_level": "Low"})
+    assert total == {"bird": 7, "missile": 1, "highest_threat_level": "Critical"}
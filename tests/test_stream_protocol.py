@@ -0,0 +1,133 @@
+import cv2
+import numpy as np
+import pytest
+
+from stream_protocol import (
+    DETECTION_DTYPE, FRAME_HEADER, MSG_DETECTIONS, MSG_FRAME, PROTOCOL_NAME, RESULT_HEADER, BinaryStreamSession,
+    ProtocolError, fit_frame_size,
+)
+
+NAMES = {0: "Drone", 1: "bird", 3: "missile"}
+THREAT_LEVELS = {"drone": "High", "bird": "Low", "missile": "Critical"}
+
+
+def hello(**overrides):
+    return {"type": "hello", "protocol": PROTOCOL_NAME, "version": 1, "width": 1920, "height": 1080,
+            "encodings": ["jpeg", "raw"], **overrides}
+
+
+def session(**overrides):
+    return BinaryStreamSession(hello(**overrides), NAMES, THREAT_LEVELS)
+
+
+def frame_message(payload: bytes, seq: int = 7, msg_type: int = MSG_FRAME, version: int = 1) -> bytes:
+    return FRAME_HEADER.pack(msg_type, version, 0, seq) + payload
+
+
+def unpack(message: bytes):
+    header = RESULT_HEADER.unpack_from(message)
+    records = np.frombuffer(message, dtype=DETECTION_DTYPE, offset=RESULT_HEADER.size)
+    return header, records
+
+
+def test_fit_frame_size_keeps_aspect_ratio():
+    assert fit_frame_size(1920, 1080, 640) == (640, 360)
+    assert fit_frame_size(320, 240, 640) == (320, 240)
+    assert fit_frame_size(1920, 1080, None) == (1920, 1080)
+
+
+def test_handshake_negotiates_encoding_size_and_classes():
+    s = session(encodings=["raw", "jpeg"])
+    welcome = s.welcome()
+
+    # Server preference wins over the client's order
+    assert welcome["encoding"] == "jpeg"
+    assert (welcome["frame_width"], welcome["frame_height"]) == (640, 360)
+    assert [c["name"] for c in welcome["classes"]] == ["Drone", "bird", "2", "missile"]
+    assert welcome["classes"][0]["threat_level"] == "High"
+    assert welcome["classes"][2]["threat_level"] == "Unknown"
+    assert welcome["record"]["size"] == DETECTION_DTYPE.itemsize == 15
+
+
+def test_server_resize_uses_reduced_decode():
+    s = session(resize="server")
+    assert s.reduction == 2
+    assert (s.frame_width, s.frame_height) == (960, 540)
+    # Raw frames cannot be decoded smaller, so the client must resize them
+    assert session(encodings=["raw"], resize="server").resize == "client"
+
+
+@pytest.mark.parametrize("overrides", [
+    {"protocol": "other"},
+    {"version": 2},
+    {"encodings": ["gif"]},
+    {"width": None},
+    {"width": 70000},
+    {"resize": "sideways"},
+])
+def test_bad_hello_is_rejected(overrides):
+    with pytest.raises(ProtocolError):
+        session(**overrides)
+
+
+def test_decode_raw_frame():
+    s = session(encodings=["raw"])
+    image = np.arange(360 * 640 * 3, dtype=np.uint32).astype(np.uint8).reshape(360, 640, 3)
+    seq, decoded = s.decode(frame_message(image.tobytes(), seq=42))
+
+    assert seq == 42
+    np.testing.assert_array_equal(decoded, image)
+    assert s.frames == 1
+    # A payload of the wrong size is an invalid image, not a protocol error
+    assert s.decode(frame_message(b"\x00" * 10)) == (7, None)
+
+
+def test_decode_jpeg_frame():
+    s = session(width=640, height=360)
+    ok, jpeg = cv2.imencode(".jpg", np.full((360, 640, 3), 128, dtype=np.uint8))
+    assert ok
+    seq, decoded = s.decode(frame_message(jpeg.tobytes()))
+
+    assert seq == 7 and decoded.shape == (360, 640, 3)
+    assert s.decode(frame_message(b"not a jpeg"))[1] is None
+
+
+@pytest.mark.parametrize("message", [
+    b"\x01\x01",
+    FRAME_HEADER.pack(MSG_DETECTIONS, 1, 0, 1),
+    FRAME_HEADER.pack(MSG_FRAME, 2, 0, 1),
+])
+def test_decode_rejects_bad_headers(message):
+    with pytest.raises(ProtocolError):
+        session().decode(message)
+
+
+def test_pack_records():
+    s = session()
+    detections = [
+        {"object_class": "Drone", "confidence": 0.875, "bounding_box": [10.4, 20.6, 100.5, 200.0], "track_id": 3},
+        {"object_class": "unknown", "confidence": 0.5, "bounding_box": [0, 0, 1, 1]},
+    ]
+    header, records = unpack(s.pack(2 ** 32 + 5, detections, (360, 640, 3), latency_ms=12.7, dropped=1))
+
+    assert header == (MSG_DETECTIONS, 1, 2, 5, 640, 360, 12, 1)
+    assert records["class_id"].tolist() == [0, 255]
+    assert records["confidence"].tolist() == [0.875, 0.5]
+    assert records["box"][0].tolist() == [10, 21, 100, 200]
+    assert records["track_id"].tolist() == [3, -1]
+
+
+def test_pack_clips_to_u16():
+    s = session()
+    detections = [{"object_class": "bird", "confidence": 0.9, "bounding_box": [-5, -0.2, 70000.0, 65535.4]}]
+    header, records = unpack(s.pack(1, detections, (80000, 90000), latency_ms=1e6, dropped=10 ** 6))
+
+    assert records["box"][0].tolist() == [0, 0, 65535, 65535]
+    assert header[4:] == (65535, 65535, 65535, 65535)
+
+
+def test_pack_without_detections_is_header_only():
+    message = session().pack(9, [], (360, 640))
+
+    assert len(message) == RESULT_HEADER.size
+    assert RESULT_HEADER.unpack(message)[2] == 0
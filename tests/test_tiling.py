@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+from conftest import Result
+from tiling import TilePlanner, TilingStats, nms, parse_roi, plan_tiles
+
+NAMES = {0: "drone", 1: "bird"}
+
+
+def test_parse_roi_forms():
+    assert parse_roi(None) is None
+    assert parse_roi("top:0.5").tolist() == [[0, 0], [1, 0], [1, 0.5], [0, 0.5]]
+    assert parse_roi("poly:0,0;1.5,0;1,1").tolist() == [[0, 0], [1, 0], [1, 1]]
+
+
+@pytest.mark.parametrize("spec", ["top:0", "top:1.5", "poly:0,0;1,1", "poly:a,b;c,d;e,f", "left:0.5"])
+def test_parse_roi_rejects_bad_specs(spec):
+    with pytest.raises(ValueError, match="Invalid ROI"):
+        parse_roi(spec)
+
+
+@pytest.mark.parametrize("width,height", [(1920, 1080), (1000, 700), (641, 640)])
+def test_plan_tiles_cover_frame_with_overlap(width, height):
+    tiles = plan_tiles(width, height, 640, 0.2)
+
+    assert tiles[:, 0].min() == 0 and tiles[:, 1].min() == 0
+    assert tiles[:, 2].max() == width and tiles[:, 3].max() == height
+    assert ((tiles[:, 2] - tiles[:, 0]) == 640).all()
+    covered = np.zeros((height, width), dtype=bool)
+    for x1, y1, x2, y2 in tiles:
+        covered[y1:y2, x1:x2] = True
+    assert covered.all()
+    xs = sorted(set(tiles[:, 0].tolist()))
+    # Neighbouring tiles share at least the requested overlap
+    assert all(b - a <= 640 * 0.8 for a, b in zip(xs, xs[1:]))
+
+
+def test_plan_tiles_small_frame_is_one_clipped_tile():
+    assert plan_tiles(300, 200, 640, 0.2).tolist() == [[0, 0, 300, 200]]
+
+
+def test_nms_ios_suppresses_truncated_cross_tile_box():
+    # A full box and the sliver of it the neighbouring tile saw
+    boxes = np.array([[100, 100, 200, 200], [180, 100, 200, 200]], dtype=np.float32)
+    scores = np.array([0.9, 0.8])
+    classes = np.array([0, 0])
+
+    assert nms(boxes, scores, classes, 0.6, metric="ios").tolist() == [0]
+    # Plain IoU is only 0.2, so it keeps both
+    assert nms(boxes, scores, classes, 0.6, metric="iou").tolist() == [0, 1]
+
+
+def test_nms_is_class_aware_and_orders_by_score():
+    boxes = np.array([[0, 0, 10, 10], [0, 0, 10, 10], [1, 1, 10, 10], [50, 50, 60, 60]], dtype=np.float32)
+    scores = np.array([0.5, 0.7, 0.9, 0.6])
+    classes = np.array([0, 1, 0, 0])
+
+    assert nms(boxes, scores, classes, 0.5).tolist() == [2, 1, 3]
+    assert nms(np.empty((0, 4)), np.empty(0), np.empty(0), 0.5).tolist() == []
+
+
+def test_crops_are_views_and_add_full_frame():
+    frame = np.zeros((700, 1000, 3), dtype=np.uint8)
+    planner = TilePlanner(tile_size=640, overlap=0.2)
+    images, tiles = planner.crops(frame)
+
+    assert len(images) == len(tiles) == 5
+    assert tiles[-1].tolist() == [0, 0, 1000, 700]
+    assert images[-1] is frame
+    assert all(np.shares_memory(image, frame) for image in images)
+
+
+def test_crops_skip_redundant_full_frame():
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    images, tiles = TilePlanner(tile_size=640).crops(frame)
+
+    assert len(images) == 1 and tiles.tolist() == [[0, 0, 640, 480]]
+
+
+def test_merge_shifts_offsets_and_merges_duplicates():
+    planner = TilePlanner(tile_size=640, overlap=0.2, full_frame=False)
+    tiles = np.array([[0, 0, 640, 640], [360, 0, 1000, 640], [600, 300, 1000, 640]])
+    results = [
+        Result([[500, 100, 600, 150, 0.9, 0]]),
+        # The same drone seen from the second tile
+        Result([[140, 100, 240, 150, 0.8, 0]]),
+        # Tracked results carry a track-id column before conf and cls
+        Result([[10, 20, 30, 40, 7, 0.6, 1]]),
+    ]
+    merged = planner.merge(results, tiles, (700, 1000), NAMES)
+
+    np.testing.assert_allclose(merged.boxes.data, [[500, 100, 600, 150, 0.9, 0], [610, 320, 630, 340, 0.6, 1]])
+    assert merged.names is NAMES and merged.orig_shape == (700, 1000)
+    assert merged.speed["inference"] == 3.0
+    assert merged.tiling["detections_before_merge"] == 3
+    assert merged.tiling["detections"] == 2
+    assert merged.tiling["model_ms"] == 6.0
+
+
+def test_merge_drops_detections_centred_outside_roi():
+    planner = TilePlanner(tile_size=640, roi="top:0.5", full_frame=False)
+    tiles, _, skipped = planner.plan(640, 1280)
+    # The bottom tile lies wholly below the horizon; the middle one is half inside
+    assert skipped == 1 and tiles.tolist() == [[0, 0, 640, 640], [0, 320, 640, 960]]
+
+    results = [Result([[10, 10, 50, 50, 0.9, 0]]), Result([[10, 400, 50, 480, 0.9, 0]])]
+    merged = planner.merge(results, tiles, (1280, 640), NAMES)
+
+    assert merged.boxes.data[:, :4].tolist() == [[10, 10, 50, 50]]
+    assert merged.tiling["tiles_skipped"] == 1
+
+
+def test_merge_with_no_detections():
+    planner = TilePlanner(tile_size=640)
+    merged = planner.merge([Result([])], np.array([[0, 0, 640, 480]]), (480, 640), NAMES)
+
+    assert merged.boxes.data.shape == (0, 6)
+    assert merged.tiling["detections"] == 0
+
+
+def test_planner_rejects_bad_settings():
+    with pytest.raises(ValueError):
+        TilePlanner(tile_size=16)
+    with pytest.raises(ValueError):
+        TilePlanner(overlap=0.95)
+
+
+def test_tiling_stats_add_and_merge():
+    stats = TilingStats({"tile_size": 640})
+    report = {"tiles": 4, "tiles_skipped": 1, "detections_before_merge": 5, "detections": 3,
+              "model_ms": 20.0, "merge_ms": 1.0}
+    stats.add(report)
+    stats.merge({**report, "frames": 1})
+    summary = stats.summary()
+
+    assert summary["tile_size"] == 640
+    assert summary["frames"] == 2 and summary["tiles"] == 8
+    assert summary["tiles_per_frame"] == 4.0
+    assert summary["model_ms_per_frame"] == 20.0
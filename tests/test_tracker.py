@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from tracker import IouTracker, TrackerRegistry, box_iou, heading_to_direction
+
+
+def box(cx, cy, size=20.0):
+    return [cx - size / 2, cy - size / 2, cx + size / 2, cy + size / 2]
+
+
+def test_box_iou_identical_disjoint_and_empty():
+    a = np.array([box(50, 50)])
+    b = np.array([box(50, 50), box(500, 500)])
+    iou = box_iou(a, b)
+    assert iou.shape == (1, 2)
+    assert iou[0, 0] == pytest.approx(1.0)
+    assert iou[0, 1] == 0.0
+    assert box_iou(np.empty((0, 4)), b).shape == (0, 2)
+
+
+@pytest.mark.parametrize("heading, label", [(0, "north"), (90, "east"), (180, "south"), (270, "west"),
+                                            (350, "north"), (44, "northeast")])
+def test_heading_to_direction(heading, label):
+    assert heading_to_direction(heading, speed=10.0, min_speed=2.0) == label
+
+
+def test_heading_to_direction_below_min_speed_is_stationary():
+    assert heading_to_direction(123.0, speed=1.0, min_speed=2.0) == "stationary"
+
+
+def test_new_track_has_no_heading():
+    tracker = IouTracker()
+    tracks = tracker.update([box(100, 100)], [0], timestamp=0.0)
+    record = tracker.describe(tracks, 0)
+    assert tracks["is_new"].tolist() == [True]
+    assert record["heading_degrees"] is None
+    assert record["direction"] == "stationary"
+    assert record["velocity"] == 0.0
+
+
+def test_stationary_track_keeps_id_and_has_no_heading():
+    tracker = IouTracker()
+    first = tracker.update([box(100, 100)], [0], timestamp=0.0)
+    second = tracker.update([box(100, 100)], [0], timestamp=0.1)
+    assert second["track_ids"].tolist() == first["track_ids"].tolist()
+    assert second["is_new"].tolist() == [False]
+    assert tracker.describe(second, 0)["heading_degrees"] is None
+
+
+def test_moving_track_reports_velocity_and_heading():
+    tracker = IouTracker()
+    for step in range(6):
+        # 100 px/s to the right
+        tracks = tracker.update([box(100 + 10 * step, 100)], [0], timestamp=0.1 * step)
+    record = tracker.describe(tracks, 0)
+    assert record["track_id"] == 1
+    assert record["velocity_px_per_s"][0] == pytest.approx(100.0, rel=0.05)
+    assert record["heading_degrees"] == pytest.approx(90.0, abs=1.0)
+    assert record["direction"] == "east"
+
+
+def test_upward_motion_is_north():
+    tracker = IouTracker()
+    for step in range(6):
+        tracks = tracker.update([box(100, 300 - 10 * step)], [0], timestamp=0.1 * step)
+    assert tracker.describe(tracks, 0)["direction"] == "north"
+
+
+def test_tracks_do_not_match_across_classes():
+    tracker = IouTracker()
+    tracker.update([box(100, 100)], [0], timestamp=0.0)
+    tracks = tracker.update([box(100, 100)], [1], timestamp=0.1)
+    assert tracks["is_new"].tolist() == [True]
+    assert tracker.tracks_created == {0: 1, 1: 1}
+
+
+def test_idle_tracks_expire():
+    tracker = IouTracker(max_idle_seconds=1.0)
+    tracker.update([box(100, 100)], [0], timestamp=0.0)
+    tracks = tracker.update([box(100, 100)], [0], timestamp=5.0)
+    assert tracks["is_new"].tolist() == [True]
+    assert tracks["track_ids"].tolist() == [2]
+    assert len(tracker) == 1
+
+
+def test_max_tracks_keeps_most_recent():
+    tracker = IouTracker(max_tracks=2)
+    tracker.update([box(100, 100)], [0], timestamp=0.0)
+    tracker.update([box(300, 300), box(500, 500)], [0, 0], timestamp=0.1)
+    assert len(tracker) == 2
+
+
+def test_empty_frame():
+    tracker = IouTracker()
+    tracks = tracker.update(np.empty((0, 4)), np.empty(0), timestamp=0.0)
+    assert len(tracks["track_ids"]) == 0
+    assert len(tracks["headings"]) == 0
+
+
+def test_registry_reuses_and_bounds_trackers():
+    registry = TrackerRegistry(max_streams=2)
+    a = registry.get("a")
+    assert registry.get("a") is a
+    registry.get("b")
+    registry.get("c")
+    assert len(registry) == 2
+    # "a" was least recently used, so it was dropped
+    assert registry.get("a") is not a
@@ -0,0 +1,292 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from postprocess import to_numpy
+
+
+def parse_roi(spec: Optional[str]) -> Optional[np.ndarray]:
+    """
+    Parse a region-of-interest spec into a polygon in normalised (0-1) coordinates.
+
+    Accepted forms:
+        "top:0.6"                  the top 60% of the frame (sky above the horizon)
+        "poly:0,0;1,0;1,0.5;0,0.7" any polygon, as x,y pairs separated by ";"
+
+    Returns:
+        (K, 2) float array, or None for no ROI
+    """
+    if not spec:
+        return None
+    kind, _, value = spec.partition(":")
+    try:
+        if kind == "top":
+            fraction = float(value)
+            if not 0.0 < fraction <= 1.0:
+                raise ValueError
+            return np.array([[0.0, 0.0], [1.0, 0.0], [1.0, fraction], [0.0, fraction]])
+        if kind == "poly":
+            points = np.array([[float(v) for v in pair.split(",")] for pair in value.split(";")])
+            if points.ndim != 2 or points.shape[1] != 2 or len(points) < 3:
+                raise ValueError
+            return np.clip(points, 0.0, 1.0)
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid ROI: {spec!r} (use top:<fraction> or poly:x,y;x,y;x,y...)")
+
+
+def plan_tiles(width: int, height: int, tile_size: int, overlap: float) -> np.ndarray:
+    """
+    Overlapping square tiles covering a frame.
+
+    Tiles are evenly spaced so the last row/column ends at the frame edge;
+    frames smaller than a tile along an axis get a single tile on that axis.
+
+    Returns:
+        (N, 4) int array of x1, y1, x2, y2
+    """
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        step = max(1, int(tile_size * (1.0 - overlap)))
+        count = int(np.ceil((length - tile_size) / step)) + 1
+        return np.linspace(0, length - tile_size, count).round().astype(int).tolist()
+
+    tiles = [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height) for x in starts(width)
+    ]
+    return np.array(tiles, dtype=np.int64).reshape(-1, 4)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray, threshold: float,
+        metric: str = "ios") -> np.ndarray:
+    """
+    Class-aware greedy non-maximum suppression.
+
+    metric="ios" (intersection over the smaller box) also removes the partial
+    boxes an object leaves in a neighbouring tile, which plain IoU keeps
+    because the truncated box is much smaller than the full one.
+
+    Returns:
+        Indices of the kept boxes, highest score first
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-scores)
+    keep = []
+    while len(order):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        rest = rest[classes[rest] == classes[i]]
+        if len(rest):
+            x1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+            y1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+            x2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+            y2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+            inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+            if metric == "ios":
+                overlap = inter / np.maximum(np.minimum(areas[i], areas[rest]), 1e-9)
+            else:
+                overlap = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+            suppressed = set(rest[overlap > threshold].tolist())
+        else:
+            suppressed = set()
+        order = np.array([j for j in order[1:] if j not in suppressed], dtype=np.int64)
+    return np.array(keep, dtype=np.int64)
+
+
+class TiledBoxes:
+    """Merged detections in the shape postprocess.extract() reads from YOLO results."""
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+
+class TiledResult:
+    """
+    Stand-in for an ultralytics Results object built from merged tile detections.
+
+    speed sums the model's per-tile timings so latency metrics show the real
+    cost of a tiled frame; tiling holds the per-frame tiling report.
+    """
+
+    def __init__(self, data: np.ndarray, names: Dict[int, str], orig_shape: Tuple[int, int],
+                 speed: Dict[str, float], tiling: Dict):
+        self.boxes = TiledBoxes(data)
+        self.names = names
+        self.orig_shape = orig_shape
+        self.speed = speed
+        self.tiling = tiling
+
+
+class TilePlanner:
+    """
+    Slices frames into overlapping tiles for small-target detection and merges the results.
+
+    Args:
+        tile_size: Side of a square tile in source pixels (match the model's imgsz
+            so tiles are inferred at native resolution)
+        overlap: Fraction of a tile shared with its neighbour
+        roi: Region-of-interest spec (see parse_roi); tiles mostly outside it are
+            skipped and detections centred outside it dropped
+        min_roi_coverage: Fraction of a tile that must lie in the ROI for it to run
+        full_frame: Also run the whole (downscaled) frame so large, close objects
+            that span several tiles are still found in one piece
+        nms_threshold: Overlap above which cross-tile duplicates are merged
+    """
+
+    def __init__(self, tile_size: int = 640, overlap: float = 0.2, roi: Optional[str] = None,
+                 min_roi_coverage: float = 0.1, full_frame: bool = True, nms_threshold: float = 0.6):
+        if tile_size < 32:
+            raise ValueError("tile_size must be at least 32 pixels")
+        if not 0.0 <= overlap < 0.9:
+            raise ValueError("overlap must be in [0, 0.9)")
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.roi_spec = roi
+        self.roi = parse_roi(roi)
+        self.min_roi_coverage = min_roi_coverage
+        self.full_frame = full_frame
+        self.nms_threshold = nms_threshold
+        self._plans: Dict[Tuple[int, int], Tuple[np.ndarray, Optional[np.ndarray], int]] = {}
+
+    def describe(self) -> Dict:
+        """Settings of this planner (for cache keys and reports)."""
+        return {"tile_size": self.tile_size, "overlap": self.overlap, "roi": self.roi_spec,
+                "full_frame": self.full_frame, "nms_threshold": self.nms_threshold}
+
+    def plan(self, width: int, height: int) -> Tuple[np.ndarray, Optional[np.ndarray], int]:
+        """
+        Tiles to run for a frame size, the ROI mask and the number of skipped tiles.
+
+        Plans are cached per frame size since a camera's resolution does not change.
+        """
+        plan = self._plans.get((width, height))
+        if plan is None:
+            tiles = plan_tiles(width, height, self.tile_size, self.overlap)
+            mask = None
+            skipped = 0
+            if self.roi is not None:
+                mask = np.zeros((height, width), dtype=np.uint8)
+                polygon = (self.roi * [width, height]).round().astype(np.int32)
+                cv2.fillPoly(mask, [polygon], 1)
+                coverage = np.array([mask[y1:y2, x1:x2].mean() for x1, y1, x2, y2 in tiles])
+                keep = coverage >= self.min_roi_coverage
+                skipped = int((~keep).sum())
+                tiles = tiles[keep]
+            plan = self._plans[(width, height)] = (tiles, mask, skipped)
+        return plan
+
+    def crops(self, frame: np.ndarray) -> Tuple[List[np.ndarray], np.ndarray]:
+        """
+        Images to run through the model for one frame: the tiles, then the full frame if enabled.
+
+        Tiles are views into the frame, nothing is copied.
+
+        Returns:
+            Tuple of (images, (M, 4) offsets/extents of each image in the frame)
+        """
+        height, width = frame.shape[:2]
+        tiles, _, _ = self.plan(width, height)
+        images = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+        if self.full_frame and (len(tiles) != 1 or tuple(tiles[0]) != (0, 0, width, height)):
+            images.append(frame)
+            tiles = np.vstack([tiles, [[0, 0, width, height]]])
+        return images, tiles
+
+    def merge(self, results: List, tiles: np.ndarray, frame_shape: Tuple[int, int], names: Dict[int, str],
+              started: Optional[float] = None) -> TiledResult:
+        """
+        Shift per-tile detections into frame coordinates and merge them with cross-tile NMS.
+
+        Args:
+            results: One YOLO result per image returned by crops()
+            tiles: Extents returned by crops()
+            frame_shape: (height, width) of the source frame
+            names: Model class table
+            started: perf_counter() when the tile inference began, for the cost report
+        """
+        merge_started = time.perf_counter()
+        height, width = frame_shape
+        parts = []
+        speed = {"preprocess": 0.0, "inference": 0.0, "postprocess": 0.0}
+        for result, (x1, y1, _, _) in zip(results, tiles):
+            for key in speed:
+                speed[key] += (getattr(result, "speed", None) or {}).get(key) or 0.0
+            if result.boxes is None or len(result.boxes) == 0:
+                continue
+            data = to_numpy(result.boxes.data).astype(np.float32)
+            # Keep x1, y1, x2, y2, conf, cls (tracked results carry an extra id column)
+            data = np.concatenate([data[:, :4], data[:, -2:]], axis=1)
+            data[:, [0, 2]] += x1
+            data[:, [1, 3]] += y1
+            parts.append(data)
+        data = np.concatenate(parts) if parts else np.empty((0, 6), dtype=np.float32)
+        raw_count = len(data)
+
+        _, mask, skipped = self.plan(width, height)
+        if mask is not None and len(data):
+            cx = ((data[:, 0] + data[:, 2]) / 2).astype(int).clip(0, width - 1)
+            cy = ((data[:, 1] + data[:, 3]) / 2).astype(int).clip(0, height - 1)
+            data = data[mask[cy, cx] > 0]
+        if len(data):
+            data = data[nms(data[:, :4], data[:, 4], data[:, 5].astype(np.int64), self.nms_threshold)]
+
+        finished = time.perf_counter()
+        tiling = {
+            "tiles": len(tiles),
+            "tiles_skipped": skipped,
+            "full_frame": bool(self.full_frame),
+            "detections_before_merge": raw_count,
+            "detections": len(data),
+            "model_ms": speed["preprocess"] + speed["inference"] + speed["postprocess"],
+            "merge_ms": (finished - merge_started) * 1000.0,
+        }
+        if started is not None:
+            tiling["total_ms"] = (finished - started) * 1000.0
+        return TiledResult(data, names, frame_shape, speed, tiling)
+
+    def predict(self, detector, frame: np.ndarray, conf: float) -> TiledResult:
+        """Run all tiles of a frame through a detector in one batched predict call."""
+        started = time.perf_counter()
+        images, tiles = self.crops(frame)
+        results = detector.predict(source=images, conf=conf, verbose=False) if images else []
+        return self.merge(results, tiles, frame.shape[:2], detector.names, started)
+
+
+class TilingStats:
+    """Running totals of the per-frame tiling reports of a video, for its metadata."""
+
+    FIELDS = ("frames", "tiles", "tiles_skipped", "detections_before_merge", "detections", "model_ms", "merge_ms")
+
+    def __init__(self, settings: Dict):
+        self.settings = settings
+        self.totals = {field: 0 for field in self.FIELDS}
+
+    def add(self, report: Dict):
+        self.totals["frames"] += 1
+        for field in self.FIELDS[1:]:
+            self.totals[field] += report[field]
+
+    def merge(self, totals: Dict):
+        """Add another run's totals (e.g. a video segment's)."""
+        for field in self.FIELDS:
+            self.totals[field] += totals.get(field, 0)
+
+    def summary(self) -> Dict:
+        frames = max(1, self.totals["frames"])
+        return {
+            **self.settings,
+            **self.totals,
+            "tiles_per_frame": self.totals["tiles"] / frames,
+            "model_ms_per_frame": self.totals["model_ms"] / frames,
+            "merge_ms_per_frame": self.totals["merge_ms"] / frames,
+        }
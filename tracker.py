@@ -0,0 +1,268 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Compass labels for headings, clockwise from image "up"
+COMPASS_DIRECTIONS = ["north", "northeast", "east", "southeast", "south", "southwest", "west", "northwest"]
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes, returned as an (N, M) matrix."""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-9)
+
+
+def heading_to_direction(heading: float, speed: float, min_speed: float) -> str:
+    """Map a heading in degrees to a compass label (or "stationary" below min_speed)."""
+    if speed < min_speed:
+        return "stationary"
+    return COMPASS_DIRECTIONS[int((heading + 22.5) // 45) % 8]
+
+
+def attach_tracks(tracker: "IouTracker", detections: List[Dict], boxes, class_ids, timestamp: float,
+                  first_sighting_only: bool = False) -> List[Dict]:
+    """
+    Attach track ids and movement to a frame's detection records (in place).
+
+    Returns the detections that should go to the alert store: every one, or
+    with first_sighting_only just the first sighting of each tracked object.
+    """
+    tracks = tracker.update(boxes, class_ids, timestamp)
+    sightings = []
+    for i, detection in enumerate(detections):
+        movement = tracker.describe(tracks, i)
+        detection["track_id"] = movement.pop("track_id")
+        detection["movement"] = movement
+        if not first_sighting_only or tracks["is_new"][i]:
+            sightings.append(detection)
+    return sightings
+
+
+class IouTracker:
+    """
+    Vectorised multi-object tracker for one video stream.
+
+    Tracks are matched to detections of the same class by IoU against their
+    motion-predicted boxes (greedy, best match first). Track centres and
+    velocities are smoothed with an alpha-beta filter, the constant-velocity
+    special case of a Kalman filter, so velocity and heading come from real
+    box motion. Tracks idle longer than max_idle_seconds are dropped and at
+    most max_tracks are kept, so memory stays bounded on any feed.
+
+    Args:
+        iou_threshold: Minimum IoU for a detection to continue a track
+        max_distance: Centre distance, in track box diagonals, within which a
+            non-overlapping detection may still continue a track
+        max_idle_seconds: Time after which an unmatched track expires
+        max_tracks: Maximum number of live tracks
+        alpha: Position gain of the filter
+        beta: Velocity gain of the filter
+        min_speed: Speed (pixels/s) below which an object counts as stationary
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_distance: float = 1.0, max_idle_seconds: float = 2.0,
+                 max_tracks: int = 256, alpha: float = 0.7, beta: float = 0.3, min_speed: float = 2.0):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_idle_seconds = max_idle_seconds
+        self.max_tracks = max_tracks
+        self.alpha = alpha
+        self.beta = beta
+        self.min_speed = min_speed
+
+        self._ids = np.empty(0, dtype=np.int64)
+        self._classes = np.empty(0, dtype=np.int64)
+        self._centres = np.empty((0, 2), dtype=np.float64)
+        self._sizes = np.empty((0, 2), dtype=np.float64)
+        self._velocities = np.empty((0, 2), dtype=np.float64)
+        self._last_seen = np.empty(0, dtype=np.float64)
+        self._hits = np.empty(0, dtype=np.int64)
+        self._next_id = 1
+        self.tracks_created: Dict[int, int] = {}
+        self.last_update: Optional[float] = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def update(self, boxes, class_ids, timestamp: float) -> Dict[str, np.ndarray]:
+        """
+        Associate one frame's detections with tracks.
+
+        Args:
+            boxes: (M, 4) xyxy pixel boxes
+            class_ids: (M,) class ids
+            timestamp: Frame time in seconds (video time or wall clock)
+
+        Returns:
+            Dict of per-detection arrays: track_ids, velocities (pixels/s, x/y),
+            speeds (pixels/s), headings (degrees clockwise from up; NaN below
+            min_speed, where there is no direction of travel) and is_new
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        class_ids = np.asarray(class_ids, dtype=np.int64).reshape(-1)
+        self.last_update = timestamp
+        self._expire(timestamp)
+
+        centres = (boxes[:, :2] + boxes[:, 2:]) / 2.0
+        sizes = boxes[:, 2:] - boxes[:, :2]
+        num_detections = len(boxes)
+
+        # Predict where every live track should be now
+        dt = np.maximum(timestamp - self._last_seen, 0.0)
+        predicted = self._centres + self._velocities * dt[:, None]
+        predicted_boxes = np.hstack([predicted - self._sizes / 2.0, predicted + self._sizes / 2.0])
+
+        # Overlapping pairs score by IoU; small fast objects that no longer overlap
+        # their prediction fall back to a (lower) centre-distance score
+        iou = box_iou(predicted_boxes, boxes)
+        diagonals = np.maximum(np.hypot(self._sizes[:, 0], self._sizes[:, 1]), 1.0)
+        distances = np.linalg.norm(predicted[:, None, :] - centres[None, :, :], axis=2) / diagonals[:, None]
+        score = np.where(
+            iou >= self.iou_threshold,
+            iou,
+            np.where(distances < self.max_distance, self.iou_threshold * (1.0 - distances / self.max_distance), 0.0)
+        )
+        score[self._classes[:, None] != class_ids[None, :]] = 0.0
+
+        # Greedy assignment over candidate pairs, highest score first
+        track_for_det = np.full(num_detections, -1, dtype=np.int64)
+        if score.size:
+            rows, cols = np.nonzero(score > 0.0)
+            order = np.argsort(-score[rows, cols], kind="stable")
+            used_tracks = set()
+            for r, c in zip(rows[order], cols[order]):
+                if r in used_tracks or track_for_det[c] >= 0:
+                    continue
+                used_tracks.add(r)
+                track_for_det[c] = r
+
+        # Alpha-beta update of matched tracks
+        matched = track_for_det >= 0
+        t_idx = track_for_det[matched]
+        if len(t_idx):
+            d_idx = np.nonzero(matched)[0]
+            step = np.maximum(dt[t_idx], 1e-3)[:, None]
+            residual = centres[d_idx] - predicted[t_idx]
+            first_motion = (self._hits[t_idx] == 1)[:, None]
+            # The second sighting initialises velocity from raw displacement
+            new_velocities = np.where(
+                first_motion,
+                (centres[d_idx] - self._centres[t_idx]) / step,
+                self._velocities[t_idx] + self.beta * residual / step
+            )
+            self._centres[t_idx] = np.where(first_motion, centres[d_idx], predicted[t_idx] + self.alpha * residual)
+            self._velocities[t_idx] = new_velocities
+            self._sizes[t_idx] = sizes[d_idx]
+            self._last_seen[t_idx] = timestamp
+            self._hits[t_idx] += 1
+
+        # Unmatched detections start new tracks
+        new_idx = np.nonzero(~matched)[0]
+        if len(new_idx):
+            new_ids = np.arange(self._next_id, self._next_id + len(new_idx), dtype=np.int64)
+            self._next_id += len(new_idx)
+            start = len(self._ids)
+            self._ids = np.concatenate([self._ids, new_ids])
+            self._classes = np.concatenate([self._classes, class_ids[new_idx]])
+            self._centres = np.vstack([self._centres, centres[new_idx]])
+            self._sizes = np.vstack([self._sizes, sizes[new_idx]])
+            self._velocities = np.vstack([self._velocities, np.zeros((len(new_idx), 2))])
+            self._last_seen = np.concatenate([self._last_seen, np.full(len(new_idx), timestamp)])
+            self._hits = np.concatenate([self._hits, np.ones(len(new_idx), dtype=np.int64)])
+            track_for_det[new_idx] = np.arange(start, start + len(new_idx))
+            for class_id in class_ids[new_idx].tolist():
+                self.tracks_created[class_id] = self.tracks_created.get(class_id, 0) + 1
+
+        velocities = self._velocities[track_for_det] if num_detections else np.empty((0, 2))
+        track_ids = self._ids[track_for_det] if num_detections else np.empty(0, dtype=np.int64)
+        speeds = np.hypot(velocities[:, 0], velocities[:, 1])
+        # Image y grows downwards, so "up" (north) is -y
+        headings = np.degrees(np.arctan2(velocities[:, 0], -velocities[:, 1])) % 360.0
+        # A new or stationary track has no heading (arctan2 of a zero vector would say 180)
+        headings[speeds < self.min_speed] = np.nan
+        is_new = ~matched
+
+        if len(self._ids) > self.max_tracks:
+            self._keep(np.argsort(-self._last_seen, kind="stable")[:self.max_tracks])
+
+        return {
+            "track_ids": track_ids,
+            "velocities": velocities,
+            "speeds": speeds,
+            "headings": headings,
+            "is_new": is_new,
+        }
+
+    def describe(self, tracks: Dict[str, np.ndarray], i: int) -> Dict:
+        """Return the JSON movement record of detection i from an update() result."""
+        speed = float(tracks["speeds"][i])
+        heading = float(tracks["headings"][i])
+        return {
+            "track_id": int(tracks["track_ids"][i]),
+            "velocity": round(speed, 2),
+            "velocity_px_per_s": [round(float(v), 2) for v in tracks["velocities"][i]],
+            "heading_degrees": None if np.isnan(heading) else round(heading, 1),
+            "direction": heading_to_direction(heading, speed, self.min_speed),
+        }
+
+    def _expire(self, timestamp: float):
+        if len(self._ids):
+            alive = (timestamp - self._last_seen) <= self.max_idle_seconds
+            if not alive.all():
+                self._keep(np.nonzero(alive)[0])
+
+    def _keep(self, idx: np.ndarray):
+        self._ids = self._ids[idx]
+        self._classes = self._classes[idx]
+        self._centres = self._centres[idx]
+        self._sizes = self._sizes[idx]
+        self._velocities = self._velocities[idx]
+        self._last_seen = self._last_seen[idx]
+        self._hits = self._hits[idx]
+
+
+class TrackerRegistry:
+    """
+    Per-stream trackers for callers that do not hold their own (e.g. HTTP frames).
+
+    Keeps at most max_streams trackers and drops streams idle longer than
+    max_idle_seconds, least recently used first.
+    """
+
+    def __init__(self, max_streams: int = 64, max_idle_seconds: float = 300.0, **tracker_kwargs):
+        self.max_streams = max_streams
+        self.max_idle_seconds = max_idle_seconds
+        self.tracker_kwargs = tracker_kwargs
+        self._trackers: "OrderedDict[str, IouTracker]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, stream_id: str) -> IouTracker:
+        """Return the tracker of a stream, creating it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, t in self._touched.items() if now - t > self.max_idle_seconds]:
+                self._trackers.pop(key, None)
+                self._touched.pop(key, None)
+            tracker = self._trackers.pop(stream_id, None)
+            if tracker is None:
+                tracker = IouTracker(**self.tracker_kwargs)
+            self._trackers[stream_id] = tracker
+            self._touched[stream_id] = now
+            while len(self._trackers) > self.max_streams:
+                oldest, _ = self._trackers.popitem(last=False)
+                self._touched.pop(oldest, None)
+            return tracker
+
+    def __len__(self):
+        return len(self._trackers)